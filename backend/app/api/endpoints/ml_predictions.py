@@ -3,30 +3,63 @@ Endpoints para obtener predicciones de riesgo académico del servicio ML
 """
 
 from fastapi import APIRouter, Depends, HTTPException
-from typing import Any, List
+from fastapi.responses import StreamingResponse
+import httpx
+from typing import Any, List, Optional
 from sqlalchemy.orm import Session
 
 from app.api.deps import get_db, get_current_user
+from app.crud import crud_student_course_features, crud_risk_score
 from app.models.user import User, UserRole
 from app.services.ml_service import (
     get_student_risk_prediction, 
-    get_course_risk_predictions,
-    train_ml_model,
+    refresh_course_risk_scores,
+    stream_course_risk_predictions,
+    start_training_job,
+    get_training_job,
+    cancel_training_job,
     get_student_profile_prediction
 )
 
 router = APIRouter()
 
 
+def _training_job_response(response: Optional[httpx.Response]) -> Any:
+    """Reenvía la respuesta del servicio ML (o 503 si no está disponible)"""
+    if response is None:
+        raise HTTPException(
+            status_code=503,
+            detail="El servicio de ML no está disponible. Verifica que esté corriendo en http://localhost:8001"
+        )
+    if response.status_code >= 400:
+        try:
+            detail = response.json().get("detail")
+        except ValueError:
+            detail = response.text
+        raise HTTPException(status_code=response.status_code, detail=detail)
+    return response.json()
+
+
+def _require_admin_for_training(current_user: User) -> None:
+    if current_user.role != UserRole.ADMINISTRADOR:
+        raise HTTPException(
+            status_code=403,
+            detail="Solo administradores pueden entrenar el modelo"
+        )
+
+
 @router.get("/student/{student_id}/course/{course_id}")
 async def get_student_risk(
     student_id: int,
     course_id: int,
+    refresh: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Obtiene la predicción de riesgo académico para un estudiante en un curso específico.
+    Se sirve el puntaje guardado en risk_scores; con refresh=true (o si aún no hay
+    puntaje) se pide una predicción en vivo al servicio ML.
     Solo docentes y administradores pueden ver estas predicciones.
     """
     if current_user.role not in [UserRole.DOCENTE, UserRole.ADMINISTRADOR]:
@@ -35,9 +68,16 @@ async def get_student_risk(
             detail="Solo docentes y administradores pueden ver predicciones de riesgo"
         )
     
+    score = crud_risk_score.get_score(db, student_id, course_id)
+    if score is not None and not refresh:
+        return crud_risk_score.to_prediction(score)
+    
     prediction = await get_student_risk_prediction(student_id, course_id)
     
     if prediction is None:
+        # Sin servicio ML: el último puntaje guardado es mejor que nada
+        if score is not None:
+            return crud_risk_score.to_prediction(score)
         raise HTTPException(
             status_code=503,
             detail="El servicio de ML no está disponible. Verifica que esté corriendo en http://localhost:8001"
@@ -49,11 +89,18 @@ async def get_student_risk(
 @router.get("/course/{course_id}")
 async def get_course_risks(
     course_id: int,
+    refresh: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
     Obtiene las predicciones de riesgo académico para todos los estudiantes de un curso.
+    Se sirven desde la tabla risk_scores, que el servicio ML actualiza periódicamente,
+    así que el panel carga sin llamar al modelo y funciona aunque el servicio esté caído.
+    Con refresh=true (o si el curso aún no tiene puntajes) el servicio ML recalcula
+    el curso en vivo y guarda el resultado; si no puede guardarlo y no hay puntajes
+    guardados, se reenvían las predicciones en vivo (NDJSON de /predict/batch) a
+    medida que llegan, sin cargar el curso completo en memoria.
     Solo docentes y administradores pueden ver estas predicciones.
     """
     if current_user.role not in [UserRole.DOCENTE, UserRole.ADMINISTRADOR]:
@@ -62,13 +109,25 @@ async def get_course_risks(
             detail="Solo docentes y administradores pueden ver predicciones de riesgo"
         )
     
-    predictions = await get_course_risk_predictions(course_id)
+    scores = crud_risk_score.get_course_scores(db, course_id)
+    if scores and not refresh:
+        return [crud_risk_score.to_prediction(score) for score in scores]
+    
+    predictions = await refresh_course_risk_scores(course_id)
     
     if predictions is None:
-        raise HTTPException(
-            status_code=503,
-            detail="El servicio de ML no está disponible. Verifica que esté corriendo en http://localhost:8001"
-        )
+        # Falló la actualización: se sirven los últimos puntajes guardados y, si no hay,
+        # las predicciones en vivo sin guardar (el servicio puede responder aunque no
+        # haya podido escribir risk_scores)
+        if scores:
+            return [crud_risk_score.to_prediction(score) for score in scores]
+        stream = await stream_course_risk_predictions(course_id)
+        if stream is None:
+            raise HTTPException(
+                status_code=503,
+                detail="El servicio de ML no está disponible. Verifica que esté corriendo en http://localhost:8001"
+            )
+        return StreamingResponse(stream, media_type="application/json")
     
     return predictions
 
@@ -101,28 +160,62 @@ async def get_student_profile_risk(
     return prediction
 
 
-@router.post("/train")
+@router.post("/train", status_code=202)
 async def train_model(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ) -> Any:
     """
-    Entrena el modelo de ML con los datos históricos.
+    Lanza el entrenamiento del modelo de ML con los datos históricos en segundo plano.
+    Retorna el trabajo (job_id, estado, etapa); el avance se consulta con /train/jobs/{job_id}.
     Solo administradores pueden entrenar el modelo.
     """
+    _require_admin_for_training(current_user)
+    return _training_job_response(await start_training_job())
+
+
+@router.get("/train/jobs/{job_id}")
+async def get_train_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Obtiene el estado de un entrenamiento (etapa, progreso, métricas o error).
+    Solo administradores.
+    """
+    _require_admin_for_training(current_user)
+    return _training_job_response(await get_training_job(job_id))
+
+
+@router.delete("/train/jobs/{job_id}")
+async def cancel_train_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Cancela un entrenamiento en curso. Solo administradores.
+    """
+    _require_admin_for_training(current_user)
+    return _training_job_response(await cancel_training_job(job_id))
+
+
+@router.post("/features/rebuild")
+def rebuild_student_course_features(
+    course_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """
+    Recalcula desde cero la tabla de agregados estudiante-curso que usa el servicio ML
+    (toda la tabla o solo un curso). Útil tras cargas masivas que no pasan por los CRUD.
+    Solo administradores pueden ejecutarlo.
+    """
     if current_user.role != UserRole.ADMINISTRADOR:
         raise HTTPException(
             status_code=403,
-            detail="Solo administradores pueden entrenar el modelo"
+            detail="Solo administradores pueden recalcular los agregados"
         )
     
-    result = await train_ml_model()
+    rows = crud_student_course_features.rebuild_features(db, course_id=course_id)
+    db.commit()
     
-    if result is None:
-        raise HTTPException(
-            status_code=503,
-            detail="El servicio de ML no está disponible. Verifica que esté corriendo en http://localhost:8001"
-        )
-    
-    return result
-
+    return {"status": "success", "rows": rows}
@@ -5,6 +5,7 @@ from app.models.enrollment import Enrollment # Importa el modelo de la BD
 from app.models.course import Course # Importa el modelo Course para la función join
 from app.models.user import User # Importa el modelo User
 from app.schemas.enrollment import EnrollmentCreate # Importa el esquema Pydantic
+from app.crud import crud_student_course_features
 
 # ----------------- Obtener una inscripción específica (para verificar si ya existe) -----------------
 def get_enrollment_by_user_and_course(db: Session, *, student_id: int, course_id: int) -> Optional[Enrollment]:
@@ -30,6 +31,8 @@ def create_enrollment(db: Session, *, student_id: int, course_id: int) -> Enroll
         # 'enrollment_date' será generado automáticamente por el server_default=text("NOW()")
     )
     db.add(db_enrollment)
+    db.flush()
+    crud_student_course_features.on_enrollment_created(db, student_id=student_id, course_id=course_id)
     db.commit()
     db.refresh(db_enrollment)
     return db_enrollment
@@ -58,6 +61,9 @@ def delete_enrollment(db: Session, db_enrollment: Enrollment) -> Enrollment:
     Elimina una inscripción (darse de baja).
     Recibe el objeto Enrollment (obtenido previamente) y lo elimina.
     """
+    crud_student_course_features.on_enrollment_deleted(
+        db, student_id=db_enrollment.student_id, course_id=db_enrollment.course_id
+    )
     db.delete(db_enrollment)
     db.commit()
     return db_enrollment
\ No newline at end of file
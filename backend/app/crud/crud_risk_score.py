@@ -0,0 +1,47 @@
+# backend/app/crud/crud_risk_score.py
+"""
+Lectura de los puntajes de riesgo persistidos en risk_scores.
+
+La tabla la escribe el servicio ML (evaluación programada o POST /scores/refresh);
+el backend solo la lee para servir los paneles.
+"""
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+
+from app.models.risk_score import RiskScore
+
+
+def to_prediction(score: RiskScore) -> Dict[str, Any]:
+    """
+    Convierte una fila en el formato de las predicciones del servicio ML,
+    más la versión del modelo y la fecha de cálculo.
+    """
+    return {
+        "student_id": score.student_id,
+        "course_id": score.course_id,
+        "risk_level": score.risk_level,
+        "risk_score": score.risk_score,
+        "features": score.features or {},
+        "confidence": score.confidence,
+        "model_version": score.model_version,
+        "computed_at": score.computed_at.isoformat() if score.computed_at else None,
+    }
+
+
+def get_score(db: Session, student_id: int, course_id: int) -> Optional[RiskScore]:
+    """
+    Obtiene el puntaje de un estudiante en un curso (búsqueda por clave primaria).
+    """
+    return db.get(RiskScore, (student_id, course_id))
+
+
+def get_course_scores(db: Session, course_id: int) -> List[RiskScore]:
+    """
+    Obtiene los puntajes de todos los estudiantes de un curso.
+    """
+    return (
+        db.query(RiskScore)
+        .filter(RiskScore.course_id == course_id)
+        .order_by(RiskScore.student_id)
+        .all()
+    )
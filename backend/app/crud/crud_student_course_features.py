@@ -0,0 +1,217 @@
+# backend/app/crud/crud_student_course_features.py
+"""
+Mantenimiento incremental de la tabla student_course_features.
+
+Las funciones on_* se llaman desde los CRUD de tareas, inscripciones y entregas
+antes de su commit, así que la actualización queda en la misma transacción.
+Solo tocan las filas estudiante-curso afectadas y usan UPDATE atómicos
+(contador = contador + 1) para no perder cambios concurrentes.
+"""
+from sqlalchemy import case, func, text, update, delete
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.models.student_course_features import StudentCourseFeatures
+from app.models.submission import Submission
+from app.models.task import Task
+
+F = StudentCourseFeatures
+
+
+# Recalcula desde cero los agregados de las inscripciones que cumplan {where}.
+# Parte de enrollments para que las inscripciones sin tareas también tengan fila.
+_REBUILD_QUERY = """
+    INSERT INTO student_course_features (
+        student_id, course_id, n_tasks, n_submitted_tasks, n_timed_submissions,
+        n_late_submissions, n_grades, grade_mean, grade_m2, updated_at
+    )
+    SELECT
+        e.student_id,
+        e.course_id,
+        COUNT(DISTINCT t.id),
+        COUNT(DISTINCT t.id) FILTER (WHERE s.id IS NOT NULL),
+        COUNT(s.id) FILTER (WHERE s.submitted_at IS NOT NULL AND t.due_date IS NOT NULL),
+        COUNT(s.id) FILTER (WHERE s.submitted_at > t.due_date),
+        COUNT(s.grade),
+        COALESCE(AVG(s.grade), 0),
+        COALESCE(VAR_SAMP(s.grade) * (COUNT(s.grade) - 1), 0),
+        NOW()
+    FROM enrollments e
+    LEFT JOIN tasks t ON t.course_id = e.course_id
+    LEFT JOIN submissions s ON s.task_id = t.id AND s.student_id = e.student_id
+    {where}
+    GROUP BY e.student_id, e.course_id
+    ON CONFLICT (student_id, course_id) DO UPDATE SET
+        n_tasks = EXCLUDED.n_tasks,
+        n_submitted_tasks = EXCLUDED.n_submitted_tasks,
+        n_timed_submissions = EXCLUDED.n_timed_submissions,
+        n_late_submissions = EXCLUDED.n_late_submissions,
+        n_grades = EXCLUDED.n_grades,
+        grade_mean = EXCLUDED.grade_mean,
+        grade_m2 = EXCLUDED.grade_m2,
+        updated_at = EXCLUDED.updated_at
+"""
+
+
+# ----------------- Lectura y reconstrucción -----------------
+def get_features(db: Session, student_id: int, course_id: int) -> Optional[StudentCourseFeatures]:
+    """
+    Obtiene los agregados de un estudiante en un curso (búsqueda por clave primaria).
+    """
+    return db.get(StudentCourseFeatures, (student_id, course_id))
+
+
+def rebuild_features(db: Session, course_id: Optional[int] = None, student_id: Optional[int] = None) -> int:
+    """
+    Recalcula los agregados desde las tablas base (backfill o corrección).
+    Sin filtros recalcula toda la tabla. No hace commit.
+
+    Returns:
+        Número de filas estudiante-curso recalculadas
+    """
+    conditions = []
+    params = {}
+    if course_id is not None:
+        conditions.append("e.course_id = :course_id")
+        params["course_id"] = course_id
+    if student_id is not None:
+        conditions.append("e.student_id = :student_id")
+        params["student_id"] = student_id
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # Las filas de inscripciones que ya no existen se eliminan antes de reinsertar
+    stale = delete(F)
+    if course_id is not None:
+        stale = stale.where(F.course_id == course_id)
+    if student_id is not None:
+        stale = stale.where(F.student_id == student_id)
+    db.execute(stale)
+
+    result = db.execute(text(_REBUILD_QUERY.format(where=where)), params)
+    return result.rowcount
+
+
+def ensure_populated(db: Session) -> None:
+    """
+    Hace el backfill inicial si la tabla está vacía y ya existen inscripciones.
+    """
+    has_features = db.execute(text("SELECT 1 FROM student_course_features LIMIT 1")).first()
+    has_enrollments = db.execute(text("SELECT 1 FROM enrollments LIMIT 1")).first()
+    if has_features is None and has_enrollments is not None:
+        rows = rebuild_features(db)
+        db.commit()
+        print(f"Tabla student_course_features poblada: {rows} filas")
+
+
+# ----------------- Actualización incremental de notas (Welford) -----------------
+def _add_grade(grade: float) -> dict:
+    """Valores de UPDATE que agregan una nota a la media y varianza acumuladas"""
+    new_mean = F.grade_mean + (grade - F.grade_mean) / (F.n_grades + 1)
+    return {
+        F.n_grades: F.n_grades + 1,
+        F.grade_mean: new_mean,
+        F.grade_m2: F.grade_m2 + (grade - F.grade_mean) * (grade - new_mean),
+    }
+
+
+def _remove_grade(grade: float) -> dict:
+    """Valores de UPDATE que quitan una nota de la media y varianza acumuladas"""
+    new_mean = case(
+        (F.n_grades <= 1, 0.0),
+        else_=(F.grade_mean * F.n_grades - grade) / (F.n_grades - 1)
+    )
+    return {
+        F.n_grades: func.greatest(F.n_grades - 1, 0),
+        F.grade_mean: new_mean,
+        F.grade_m2: case(
+            (F.n_grades <= 1, 0.0),
+            else_=func.greatest(F.grade_m2 - (grade - new_mean) * (grade - F.grade_mean), 0.0)
+        ),
+    }
+
+
+def _is_late(submission: Submission, task: Task) -> bool:
+    """Una entrega es tardía si se hizo después de la fecha límite de la tarea"""
+    if submission.submitted_at is None or task.due_date is None:
+        return False
+    submitted_at, due_date = submission.submitted_at, task.due_date
+    # Comparar siempre en la misma convención (con o sin zona horaria)
+    if (submitted_at.tzinfo is None) != (due_date.tzinfo is None):
+        submitted_at, due_date = submitted_at.replace(tzinfo=None), due_date.replace(tzinfo=None)
+    return submitted_at > due_date
+
+
+def _update_pair(db: Session, student_id: int, course_id: int, values: dict) -> None:
+    db.execute(
+        update(F)
+        .where(F.student_id == student_id, F.course_id == course_id)
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# ----------------- Hooks de inscripciones -----------------
+def on_enrollment_created(db: Session, student_id: int, course_id: int) -> None:
+    """Crea (o recalcula) la fila del nuevo estudiante-curso"""
+    rebuild_features(db, course_id=course_id, student_id=student_id)
+
+
+def on_enrollment_deleted(db: Session, student_id: int, course_id: int) -> None:
+    """Elimina la fila del estudiante-curso dado de baja"""
+    db.execute(delete(F).where(F.student_id == student_id, F.course_id == course_id))
+
+
+# ----------------- Hooks de tareas -----------------
+def on_task_created(db: Session, course_id: int) -> None:
+    """Una tarea nueva suma una tarea pendiente a todos los inscritos del curso"""
+    db.execute(
+        update(F)
+        .where(F.course_id == course_id)
+        .values({F.n_tasks: F.n_tasks + 1})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def on_task_changed(db: Session, course_id: int) -> None:
+    """
+    Al eliminar una tarea o cambiar su fecha límite se recalculan las filas del curso
+    (cambian conteos de entregas, retrasos y notas de varios estudiantes a la vez).
+    """
+    rebuild_features(db, course_id=course_id)
+
+
+# ----------------- Hooks de entregas -----------------
+def on_submission_created(db: Session, submission: Submission, task: Task) -> None:
+    """Cuenta la nueva entrega (una por estudiante y tarea) y su retraso"""
+    values = {
+        F.n_submitted_tasks: F.n_submitted_tasks + 1,
+        F.n_timed_submissions: F.n_timed_submissions + 1,
+    }
+    if _is_late(submission, task):
+        values[F.n_late_submissions] = F.n_late_submissions + 1
+    _update_pair(db, submission.student_id, task.course_id, values)
+    if submission.grade is not None:
+        _update_pair(db, submission.student_id, task.course_id, _add_grade(submission.grade))
+
+
+def on_grade_changed(db: Session, student_id: int, course_id: int, old_grade: Optional[float], new_grade: Optional[float]) -> None:
+    """Actualiza la media y varianza de notas cuando se califica o recalifica una entrega"""
+    if old_grade == new_grade:
+        return
+    if old_grade is not None:
+        _update_pair(db, student_id, course_id, _remove_grade(old_grade))
+    if new_grade is not None:
+        _update_pair(db, student_id, course_id, _add_grade(new_grade))
+
+
+def on_submission_deleted(db: Session, submission: Submission, task: Task) -> None:
+    """Revierte la entrega eliminada"""
+    values = {
+        F.n_submitted_tasks: func.greatest(F.n_submitted_tasks - 1, 0),
+        F.n_timed_submissions: func.greatest(F.n_timed_submissions - 1, 0),
+    }
+    if _is_late(submission, task):
+        values[F.n_late_submissions] = func.greatest(F.n_late_submissions - 1, 0)
+    _update_pair(db, submission.student_id, task.course_id, values)
+    if submission.grade is not None:
+        _update_pair(db, submission.student_id, task.course_id, _remove_grade(submission.grade))
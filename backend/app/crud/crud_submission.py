@@ -3,7 +3,9 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from app.models.submission import Submission
+from app.models.task import Task
 from app.models.user import User
+from app.crud import crud_student_course_features
 from app.schemas.submission import SubmissionCreate, SubmissionUpdate
 
 # ----------------- Crear una nueva entrega -----------------
@@ -19,6 +21,14 @@ def create_submission(db: Session, submission_in: SubmissionCreate, task_id: int
         # 'submitted_at' será generado automáticamente por el server_default
     )
     db.add(db_submission)
+    db.flush()
+    db.refresh(db_submission)  # Carga el 'submitted_at' generado por la BD
+
+    # Actualizar los agregados del estudiante en el curso (misma transacción)
+    task = db.get(Task, task_id)
+    if task is not None:
+        crud_student_course_features.on_submission_created(db, db_submission, task)
+
     db.commit()
     db.refresh(db_submission)
     return db_submission
@@ -54,11 +64,21 @@ def update_submission(db: Session, db_submission: Submission, submission_in: Sub
     Actualiza una entrega existente (ej. para añadir nota o feedback).
     """
     update_data = submission_in.model_dump(exclude_unset=True) 
+    old_grade = db_submission.grade
 
     for field, value in update_data.items():
         setattr(db_submission, field, value)
 
     db.add(db_submission)
+
+    # Si cambió la nota, actualizar la media y varianza del estudiante en el curso
+    if db_submission.grade != old_grade:
+        task = db.get(Task, db_submission.task_id)
+        if task is not None:
+            crud_student_course_features.on_grade_changed(
+                db, db_submission.student_id, task.course_id, old_grade, db_submission.grade
+            )
+
     db.commit()
     db.refresh(db_submission)
     return db_submission
@@ -70,6 +90,9 @@ def delete_submission(db: Session, submission_id: int) -> Optional[Submission]:
     """
     db_submission = db.query(Submission).filter(Submission.id == submission_id).first()
     if db_submission:
+        task = db.get(Task, db_submission.task_id)
+        if task is not None:
+            crud_student_course_features.on_submission_deleted(db, db_submission, task)
         db.delete(db_submission)
         db.commit()
     return db_submission
\ No newline at end of file
@@ -4,6 +4,7 @@ from typing import List, Optional
 
 from app.models.task import Task # Importa el modelo de SQLAlchemy
 from app.schemas.task import TaskCreate, TaskUpdate # Importa los esquemas de Pydantic
+from app.crud import crud_student_course_features
 
 # ----------------- Crear una nueva tarea -----------------
 def create_task(db: Session, task_in: TaskCreate, course_id: int) -> Task:
@@ -18,6 +19,8 @@ def create_task(db: Session, task_in: TaskCreate, course_id: int) -> Task:
         # 'created_at' será generado automáticamente por el server_default
     )
     db.add(db_task)
+    db.flush()
+    crud_student_course_features.on_task_created(db, course_id=course_id)
     db.commit()
     db.refresh(db_task)
     return db_task
@@ -50,11 +53,18 @@ def update_task(db: Session, db_task: Task, task_in: TaskUpdate) -> Task:
     """
     # Usamos model_dump para Pydantic v2. exclude_unset=True para actualizar solo los campos enviados.
     update_data = task_in.model_dump(exclude_unset=True) 
+    old_due_date = db_task.due_date
 
     for field, value in update_data.items():
         setattr(db_task, field, value)
 
     db.add(db_task)
+
+    # Un cambio de fecha límite altera qué entregas del curso son tardías
+    if 'due_date' in update_data and update_data['due_date'] != old_due_date:
+        db.flush()
+        crud_student_course_features.on_task_changed(db, course_id=db_task.course_id)
+
     db.commit()
     db.refresh(db_task)
     return db_task
@@ -67,5 +77,7 @@ def delete_task(db: Session, task_id: int) -> Optional[Task]:
     db_task = db.query(Task).filter(Task.id == task_id).first()
     if db_task:
         db.delete(db_task)
+        db.flush()
+        crud_student_course_features.on_task_changed(db, course_id=db_task.course_id)
         db.commit()
     return db_task
\ No newline at end of file
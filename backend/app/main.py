@@ -11,7 +11,8 @@ from app.api.endpoints.login import router as login_router
 
 from app.core.config import settings # <-- Importa la configuración
 from app.db.base import Base
-from app.db.session import engine # <-- Importa el engine de la sesión
+from app.db.session import engine, SessionLocal # <-- Importa el engine de la sesión
+from app.crud import crud_student_course_features
 
 # --- Función para crear las tablas ---
 def create_tables():
@@ -19,6 +20,13 @@ def create_tables():
     Base.metadata.create_all(bind=engine) # Usa el engine de session.py
     print("Tablas creadas.")
 
+    # Backfill inicial de los agregados estudiante-curso que lee el servicio ML
+    db = SessionLocal()
+    try:
+        crud_student_course_features.ensure_populated(db)
+    finally:
+        db.close()
+
 create_tables()
 
 # --- Instancia de la aplicación FastAPI ---
@@ -8,4 +8,6 @@ from .submission import Submission
 from .announcement import Announcement
 from .comment import Comment
 from .student_profile import StudentProfile
+from .student_course_features import StudentCourseFeatures
+from .risk_score import RiskScore
 # Agrega aquí cualquier otro modelo nuevo que crees.
\ No newline at end of file
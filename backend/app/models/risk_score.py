@@ -0,0 +1,26 @@
+# backend/app/models/risk_score.py
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, JSON
+from app.db.base import Base
+
+
+class RiskScore(Base):
+    """
+    Último puntaje de riesgo de cada estudiante-curso.
+    Lo escribe el trabajo programado del servicio ML (ml-service/services/risk_scoring.py),
+    que evalúa todas las inscripciones activas; los paneles de riesgo se sirven desde
+    esta tabla en vez de llamar al modelo en cada carga de página.
+    """
+    __tablename__ = "risk_scores"
+
+    student_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+    risk_score = Column(Float, nullable=False, comment="Probabilidad de riesgo alto (0-1)")
+    risk_level = Column(String(10), nullable=False, comment="alto o bajo")
+    confidence = Column(Float, nullable=False, comment="Diferencia entre las probabilidades de ambas clases")
+    model_version = Column(String(64), nullable=True, comment="Versión del modelo que calculó el puntaje")
+    computed_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    features = Column(JSON, nullable=True, comment="Features usadas en la predicción")
+
+    def __repr__(self):
+        return f"<RiskScore(student_id={self.student_id}, course_id={self.course_id}, risk_level={self.risk_level})>"
@@ -0,0 +1,33 @@
+# backend/app/models/student_course_features.py
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime
+from sqlalchemy.sql import func
+from app.db.base import Base
+
+
+class StudentCourseFeatures(Base):
+    """
+    Agregados por estudiante-curso que usa el servicio ML para calcular las features.
+    Se mantienen de forma incremental desde los CRUD de tareas, inscripciones y entregas
+    (ver app/crud/crud_student_course_features.py), de modo que una predicción es una
+    búsqueda por clave primaria en vez de un join completo.
+    """
+    __tablename__ = "student_course_features"
+
+    student_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    course_id = Column(Integer, ForeignKey("courses.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+    # Contadores
+    n_tasks = Column(Integer, nullable=False, default=0, server_default="0", comment="Tareas del curso")
+    n_submitted_tasks = Column(Integer, nullable=False, default=0, server_default="0", comment="Tareas entregadas")
+    n_timed_submissions = Column(Integer, nullable=False, default=0, server_default="0", comment="Entregas con fecha límite")
+    n_late_submissions = Column(Integer, nullable=False, default=0, server_default="0", comment="Entregas tardías")
+
+    # Media y varianza de notas (algoritmo de Welford: grade_m2 = suma de cuadrados de desviaciones)
+    n_grades = Column(Integer, nullable=False, default=0, server_default="0", comment="Entregas calificadas")
+    grade_mean = Column(Float, nullable=False, default=0.0, server_default="0", comment="Promedio de notas")
+    grade_m2 = Column(Float, nullable=False, default=0.0, server_default="0", comment="Suma de cuadrados de desviaciones")
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<StudentCourseFeatures(student_id={self.student_id}, course_id={self.course_id})>"
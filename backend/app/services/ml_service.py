@@ -2,8 +2,9 @@
 Servicio para comunicarse con el microservicio de ML
 """
 
+import json
 import httpx
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator
 
 
 ML_SERVICE_URL = "http://localhost:8001"
@@ -42,26 +43,56 @@ async def get_student_risk_prediction(
         return None
 
 
-async def get_course_risk_predictions(
+async def iter_course_risk_predictions(
     course_id: int
-) -> Optional[List[Dict[str, Any]]]:
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Itera las predicciones de riesgo de un curso a medida que llegan.
+    Usa la respuesta NDJSON del servicio ML (una predicción por línea), así
+    que no espera ni carga en memoria la respuesta completa.
+    
+    Args:
+        course_id: ID del curso
+    
+    Raises:
+        httpx.RequestError / httpx.HTTPStatusError si falla la comunicación
     """
-    Obtiene las predicciones de riesgo para todos los estudiantes de un curso
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        async with client.stream(
+            "GET",
+            f"{ML_SERVICE_URL}/predict/batch",
+            params={"course_id": course_id, "stream": True},
+            headers={"Accept": "application/x-ndjson"}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+
+async def stream_course_risk_predictions(
+    course_id: int
+) -> Optional[AsyncIterator[bytes]]:
+    """
+    Predicciones de riesgo de todos los estudiantes de un curso como un arreglo
+    JSON que se envía a medida que llegan las líneas NDJSON del servicio ML: en
+    memoria hay una predicción a la vez, no el curso completo.
+    
+    La conexión se abre (y se lee la primera predicción) antes de retornar, así
+    un servicio caído se informa con None en lugar de cortar una respuesta ya
+    iniciada.
     
     Args:
         course_id: ID del curso
     
     Returns:
-        Lista de predicciones o None si hay error
+        Iterador con los bytes del arreglo JSON o None si hay error
     """
+    predictions = iter_course_risk_predictions(course_id)
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(
-                f"{ML_SERVICE_URL}/predict/batch",
-                params={"course_id": course_id}
-            )
-            response.raise_for_status()
-            return response.json()
+        first = await predictions.__anext__()
+    except StopAsyncIteration:
+        first = None
     except httpx.RequestError as e:
         print(f"Error al conectar con el servicio ML: {e}")
         return None
@@ -71,18 +102,45 @@ async def get_course_risk_predictions(
     except Exception as e:
         print(f"Error inesperado al obtener predicciones: {e}")
         return None
+    
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            yield b"["
+            if first is not None:
+                yield json.dumps(first).encode()
+                async for prediction in predictions:
+                    yield b"," + json.dumps(prediction).encode()
+            yield b"]"
+        except Exception as e:
+            # La respuesta ya empezó: se corta (JSON incompleto) en vez de enviar
+            # una lista parcial como si fuera el curso completo
+            print(f"Error al leer las predicciones del servicio ML: {e}")
+            raise
+        finally:
+            await predictions.aclose()
+    
+    return body()
 
 
-async def train_ml_model() -> Optional[Dict[str, Any]]:
+async def refresh_course_risk_scores(
+    course_id: int
+) -> Optional[List[Dict[str, Any]]]:
     """
-    Entrena el modelo de ML con los datos históricos
+    Pide al servicio ML que recalcule ahora los puntajes de un curso. El servicio
+    reemplaza las filas del curso en risk_scores y retorna las nuevas.
+    
+    Args:
+        course_id: ID del curso
     
     Returns:
-        Dict con las métricas del entrenamiento o None si hay error
+        Lista de puntajes o None si hay error
     """
     try:
-        async with httpx.AsyncClient(timeout=300.0) as client:  # 5 minutos timeout
-            response = await client.post(f"{ML_SERVICE_URL}/train")
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            response = await client.post(
+                f"{ML_SERVICE_URL}/scores/refresh",
+                params={"course_id": course_id}
+            )
             response.raise_for_status()
             return response.json()
     except httpx.RequestError as e:
@@ -92,10 +150,46 @@ async def train_ml_model() -> Optional[Dict[str, Any]]:
         print(f"Error HTTP del servicio ML: {e}")
         return None
     except Exception as e:
-        print(f"Error inesperado al entrenar modelo: {e}")
+        print(f"Error inesperado al recalcular puntajes: {e}")
+        return None
+
+
+async def _training_job_request(method: str, path: str) -> Optional[httpx.Response]:
+    """
+    Llamada a la API de trabajos de entrenamiento del servicio ML.
+    Retorna la respuesta tal cual (incluidos 404/409, que el endpoint reenvía)
+    o None si el servicio no está disponible.
+    """
+    try:
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            return await client.request(method, f"{ML_SERVICE_URL}{path}")
+    except httpx.RequestError as e:
+        print(f"Error al conectar con el servicio ML: {e}")
         return None
 
 
+async def start_training_job() -> Optional[httpx.Response]:
+    """
+    Lanza el entrenamiento del modelo en segundo plano en el servicio ML.
+    Retorna de inmediato con el job_id; el progreso se consulta con get_training_job.
+    """
+    return await _training_job_request("POST", "/train/jobs")
+
+
+async def get_training_job(job_id: str) -> Optional[httpx.Response]:
+    """
+    Obtiene el estado (etapa, progreso, resultado o error) de un trabajo de entrenamiento
+    """
+    return await _training_job_request("GET", f"/train/jobs/{job_id}")
+
+
+async def cancel_training_job(job_id: str) -> Optional[httpx.Response]:
+    """
+    Cancela un trabajo de entrenamiento en curso
+    """
+    return await _training_job_request("DELETE", f"/train/jobs/{job_id}")
+
+
 async def get_student_profile_prediction(
     student_id: int
 ) -> Optional[Dict[str, Any]]:
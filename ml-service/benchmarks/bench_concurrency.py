@@ -0,0 +1,120 @@
+"""
+Benchmark de concurrencia: latencia de /predict con N peticiones en paralelo
+
+Compara el acceso a datos en el pool de hilos (modo "async", el actual) con la
+ejecución directa en el event loop (modo "blocking", como antes) usando un
+cliente ASGI en proceso contra la base de datos configurada en DATABASE_URL.
+
+Uso:
+    python benchmarks/bench_concurrency.py [--requests 50] [--rounds 5]
+    python benchmarks/bench_concurrency.py --simulate-db-ms 40   # agrega latencia de red/BD
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from functools import wraps
+from pathlib import Path
+
+import httpx
+import numpy as np
+from sqlalchemy import text
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import main
+
+
+def add_simulated_latency(data_service, milliseconds: float):
+    """Agrega una espera fija a cada consulta de DataService (simula una BD remota)"""
+    for name in [
+        "get_student_course_data", "get_course_students_data",
+        "get_materialized_features", "get_data_watermark", "get_pair_watermarks"
+    ]:
+        method = getattr(data_service, name)
+
+        def delayed(*args, _method=method, **kwargs):
+            time.sleep(milliseconds / 1000.0)
+            return _method(*args, **kwargs)
+
+        setattr(data_service, name, wraps(method)(delayed))
+
+
+def use_blocking_calls(async_data):
+    """Ejecuta las consultas directamente en el event loop (comportamiento anterior)"""
+    async def run_inline(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    async_data.run = run_inline
+
+
+def sample_pairs(n: int):
+    """Pares (student_id, course_id) inscritos, tomados de la base de datos"""
+    with main.data_service.engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT student_id, course_id FROM enrollments ORDER BY id LIMIT :n"), {"n": n}
+        ).all()
+    if not rows:
+        raise SystemExit("No hay inscripciones en la base de datos")
+    return [rows[i % len(rows)] for i in range(n)]
+
+
+async def run_round(client, pairs):
+    # Todas las peticiones se emiten a la vez: la latencia se mide desde ese instante
+    start = time.perf_counter()
+
+    async def one(student_id, course_id):
+        response = await client.post("/predict", json={"student_id": student_id, "course_id": course_id})
+        return time.perf_counter() - start, response.status_code
+
+    results = await asyncio.gather(*(one(s, c) for s, c in pairs))
+    wall = time.perf_counter() - start
+    return [latency for latency, _ in results], [status for _, status in results], wall
+
+
+async def benchmark(pairs, rounds: int):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await run_round(client, pairs[:1])  # calentamiento
+        latencies, walls, statuses = [], [], []
+        for _ in range(rounds):
+            # Sin caché para medir el camino completo
+            main.prediction_cache.clear()
+            round_latencies, round_statuses, wall = await run_round(client, pairs)
+            latencies.extend(round_latencies)
+            statuses.extend(round_statuses)
+            walls.append(wall)
+    return np.array(latencies) * 1000, np.array(walls) * 1000, statuses
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50, help="Peticiones en paralelo por ronda")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--simulate-db-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    main.settings.PREDICTION_CACHE_ENABLED = False
+    pairs = sample_pairs(args.requests)
+    if args.simulate_db_ms:
+        add_simulated_latency(main.data_service, args.simulate_db_ms)
+
+    original_run = main.async_data.run
+    print(f"{args.requests} peticiones /predict en paralelo x {args.rounds} rondas")
+    print(f"{'modo':<10} {'p50 ms':>9} {'p99 ms':>9} {'ronda ms':>10} {'errores':>8}")
+    for mode in ["blocking", "async"]:
+        main.async_data.run = original_run
+        if mode == "blocking":
+            use_blocking_calls(main.async_data)
+        latencies, walls, statuses = asyncio.run(benchmark(pairs, args.rounds))
+        errors = sum(1 for status in statuses if status >= 500)
+        print(
+            f"{mode:<10} {np.percentile(latencies, 50):>9.1f} {np.percentile(latencies, 99):>9.1f} "
+            f"{walls.mean():>10.1f} {errors:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,88 @@
+"""
+Benchmark de contribuciones por feature: inferencia normal vs. explain=true
+
+Entrena el RandomForest de producción sobre features sintéticas, verifica que
+CompiledForest.predict_with_contributions dé las mismas clases y probabilidades
+que sklearn y que valor base + suma de contribuciones reproduzca la probabilidad
+de riesgo alto, y compara su tiempo con sklearn (predict + predict_proba), el
+camino de /predict/batch sin explain.
+
+Uso:
+    python benchmarks/bench_contributions.py [--students 20000] [--rows 1000] [--max-depth 10]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.compiled_forest import CompiledForest
+from services.feature_engineering import FeatureEngineering
+from services import model_tuning
+from benchmarks.synthetic import generate_task_rows
+
+
+def median_time(fn, X, repeat: int) -> float:
+    """Mediana del tiempo (segundos) sobre repeat llamadas"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--rows", type=int, default=1_000)
+    parser.add_argument("--max-depth", type=int, default=model_tuning.BASE_PARAMS["max_depth"],
+                        help="0 = sin límite de profundidad")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    feature_engineering = FeatureEngineering()
+    features = feature_engineering.calculate_features(
+        generate_task_rows(n_students=args.students, tasks_per_course=20)
+    )
+    X = features[feature_engineering.get_feature_names()].values
+    y = feature_engineering.calculate_target_variable(features).values
+    # Ruido en el target para que los árboles tengan una profundidad realista
+    rng = np.random.default_rng(0)
+    y = np.where(rng.random(len(y)) < 0.1, 1 - y, y)
+
+    model = model_tuning.build_model({"max_depth": args.max_depth or None}).fit(X, y)
+    compiled = CompiledForest.from_sklearn(model)
+    print(f"Bosque: {compiled.n_trees} árboles, {len(compiled.threshold):,} nodos, profundidad {compiled.max_depth}")
+
+    batch = X[rng.choice(len(X), size=args.rows, replace=args.rows > len(X))]
+    predictions, probabilities, contributions, base_value = compiled.predict_with_contributions(batch)
+    assert np.array_equal(predictions, model.predict(batch)), "Las clases no coinciden"
+    assert np.allclose(probabilities, model.predict_proba(batch), rtol=0, atol=1e-12), "Las probabilidades no coinciden"
+    error = np.abs(base_value + contributions.sum(axis=1) - probabilities[:, compiled.risk_class_index()]).max()
+    assert error < 1e-9, f"Las contribuciones no suman la probabilidad (error {error:.2e})"
+    print(f"Paridad con sklearn y suma de contribuciones exacta (error máx. {error:.1e}) en {len(batch):,} filas")
+
+    def sklearn_path(rows):
+        return model.predict(rows), model.predict_proba(rows)
+
+    # La primera llamada calcula y guarda los cambios de valor por nodo; se miden llamadas posteriores
+    sklearn_time = median_time(sklearn_path, batch, args.repeat)
+    compiled_time = median_time(compiled.predict_with_proba, batch, args.repeat)
+    explain_time = median_time(compiled.predict_with_contributions, batch, args.repeat)
+    print(f"{'camino':>28} {'ms':>9} {'vs. sklearn':>12}")
+    for name, elapsed in [
+        ("sklearn", sklearn_time),
+        ("compilado", compiled_time),
+        ("compilado + contribuciones", explain_time),
+    ]:
+        print(f"{name:>28} {elapsed * 1e3:>9.2f} {elapsed / sklearn_time:>11.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark de FeatureEngineering.calculate_features: motor vectorizado vs. bucle original
+
+Verifica además la paridad de ambos motores sobre el mismo dataset.
+
+Uso:
+    python benchmarks/bench_feature_engineering.py [--students 10000] [--tasks 40]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.feature_engineering import FeatureEngineering
+from benchmarks.synthetic import generate_task_rows
+
+
+def check_parity(vectorized, loop, feature_names):
+    """Compara ambos resultados; retorna la máxima diferencia absoluta por feature"""
+    assert list(vectorized.columns) == list(loop.columns), "Columnas distintas"
+    assert len(vectorized) == len(loop), "Número de filas distinto"
+    assert (vectorized["student_id"].values == loop["student_id"].values).all()
+    assert (vectorized["course_id"].values == loop["course_id"].values).all()
+
+    diffs = {}
+    for name in feature_names:
+        a = vectorized[name].to_numpy(dtype=float)
+        b = loop[name].to_numpy(dtype=float)
+        if not np.allclose(a, b, rtol=0, atol=1e-12):
+            raise AssertionError(f"La feature {name} no coincide")
+        diffs[name] = float(np.max(np.abs(a - b))) if len(a) else 0.0
+    return diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=10_000)
+    parser.add_argument("--tasks", type=int, default=40)
+    parser.add_argument("--skip-loop", action="store_true", help="No ejecutar el motor original")
+    args = parser.parse_args()
+
+    feature_engineering = FeatureEngineering()
+    data = generate_task_rows(n_students=args.students, tasks_per_course=args.tasks)
+    print(f"Filas tarea×inscripción: {len(data):,}")
+
+    start = time.perf_counter()
+    vectorized = feature_engineering.calculate_features(data.copy(), engine="vectorized")
+    vectorized_time = time.perf_counter() - start
+    print(f"Motor vectorizado: {vectorized_time:.3f}s ({len(vectorized):,} estudiantes-cursos)")
+
+    if args.skip_loop:
+        return
+
+    start = time.perf_counter()
+    loop = feature_engineering.calculate_features(data.copy(), engine="loop")
+    loop_time = time.perf_counter() - start
+    print(f"Motor original (bucle): {loop_time:.3f}s")
+    print(f"Aceleración: {loop_time / vectorized_time:.1f}x")
+
+    diffs = check_parity(vectorized, loop, feature_engineering.get_feature_names())
+    print(f"Paridad OK (máxima diferencia: {max(diffs.values()):.2e})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark del reentrenamiento incremental: bosque completo vs. árboles nuevos
+
+Entrena el RandomForest de producción con todas las features sintéticas (el
+entrenamiento completo) y lo extiende con incremental_training.grow_forest usando
+solo los estudiante-curso de los cursos "cambiados" (--changed-courses de
+--courses), como hace /train?incremental=true. Compara el tiempo de ajuste de
+ambos caminos y su accuracy sobre una parte de los pares cambiados que no se usa
+para ajustar, y verifica que el bosque compilado del modelo extendido (con árboles
+descartados por envejecimiento) dé las mismas probabilidades que sklearn.
+
+Solo mide el ajuste: en la base de datos el camino incremental además lee solo
+los pares cambiados en lugar de toda la historia.
+
+Uso:
+    python benchmarks/bench_incremental.py [--students 50000] [--courses 50] [--changed-courses 5]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.config import settings
+from services.compiled_forest import CompiledForest
+from services.feature_engineering import FeatureEngineering
+from services import incremental_training, model_tuning
+from benchmarks.synthetic import generate_task_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=50_000)
+    parser.add_argument("--courses", type=int, default=50)
+    parser.add_argument("--changed-courses", type=int, default=5)
+    parser.add_argument("--new-trees", type=int, default=settings.INCREMENTAL_NEW_TREES)
+    parser.add_argument("--max-trees", type=int, default=settings.INCREMENTAL_MAX_TREES)
+    args = parser.parse_args()
+
+    feature_engineering = FeatureEngineering()
+    features = feature_engineering.calculate_features(
+        generate_task_rows(n_students=args.students, tasks_per_course=20, n_courses=args.courses)
+    )
+    X = features[feature_engineering.get_feature_names()].values
+    y = feature_engineering.calculate_target_variable(features).values
+    # Ruido en el target para que los árboles tengan una profundidad realista
+    rng = np.random.default_rng(0)
+    y = np.where(rng.random(len(y)) < 0.1, 1 - y, y)
+
+    changed = features["course_id"].to_numpy() <= args.changed_courses
+    changed_idx = np.flatnonzero(changed)
+    rng.shuffle(changed_idx)
+    holdout = changed_idx[:len(changed_idx) // 5]
+    fit_idx = changed_idx[len(changed_idx) // 5:]
+    history = np.setdiff1d(np.arange(len(X)), holdout)
+    print(f"{len(X):,} pares, {len(changed_idx):,} cambiados ({args.changed_courses} de {args.courses} cursos)")
+
+    start = time.perf_counter()
+    full_model = model_tuning.build_model().fit(X[history], y[history])
+    full_time = time.perf_counter() - start
+
+    # Bosque "anterior": el mismo entrenamiento completo, que se extiende varias veces
+    model = model_tuning.build_model().fit(X[history], y[history])
+    generations = [incremental_training.new_generation("full", len(model.estimators_), model.random_state)]
+    rounds = max(1, -(-(args.max_trees - len(model.estimators_)) // args.new_trees) + 1)
+    times = []
+    for round_number in range(1, rounds + 1):
+        start = time.perf_counter()
+        removed, generations = incremental_training.grow_forest(
+            model, X[fit_idx], y[fit_idx], args.new_trees, args.max_trees, generations,
+            random_state=incremental_training.round_seed({"benchmark": 0}, round_number)
+        )
+        times.append(time.perf_counter() - start)
+    print(f"{rounds} rondas incrementales: {len(model.estimators_)} árboles, generaciones "
+          f"{[(g['mode'], g['trees']) for g in generations]}")
+
+    compiled = CompiledForest.from_sklearn(model)
+    assert np.allclose(compiled.predict_proba(X[holdout]), model.predict_proba(X[holdout]), rtol=0, atol=1e-12), \
+        "Las probabilidades del bosque compilado no coinciden"
+
+    incremental_time = float(np.median(times))
+    print(f"{'camino':>14} {'ajuste (s)':>11} {'accuracy':>9}")
+    for name, elapsed, fitted in [
+        ("completo", full_time, full_model),
+        ("incremental", incremental_time, model),
+    ]:
+        accuracy = model_tuning.evaluate_predictions(y[holdout], fitted.predict(X[holdout]))["accuracy"]
+        print(f"{name:>14} {elapsed:>11.2f} {accuracy:>9.3f}")
+    print(f"Tiempo ahorrado por ronda: {full_time - incremental_time:.2f}s ({full_time / incremental_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
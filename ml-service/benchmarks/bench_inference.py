@@ -0,0 +1,91 @@
+"""
+Benchmark de inferencia: sklearn (predict + predict_proba) vs. bosque compilado
+
+Entrena el RandomForest de producción sobre features sintéticas, verifica que
+el evaluador compilado dé exactamente las mismas clases y probabilidades y mide
+la latencia por fila con lotes de 1, 10, 100 y 10k filas. La columna "servicio"
+es el camino que elige ModelService.predict_with_proba según
+COMPILED_FOREST_MAX_ROWS.
+
+Uso:
+    python benchmarks/bench_inference.py [--students 20000] [--max-depth 10] [--repeat 50]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.config import settings
+from services.compiled_forest import CompiledForest
+from services.feature_engineering import FeatureEngineering
+from services import model_tuning
+from benchmarks.synthetic import generate_task_rows
+
+
+def per_row_latency(fn, X, repeat: int) -> float:
+    """Mediana del tiempo por fila (segundos) sobre repeat llamadas"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) / len(X)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=20_000)
+    parser.add_argument("--max-depth", type=int, default=model_tuning.BASE_PARAMS["max_depth"],
+                        help="0 = sin límite de profundidad")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 10_000])
+    args = parser.parse_args()
+
+    feature_engineering = FeatureEngineering()
+    features = feature_engineering.calculate_features(
+        generate_task_rows(n_students=args.students, tasks_per_course=20)
+    )
+    X = features[feature_engineering.get_feature_names()].values
+    y = feature_engineering.calculate_target_variable(features).values
+    # Ruido en el target para que los árboles tengan una profundidad realista
+    rng = np.random.default_rng(0)
+    y = np.where(rng.random(len(y)) < 0.1, 1 - y, y)
+
+    model = model_tuning.build_model({"max_depth": args.max_depth or None}).fit(X, y)
+    compiled = CompiledForest.from_sklearn(model)
+    print(f"Bosque: {compiled.n_trees} árboles, {len(compiled.threshold):,} nodos, profundidad {compiled.max_depth}")
+
+    predictions, probabilities = compiled.predict_with_proba(X)
+    assert np.array_equal(predictions, model.predict(X)), "Las clases no coinciden"
+    assert np.array_equal(probabilities, model.predict_proba(X)), "Las probabilidades no coinciden"
+    print(f"Paridad exacta con sklearn en {len(X):,} filas")
+
+    def sklearn_path(batch):
+        return model.predict(batch), model.predict_proba(batch)
+
+    def service_path(batch):
+        if len(batch) <= settings.COMPILED_FOREST_MAX_ROWS:
+            return compiled.predict_with_proba(batch)
+        return sklearn_path(batch)
+
+    print(f"{'lote':>7} {'sklearn µs/fila':>16} {'compilado µs/fila':>18} {'servicio µs/fila':>17} {'aceleración':>12}")
+    for batch_size in args.batch_sizes:
+        batch = X[rng.choice(len(X), size=batch_size, replace=batch_size > len(X))]
+        repeat = max(3, args.repeat // max(1, batch_size // 100))
+        sklearn_time = per_row_latency(sklearn_path, batch, repeat)
+        compiled_time = per_row_latency(compiled.predict_with_proba, batch, repeat)
+        service_time = per_row_latency(service_path, batch, repeat)
+        print(
+            f"{batch_size:>7} {sklearn_time * 1e6:>16.1f} {compiled_time * 1e6:>18.1f} "
+            f"{service_time * 1e6:>17.1f} {sklearn_time / service_time:>11.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Benchmark de carga del modelo: pickle de sklearn vs. bosque compilado con mmap
+
+Registra un bosque grande en un registro temporal y mide:
+  - el tiempo de carga de una versión (unpickle vs. abrir los .npy con mmap)
+  - la memoria de N procesos (como N workers de uvicorn) que sirven la misma
+    versión: RSS y PSS (memoria proporcional, que reparte las páginas
+    compartidas entre los procesos que las usan) leídos de /proc (solo Linux)
+
+Uso:
+    python benchmarks/bench_model_loading.py [--trees 300] [--students 50000] [--workers 1 4 8]
+"""
+
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.feature_engineering import FeatureEngineering
+from services.model_registry import ModelRegistry
+from services import model_tuning
+from benchmarks.synthetic import generate_task_rows
+
+
+def memory_kb() -> dict:
+    """Rss y Pss del proceso actual en kB"""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def serve_worker(registry_dir, version, mode, X, barrier, results):
+    """Carga la versión como lo haría un worker y la usa para predecir"""
+    registry = ModelRegistry(registry_dir)
+    before = memory_kb()
+
+    if mode == "pickle":
+        model = registry.load(version)
+        model.predict_proba(X)
+    else:
+        compiled = registry.load_compiled(version)
+        # Recorrer el bosque con muchas filas para que se lean (casi) todas las páginas
+        compiled.predict_with_proba(X)
+
+    # Medir cuando todos los workers tienen el modelo cargado
+    barrier.wait()
+    after = memory_kb()
+    results.put({key: after[key] - before[key] for key in after})
+    barrier.wait()
+
+
+def measure_workers(registry_dir, version, mode, X, n_workers: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(n_workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=serve_worker, args=(registry_dir, version, mode, X, barrier, results))
+        for _ in range(n_workers)
+    ]
+    for process in processes:
+        process.start()
+    deltas = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {
+        "rss_mb": sum(d["Rss"] for d in deltas) / 1024,
+        "pss_mb": sum(d["Pss"] for d in deltas) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trees", type=int, default=300)
+    parser.add_argument("--students", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    feature_engineering = FeatureEngineering()
+    features = feature_engineering.calculate_features(
+        generate_task_rows(n_students=args.students, tasks_per_course=20)
+    )
+    X = features[feature_engineering.get_feature_names()].values
+    y = feature_engineering.calculate_target_variable(features).values
+    # Ruido en el target para obtener árboles profundos (modelo grande)
+    rng = np.random.default_rng(0)
+    y = np.where(rng.random(len(y)) < 0.2, 1 - y, y)
+
+    print(f"Entrenando bosque de {args.trees} árboles sin límite de profundidad...")
+    model = model_tuning.build_model({"n_estimators": args.trees, "max_depth": None, "n_jobs": -1}).fit(X, y)
+
+    with tempfile.TemporaryDirectory() as registry_dir:
+        registry = ModelRegistry(registry_dir)
+        metadata = registry.register(model, {}, feature_engineering.get_feature_names())
+        version = metadata["version"]
+        compiled_mb = sum(f["size"] for f in metadata["compiled"]["files"].values()) / 2**20
+        print(f"pickle: {metadata['size_bytes'] / 2**20:.1f} MB, bosque compilado: {compiled_mb:.1f} MB")
+
+        timings = {"pickle": [], "mmap": []}
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            registry.load(version)
+            timings["pickle"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            registry.load_compiled(version)
+            timings["mmap"].append(time.perf_counter() - start)
+
+        print(f"\nCarga de una versión (mediana de {args.repeat}):")
+        for mode, values in timings.items():
+            print(f"  {mode:<7} {np.median(values) * 1000:>9.2f} ms")
+
+        sample = X[rng.choice(len(X), size=min(len(X), 20_000), replace=False)]
+        print("\nMemoria total de N workers sirviendo la misma versión (sobre su línea base):")
+        print(f"{'workers':>8} {'modo':>7} {'RSS MB':>9} {'PSS MB':>9}")
+        for n_workers in args.workers:
+            for mode in ["pickle", "mmap"]:
+                memory = measure_workers(registry_dir, version, mode, sample, n_workers)
+                print(f"{n_workers:>8} {mode:>7} {memory['rss_mb']:>9.1f} {memory['pss_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Benchmark del camino rápido de /predict para un estudiante (sin pandas)
+
+1. Paridad sin base de datos: para cada estudiante-curso de un dataset sintético,
+   FeatureEngineering.features_from_rows (tuplas como las del cursor) debe dar
+   exactamente los mismos valores que calculate_features.
+2. Con la base de datos de DATABASE_URL: misma verificación para pares reales
+   (get_student_course_feature_row vs. get_student_course_data + calculate_features),
+   latencia de ambos caminos de datos y latencia de extremo a extremo de /predict
+   (cliente ASGI en proceso, sin caché, sin agrupador ni tabla materializada).
+
+Uso:
+    python benchmarks/bench_single_student.py [--students 2000] [--pairs 200] [--repeat 5]
+    python benchmarks/bench_single_student.py --skip-db
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.feature_engineering import FeatureEngineering
+from benchmarks.synthetic import generate_task_rows
+
+
+def as_cursor_rows(group: pd.DataFrame) -> list:
+    """Filas de un grupo como las tuplas del cursor DB-API (None en lugar de NaN/NaT, datetime de Python)"""
+    columns = []
+    for name in FeatureEngineering.ROW_COLUMNS:
+        values = group[name].astype(object).tolist()
+        columns.append([
+            None if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value))
+            else value.to_pydatetime() if isinstance(value, pd.Timestamp) else value
+            for value in values
+        ])
+    return list(zip(*columns))
+
+
+def assert_same_features(fast: dict, reference: dict, label: str):
+    """Igualdad exacta (bit a bit) de las features y de los ids"""
+    assert fast is not None, f"{label}: el camino rápido no encontró datos"
+    assert list(fast) == list(reference), f"{label}: columnas distintas {list(fast)} vs {list(reference)}"
+    for name, value in reference.items():
+        if fast[name] != value and not (np.isnan(fast[name]) and np.isnan(value)):
+            raise AssertionError(f"{label}: {name} = {fast[name]!r} vs {value!r}")
+
+
+def check_synthetic_parity(n_students: int) -> int:
+    feature_engineering = FeatureEngineering()
+    data = generate_task_rows(n_students=n_students, tasks_per_course=20, n_courses=20)
+    reference = feature_engineering.calculate_features(data.copy())
+    reference_rows = {
+        (int(row["student_id"]), int(row["course_id"])): row
+        for row in (reference.iloc[i].to_dict() for i in range(len(reference)))
+    }
+    for (student_id, course_id), group in data.groupby(["student_id", "course_id"], sort=False):
+        fast = feature_engineering.features_from_rows(student_id, course_id, as_cursor_rows(group))
+        assert_same_features(fast, reference_rows[(student_id, course_id)], f"({student_id}, {course_id})")
+    return len(reference_rows)
+
+
+def median_ms(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1e3
+
+
+def run_database_benchmark(n_pairs: int, repeat: int):
+    # Solo el camino individual: sin caché, sin agrupador y sin tabla materializada
+    os.environ["PREDICTION_CACHE_ENABLED"] = "false"
+    os.environ["PREDICT_BATCH_WINDOW_SECONDS"] = "0"
+    os.environ["USE_FEATURE_TABLE"] = "false"
+    os.environ["RISK_SCORING_INTERVAL_SECONDS"] = "0"
+    import httpx
+    from sqlalchemy import text
+    import main
+
+    data_service = main.data_service
+    feature_engineering = main.feature_engineering
+    with data_service.engine.connect() as conn:
+        pairs = [tuple(row) for row in conn.execute(
+            text("SELECT DISTINCT student_id, course_id FROM enrollments ORDER BY student_id, course_id LIMIT :n"),
+            {"n": n_pairs}
+        ).all()]
+    if not pairs:
+        raise SystemExit("No hay inscripciones en la base de datos")
+
+    def pandas_path(student_id, course_id):
+        data = data_service.get_student_course_data(student_id, course_id)
+        if data.empty:
+            return None
+        return feature_engineering.calculate_features(data).iloc[-1].to_dict()
+
+    def fast_path(student_id, course_id):
+        return data_service.get_student_course_feature_row(student_id, course_id)
+
+    checked = 0
+    for student_id, course_id in pairs:
+        reference = pandas_path(student_id, course_id)
+        fast = fast_path(student_id, course_id)
+        if reference is None:
+            assert fast is None, f"({student_id}, {course_id}): el camino rápido encontró datos"
+            continue
+        assert_same_features(fast, reference, f"({student_id}, {course_id})")
+        checked += 1
+    print(f"Paridad exacta en {checked} pares de la base de datos")
+
+    pandas_ms = median_ms(lambda: [pandas_path(*pair) for pair in pairs], repeat) / len(pairs)
+    fast_ms = median_ms(lambda: [fast_path(*pair) for pair in pairs], repeat) / len(pairs)
+    print(f"{'datos + features':>22} pandas {pandas_ms:.3f} ms  rápido {fast_ms:.3f} ms  ({pandas_ms / fast_ms:.1f}x)")
+
+    if not main.model_service.is_model_loaded() and not main.model_service.load_model():
+        print("Sin modelo entrenado: se omite la medición de /predict")
+        return
+
+    async def predict_all():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            latencies = []
+            for student_id, course_id in pairs:
+                start = time.perf_counter()
+                response = await client.post("/predict", json={"student_id": student_id, "course_id": course_id})
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code in (200, 404), response.text
+            return latencies
+
+    results = {}
+    for fast in (False, True):
+        main.settings.FAST_SINGLE_STUDENT_FEATURES = fast
+        asyncio.run(predict_all())  # calentamiento
+        latencies = [latency for _ in range(repeat) for latency in asyncio.run(predict_all())]
+        results[fast] = (np.percentile(latencies, 50) * 1e3, np.percentile(latencies, 99) * 1e3)
+    print(
+        f"{'/predict':>22} pandas p50 {results[False][0]:.2f} ms p99 {results[False][1]:.2f} ms  "
+        f"rápido p50 {results[True][0]:.2f} ms p99 {results[True][1]:.2f} ms  "
+        f"({results[False][0] / results[True][0]:.1f}x en p50)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=2_000)
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-db", action="store_true", help="Solo la paridad con datos sintéticos")
+    args = parser.parse_args()
+
+    n_pairs = check_synthetic_parity(args.students)
+    print(f"Paridad exacta con calculate_features en {n_pairs} pares sintéticos")
+    if not args.skip_db:
+        run_database_benchmark(args.pairs, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Suite de benchmarks del servicio ML con datos de generate_synthetic_data
+
+Para cada escala (por defecto 1k, 10k y 100k estudiantes) genera un dataset con
+ml_service_colab_utils.generate_synthetic_data y mide por separado:
+  - FeatureEngineering.calculate_features
+  - ModelService.train_model
+  - ModelService.predict_with_proba (1 fila y todas), predict y predict_proba
+  - los endpoints POST /predict, GET /predict/batch (JSON y NDJSON) y
+    POST /predict/bulk con un cliente ASGI en proceso
+
+En los endpoints las consultas de DataService se responden con las filas
+sintéticas en memoria (sin base de datos ni caché de predicciones): se mide el
+servicio (thread pool, features, modelo, serialización), no Postgres.
+
+Los resultados se escriben en JSON (--output) y se comparan con una línea base
+guardada (--baseline, por defecto benchmarks/baseline.json): las etapas más
+lentas que la base en más de --tolerance se marcan como regresión y el script
+termina con código 1.
+
+Uso:
+    python benchmarks/bench_suite.py [--scales 1000 10000 100000] [--repeat 3] [--output results.json]
+    python benchmarks/bench_suite.py --scales 1000 10000 --save-baseline   # actualiza la línea base
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Agregar el directorio raíz del servicio y el del repositorio al path
+SERVICE_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(SERVICE_DIR))
+sys.path.insert(0, str(SERVICE_DIR.parent))
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+
+def median_time(fn, repeat: int) -> float:
+    """Mediana en segundos de repeat llamadas a fn()"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times))
+
+
+def serve_from_memory(data_service, rows: pd.DataFrame, feature_engineering):
+    """Responde las consultas de DataService que usan los endpoints con las filas sintéticas"""
+    by_pair = rows.groupby(["student_id", "course_id"]).indices
+    by_course = rows.groupby("course_id").indices
+    empty = np.array([], dtype=np.intp)
+
+    def course_rows(course_ids):
+        return np.concatenate([by_course.get(c, empty) for c in course_ids]) if course_ids else empty
+
+    def get_student_course_data(student_id, course_id):
+        return rows.iloc[by_pair.get((student_id, course_id), empty)].copy()
+
+    def get_student_course_feature_row(student_id, course_id):
+        # Tuplas como las del cursor (None en vez de NaN/NaT) para features_from_rows
+        data = rows.iloc[by_pair.get((student_id, course_id), empty)]
+        data = data.reindex(columns=feature_engineering.ROW_COLUMNS)
+        data = data.astype(object).where(data.notna(), None)
+        return feature_engineering.features_from_rows(student_id, course_id, list(data.itertuples(index=False)))
+
+    def get_course_students_data(course_id, aggregate=False):
+        data = rows.iloc[by_course.get(course_id, empty)].copy()
+        return feature_engineering.calculate_features(data) if aggregate else data
+
+    def get_bulk_features(course_ids=None, pairs=None, aggregate=False):
+        indices = [course_rows(course_ids or [])]
+        indices += [by_pair.get((s, c), empty) for s, c in (pairs or [])]
+        data = rows.iloc[np.unique(np.concatenate(indices))].copy()
+        return feature_engineering.calculate_features(data) if not data.empty else pd.DataFrame()
+
+    data_service.get_student_course_data = get_student_course_data
+    data_service.get_student_course_feature_row = get_student_course_feature_row
+    data_service.get_course_students_data = get_course_students_data
+    data_service.get_bulk_features = get_bulk_features
+    data_service.get_materialized_features = lambda *args, **kwargs: pd.DataFrame()
+    data_service.get_data_watermark = lambda *args, **kwargs: None
+    data_service.get_pair_watermarks = lambda *args, **kwargs: {}
+
+
+async def time_endpoints(app, pairs, course_ids, n_requests: int) -> dict:
+    """Mediana de latencia de cada endpoint sobre n_requests peticiones secuenciales"""
+    import httpx
+
+    calls = {
+        "POST /predict": lambda client, i: client.post(
+            "/predict", json={"student_id": pairs[i % len(pairs)][0], "course_id": pairs[i % len(pairs)][1]}
+        ),
+        "GET /predict/batch": lambda client, i: client.get(
+            "/predict/batch", params={"course_id": course_ids[i % len(course_ids)]}
+        ),
+        "GET /predict/batch (ndjson)": lambda client, i: client.get(
+            "/predict/batch", params={"course_id": course_ids[i % len(course_ids)], "stream": "true"}
+        ),
+        "POST /predict/bulk": lambda client, i: client.post(
+            "/predict/bulk", json={"course_ids": course_ids[:3]}
+        ),
+    }
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        for name, call in calls.items():
+            response = await call(client, 0)  # calentamiento
+            response.raise_for_status()
+            times = []
+            for i in range(n_requests):
+                start = time.perf_counter()
+                response = await call(client, i)
+                await response.aread()
+                times.append(time.perf_counter() - start)
+                response.raise_for_status()
+            results[name] = {"seconds": float(np.median(times)), "runs": n_requests}
+    return results
+
+
+def run_scale(n_students: int, args, main, generate_synthetic_data) -> dict:
+    stages = {}
+
+    start = time.perf_counter()
+    rows = generate_synthetic_data(n_students=n_students, n_courses=args.courses, random_seed=42)
+    stages["generate_synthetic_data"] = {"seconds": time.perf_counter() - start, "runs": 1}
+
+    feature_engineering = main.feature_engineering
+    features = feature_engineering.calculate_features(rows.copy())
+    stages["calculate_features"] = {
+        "seconds": median_time(lambda: feature_engineering.calculate_features(rows.copy()), args.repeat),
+        "runs": args.repeat,
+    }
+
+    # train_model imprime métricas y el reporte de clasificación: se silencian
+    model_service = main.model_service
+    with contextlib.redirect_stdout(io.StringIO()):
+        stages["train_model"] = {
+            "seconds": median_time(lambda: model_service.train_model(features), args.repeat),
+            "runs": args.repeat,
+        }
+        model_service.save_model()
+
+    X = features[feature_engineering.get_feature_names()].values
+    single = X[:1]
+    n_single = 200
+    stages["predict_with_proba (1 fila)"] = {
+        "seconds": median_time(lambda: model_service.predict_with_proba(single), n_single),
+        "runs": n_single,
+    }
+    for name, fn in [
+        ("predict_with_proba (todas)", model_service.predict_with_proba),
+        ("predict (todas)", model_service.predict),
+        ("predict_proba (todas)", model_service.predict_proba),
+    ]:
+        stages[name] = {"seconds": median_time(lambda: fn(X), args.repeat), "runs": args.repeat}
+
+    serve_from_memory(main.data_service, rows, feature_engineering)
+    pairs = [(int(s), int(c)) for s, c in features[["student_id", "course_id"]].head(args.requests).values]
+    course_ids = sorted(int(c) for c in rows["course_id"].unique())
+    stages.update(asyncio.run(time_endpoints(main.app, pairs, course_ids, args.requests)))
+
+    return {
+        "n_students": n_students,
+        "n_rows": int(len(rows)),
+        "n_pairs": int(len(features)),
+        "stages": stages,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    """Etapas más lentas que la línea base en más de tolerance (y más de min_delta segundos)"""
+    regressions = []
+    for scale, current in results["scales"].items():
+        base_scale = baseline.get("scales", {}).get(scale)
+        if base_scale is None:
+            continue
+        for stage, values in current["stages"].items():
+            base = base_scale["stages"].get(stage)
+            if base is None or stage == "generate_synthetic_data":
+                continue
+            ratio = values["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+            values["baseline_seconds"] = base["seconds"]
+            values["ratio"] = round(ratio, 3)
+            if ratio > 1 + tolerance and values["seconds"] - base["seconds"] > min_delta:
+                regressions.append({
+                    "scale": int(scale), "stage": stage,
+                    "seconds": values["seconds"], "baseline_seconds": base["seconds"], "ratio": round(ratio, 3),
+                })
+    return regressions
+
+
+def print_table(results: dict):
+    print(f"\n{'escala':>8} {'etapa':<30} {'tiempo':>12} {'base':>12} {'razón':>7}")
+    for scale, current in results["scales"].items():
+        for stage, values in current["stages"].items():
+            base = values.get("baseline_seconds")
+            ratio = values.get("ratio")
+            print(
+                f"{scale:>8} {stage:<30} {format_seconds(values['seconds']):>12} "
+                f"{format_seconds(base) if base is not None else '-':>12} "
+                f"{f'{ratio:.2f}x' if ratio is not None else '-':>7}"
+            )
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f} µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.2f} s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--courses", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=20, help="peticiones por endpoint")
+    parser.add_argument("--output", type=Path, help="archivo JSON con los resultados")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="guardar los resultados como línea base")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="aumento relativo tolerado (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.2, help="diferencia mínima para marcar regresión")
+    args = parser.parse_args()
+
+    # El servicio se configura antes de importarlo: registro de modelos temporal, sin
+    # tabla materializada ni caché (cada petición hace el cálculo completo)
+    registry_dir = tempfile.mkdtemp(prefix="bench-registry-")
+    os.environ["MODEL_REGISTRY_DIR"] = registry_dir
+    os.environ["USE_FEATURE_TABLE"] = "false"
+    os.environ["PREDICTION_CACHE_ENABLED"] = "false"
+
+    import sklearn
+    import main as service
+    from ml_service_colab_utils import generate_synthetic_data
+
+    results = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sklearn": sklearn.__version__,
+            "repeat": args.repeat,
+            "requests": args.requests,
+        },
+        "scales": {},
+    }
+    try:
+        for n_students in args.scales:
+            print(f"Escala {n_students:,} estudiantes...")
+            results["scales"][str(n_students)] = run_scale(n_students, args, service, generate_synthetic_data)
+    finally:
+        shutil.rmtree(registry_dir, ignore_errors=True)
+
+    regressions = []
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms / 1000)
+        results["baseline"] = {"path": str(args.baseline), "created_at": baseline["meta"]["created_at"]}
+    results["regressions"] = regressions
+
+    print_table(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"\nResultados en {args.output}")
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"\nLínea base guardada en {args.baseline}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regresiones (más de {args.tolerance:.0%} sobre la línea base):")
+        for r in regressions:
+            print(f"  {r['scale']:>8} {r['stage']:<30} {r['ratio']:.2f}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark de memoria de la carga de datos de entrenamiento: todo el DataFrame
+de filas tarea×inscripción vs. lectura por partes con FeatureAccumulator
+
+Cada modo corre en un proceso nuevo y se informa su memoria residente máxima
+(ru_maxrss). El modo por partes simula el cursor del lado del servidor: las
+filas se generan por bloques de estudiantes, en el orden de la consulta, y cada
+bloque se descarta después de agregarlo.
+
+Uso:
+    python benchmarks/bench_training_memory.py [--students 200000] [--tasks 40] [--chunk-size 50000]
+"""
+
+import argparse
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.feature_engineering import FeatureEngineering, FeatureAccumulator
+from services.training_jobs import peak_rss_mb
+from benchmarks.synthetic import generate_task_rows
+
+
+def iter_chunks(n_students: int, tasks_per_course: int, chunk_size: int):
+    """Filas en partes de ~chunk_size, ordenadas por estudiante y curso"""
+    students_per_chunk = max(1, chunk_size // tasks_per_course)
+    for block, first in enumerate(range(0, n_students, students_per_chunk)):
+        rows = generate_task_rows(
+            n_students=min(students_per_chunk, n_students - first),
+            tasks_per_course=tasks_per_course,
+            random_seed=block
+        )
+        rows["student_id"] += first
+        rows["submission_id"] += block * students_per_chunk * tasks_per_course
+        yield rows
+
+
+def run(mode: str, args, results):
+    feature_engineering = FeatureEngineering()
+    start = time.perf_counter()
+    if mode == "completo":
+        rows = pd.concat(iter_chunks(args.students, args.tasks, args.chunk_size), ignore_index=True)
+        features = feature_engineering.calculate_features(rows)
+    else:
+        accumulator = FeatureAccumulator(feature_engineering)
+        for chunk in iter_chunks(args.students, args.tasks, args.chunk_size):
+            accumulator.add(chunk)
+        features = accumulator.finalize()
+    results.put((mode, len(features), time.perf_counter() - start, peak_rss_mb()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=200_000)
+    parser.add_argument("--tasks", type=int, default=40)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    args = parser.parse_args()
+
+    print(f"{args.students * args.tasks:,} filas, partes de {args.chunk_size:,}")
+    print(f"{'modo':>10} {'pares':>9} {'tiempo s':>9} {'RSS máx MB':>11}")
+    context = multiprocessing.get_context("spawn")
+    for mode in ["completo", "por partes"]:
+        results = context.Queue()
+        process = context.Process(target=run, args=(mode, args, results))
+        process.start()
+        mode, n_pairs, elapsed, peak = results.get()
+        process.join()
+        print(f"{mode:>10} {n_pairs:>9,} {elapsed:>9.2f} {peak:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
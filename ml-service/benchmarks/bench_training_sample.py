@@ -0,0 +1,131 @@
+"""
+Benchmark del muestreo estratificado de entrenamiento (StratifiedReservoir)
+
+1. Pasada por partes sobre filas tarea×inscripción sintéticas (FeatureAccumulator
+   con el muestreador como destino): verifica que cada estrato tenga exactamente
+   su cuota proporcional, que las features muestreadas sean idénticas a las de
+   calculate_features para esos pares y que el búfer no pase de ~4 x la muestra.
+2. Curva precisión/tiempo: ajusta el RandomForest de producción con muestras de
+   distintos tamaños de la partición de entrenamiento y con toda ella, y evalúa
+   todas sobre la misma partición de prueba (con 10% de ruido en el target).
+
+Los cursos sintéticos no tienen asignatura ni periodo: se asignan 4 asignaturas y
+2 periodos por course_id.
+
+Uso:
+    python benchmarks/bench_training_sample.py [--students 100000] [--sample-size 10000]
+"""
+
+import argparse
+import sys
+import time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Agregar el directorio raíz al path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from services.feature_engineering import FeatureEngineering, FeatureAccumulator
+from services.training_sampler import StratifiedReservoir, training_strata
+from services import model_tuning
+from benchmarks.synthetic import generate_task_rows
+
+
+SUBJECTS = ["Matemáticas", "Lenguaje", "Ciencias", "Historia"]
+
+
+def synthetic_courses(course_ids) -> pd.DataFrame:
+    course_ids = np.unique(course_ids)
+    return pd.DataFrame({
+        "subject": [SUBJECTS[c % len(SUBJECTS)] for c in course_ids],
+        "term": [f"2024-{1 + c % 2}" for c in course_ids],
+    }, index=pd.Index(course_ids, name="course_id"))
+
+
+def check_streaming_pass(rows: pd.DataFrame, reference: pd.DataFrame, strata, sample_size: int, chunksize: int):
+    feature_engineering = FeatureEngineering()
+    sampler = StratifiedReservoir(sample_size, strata)
+    accumulator = FeatureAccumulator(feature_engineering, sink=sampler.add)
+    start = time.perf_counter()
+    for offset in range(0, len(rows), chunksize):
+        accumulator.add(rows.iloc[offset:offset + chunksize].reset_index(drop=True))
+    accumulator.finalize()
+    sample = sampler.sample()
+    elapsed = time.perf_counter() - start
+    report = sampler.report()
+
+    assert len(sample) == min(sample_size, len(reference)), f"La muestra tiene {len(sample)} pares"
+    assert report["shortfall"] == 0, f"Faltaron {report['shortfall']} pares para las cuotas"
+    for key, counts in report["strata"].items():
+        expected = sample_size * counts["population"] / report["population"]
+        assert abs(counts["sampled"] - expected) < 1, f"{key}: {counts['sampled']} vs. {expected:.1f}"
+    merged = sample.merge(reference, on=["student_id", "course_id"], suffixes=("", "_ref"), validate="one_to_one")
+    assert len(merged) == len(sample), "Hay pares muestreados que no existen en la historia"
+    for name in feature_engineering.get_feature_names():
+        assert np.array_equal(merged[name].to_numpy(), merged[f"{name}_ref"].to_numpy(), equal_nan=True), name
+    assert report["peak_buffered"] <= 4 * sample_size + chunksize, f"Búfer de {report['peak_buffered']} filas"
+
+    print(
+        f"Pasada por partes: {len(rows):,} filas, {report['population']:,} pares -> {report['sampled']:,} "
+        f"({report['fraction']:.2%}) en {elapsed:.2f}s; {len(report['strata'])} estratos con su cuota exacta, "
+        f"búfer máximo {report['peak_buffered']:,} pares, {report['compactions']} compactaciones"
+    )
+
+
+def tradeoff(features: pd.DataFrame, strata, sample_sizes: list):
+    feature_engineering = FeatureEngineering()
+    # Ruido en el target (10%) para que la precisión dependa del tamaño de la muestra
+    rng = np.random.default_rng(0)
+    y_all = feature_engineering.calculate_target_variable(features).to_numpy()
+    features = features.assign(_target=np.where(rng.random(len(y_all)) < 0.1, 1 - y_all, y_all))
+    test_mask = rng.random(len(features)) < 0.2
+    train, test = features[~test_mask], features[test_mask]
+    X_test = test[feature_engineering.get_feature_names()].values
+    y_test = test["_target"].to_numpy()
+
+    print(f"{'pares':>9} {'fracción':>9} {'ajuste (s)':>11} {'accuracy':>9} {'f1':>7}")
+    for size in sorted(s for s in sample_sizes if s < len(train)) + [len(train)]:
+        if size < len(train):
+            sampler = StratifiedReservoir(size, strata)
+            for offset in range(0, len(train), 5_000):
+                sampler.add(train.iloc[offset:offset + 5_000])
+            part = sampler.sample()
+        else:
+            part = train
+        X = part[feature_engineering.get_feature_names()].values
+        y = part["_target"].to_numpy()
+        model = model_tuning.build_model()
+        start = time.perf_counter()
+        model.fit(X, y)
+        fit_seconds = time.perf_counter() - start
+        metrics = model_tuning.evaluate_predictions(y_test, model.predict(X_test))
+        print(
+            f"{len(part):>9,} {len(part) / len(train):>9.2%} {fit_seconds:>11.2f} "
+            f"{metrics['accuracy']:>9.3f} {metrics['f1_score']:>7.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=100_000)
+    parser.add_argument("--sample-size", type=int, default=10_000)
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument("--curve", type=int, nargs="+", default=[2_000, 5_000, 10_000, 20_000, 40_000])
+    args = parser.parse_args()
+
+    feature_engineering = FeatureEngineering()
+    rows = generate_task_rows(n_students=args.students, tasks_per_course=20)
+    reference = feature_engineering.calculate_features(rows.copy())
+    strata = partial(
+        training_strata, courses=synthetic_courses(rows["course_id"]), feature_engineering=feature_engineering
+    )
+
+    check_streaming_pass(rows, reference, strata, args.sample_size, args.chunksize)
+    tradeoff(reference, strata, args.curve)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Generador vectorizado de filas tarea×inscripción para los benchmarks
+Produce el mismo esquema que DataService.get_historical_data()
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def generate_task_rows(
+    n_students=10_000,
+    tasks_per_course=40,
+    n_courses=50,
+    random_seed=42
+) -> pd.DataFrame:
+    """
+    Genera una fila por tarea×inscripción (cada estudiante inscrito en un curso),
+    con entregas, notas y perfil del cuestionario con algunos valores faltantes.
+    """
+    rng = np.random.default_rng(random_seed)
+    base_date = pd.Timestamp("2024-03-04", tz="UTC")
+
+    student_ids = np.arange(1, n_students + 1)
+    student_course = rng.integers(1, n_courses + 1, size=n_students)
+
+    # Fila por estudiante × tarea de su curso
+    student_idx = np.repeat(np.arange(n_students), tasks_per_course)
+    task_num = np.tile(np.arange(tasks_per_course), n_students)
+    course_id = student_course[student_idx]
+    task_id = (course_id - 1) * tasks_per_course + task_num + 1
+    n_rows = len(student_idx)
+
+    due_date = base_date + pd.to_timedelta(task_num * 7 + 7, unit="D")
+    task_created_at = base_date + pd.to_timedelta(task_num * 7, unit="D")
+
+    # Perfil de riesgo por estudiante
+    high_risk = rng.random(n_students) < 0.3
+    submit_prob = np.where(high_risk, 0.55, 0.88)[student_idx]
+    late_prob = np.where(high_risk, 0.6, 0.2)[student_idx]
+    mean_grade = np.where(high_risk, 3.3, 5.5)[student_idx]
+
+    submitted = rng.random(n_rows) < submit_prob
+    late = rng.random(n_rows) < late_prob
+    offset_days = np.where(late, rng.integers(1, 15, n_rows), rng.integers(-2, 1, n_rows))
+    submitted_at = pd.Series(due_date + pd.to_timedelta(offset_days, unit="D"))
+    submitted_at[~submitted] = pd.NaT
+
+    graded = submitted & (rng.random(n_rows) < 0.9)
+    grade = np.round(np.clip(rng.normal(mean_grade, 1.0), 1.0, 7.0), 2)
+    grade = np.where(graded, grade, np.nan)
+
+    submission_id = np.full(n_rows, np.nan)
+    submission_id[submitted] = np.arange(1, submitted.sum() + 1)
+
+    data = pd.DataFrame({
+        "task_id": task_id,
+        "course_id": course_id,
+        "due_date": due_date,
+        "task_created_at": task_created_at,
+        "student_id": student_ids[student_idx],
+        "enrollment_date": base_date - pd.Timedelta(days=10),
+        "submission_id": submission_id,
+        "submitted_at": submitted_at,
+        "grade": grade,
+    })
+
+    # Perfil del cuestionario (escala 1-10); ~5% de estudiantes sin cuestionario
+    has_profile = rng.random(n_students) >= 0.05
+    for col in [
+        "motivation", "available_time", "sleep_hours", "study_hours",
+        "enjoyment_studying", "study_place_tranquility", "academic_pressure"
+    ]:
+        values = np.where(has_profile, rng.integers(1, 11, n_students).astype(float), np.nan)
+        data[col] = values[student_idx]
+    genders = np.array(["Femenino", "Masculino", "Otro", None], dtype=object)
+    gender = genders[rng.integers(0, 4, n_students)]
+    gender[~has_profile] = None
+    data["gender"] = gender[student_idx]
+
+    return data
@@ -2,13 +2,19 @@
 Microservicio de Machine Learning para Predicción de Riesgo Académico
 """
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 import os
 import sys
+import json
+import asyncio
+from datetime import datetime, timezone
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
 # Agregar el directorio actual al path para imports
@@ -17,6 +23,13 @@ sys.path.insert(0, str(Path(__file__).parent))
 from services.feature_engineering import FeatureEngineering
 from services.model_service import ModelService
 from services.data_service import DataService
+from services.async_data_service import AsyncDataService
+from services.prediction_cache import PredictionCache
+from services.training_jobs import TrainingJobManager, TrainingJobConflict, SUCCEEDED, FINISHED_STATES
+from services.risk_scoring import RiskScorer, RiskScoringConflict, records_for_response
+from services.micro_batcher import MicroBatcher
+from services.scoring_pool import ScoringPool
+from services import metrics
 from core.config import settings
 
 app = FastAPI(
@@ -36,8 +49,27 @@ app.add_middleware(
 
 # Inicializar servicios
 data_service = DataService()
+async_data = AsyncDataService(data_service)
+# Features, evaluación del modelo y serialización fuera del event loop (429 con la cola llena)
+scoring_pool = ScoringPool(max_workers=settings.SCORING_WORKERS, max_pending=settings.SCORING_MAX_PENDING)
 feature_engineering = FeatureEngineering()
 model_service = ModelService()
+prediction_cache = PredictionCache(
+    max_entries=settings.PREDICTION_CACHE_MAX_ENTRIES,
+    max_rows=settings.PREDICTION_CACHE_MAX_ROWS,
+    ttl_seconds=settings.PREDICTION_CACHE_TTL_SECONDS
+)
+# Al terminar un entrenamiento, poner en servicio la versión promovida sin esperar al próximo chequeo
+training_jobs = TrainingJobManager(
+    on_success=lambda result: model_service.check_for_updates(force=True),
+    max_history=settings.TRAINING_JOB_HISTORY,
+    engine=data_service.engine
+)
+# Puntajes de riesgo persistidos en risk_scores (evaluación programada de toda la plataforma)
+risk_scorer = RiskScorer(data_service, model_service, feature_engineering)
+risk_scoring_task = None
+# Referencias a las evaluaciones lanzadas con POST /scores/refresh (evita que se recolecten)
+risk_scoring_runs = set()
 
 
 class PredictionRequest(BaseModel):
@@ -52,6 +84,9 @@ class PredictionResponse(BaseModel):
     risk_score: float  # Probabilidad de riesgo (0-1)
     features: dict
     confidence: float
+    # Solo con explain=true: aporte de cada feature a risk_score (risk_score ≈ base_value + suma)
+    contributions: Optional[dict] = None
+    base_value: Optional[float] = None
 
 
 class TrainingResponse(BaseModel):
@@ -62,6 +97,407 @@ class TrainingResponse(BaseModel):
     f1_score: Optional[float] = None
     samples_trained: int
     message: str
+    model_version: Optional[str] = None
+    tuning: Optional[dict] = None  # Resultado de la búsqueda de hiperparámetros (tune=true)
+    peak_rss_mb: Optional[float] = None  # Memoria residente máxima del proceso de entrenamiento
+    dataset_version: Optional[str] = None  # Versión del snapshot de datos usada (snapshot=true)
+    incremental: Optional[dict] = None  # Modo usado, árboles y tiempo ahorrado (incremental=true)
+    sampling: Optional[dict] = None  # Fracción muestreada, estratos y curva precisión/tiempo (sample_size)
+
+
+def predict_model(X, explain: bool = False):
+    """
+    Evalúa el modelo en servicio. Con explain=true también calcula la contribución
+    de cada feature (misma pasada por los árboles).
+    
+    Returns:
+        (predicciones, probabilidades, contribuciones o None, valor base o None)
+    """
+    if not explain:
+        predictions, probabilities = model_service.predict_with_proba(X)
+        return predictions, probabilities, None, None
+    try:
+        return model_service.predict_with_contributions(np.asarray(X, dtype=np.float64))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def evaluate_model(X, explain: bool = False):
+    """predict_model medido como etapa "model" de la petición (corre en scoring_pool)"""
+    metrics.observe_batch(len(X))
+    with metrics.stage("model"):
+        return predict_model(X, explain)
+
+
+def compute_features(data: pd.DataFrame) -> pd.DataFrame:
+    """calculate_features medido como etapa "features" (corre en scoring_pool)"""
+    with metrics.stage("features"):
+        return feature_engineering.calculate_features(data)
+
+
+def json_response(content) -> JSONResponse:
+    """Serializa la respuesta como etapa "serialize" (corre en scoring_pool)"""
+    with metrics.stage("serialize"):
+        return JSONResponse(content)
+
+
+def build_prediction_records(
+    features_df: pd.DataFrame, predictions, probabilities, feature_columns: list,
+    contributions=None, base_value: Optional[float] = None
+) -> List[dict]:
+    """
+    Construye las respuestas de predicción de todas las filas de una vez
+    (probabilidades, niveles y redondeo vectorizados, sin iterrows)
+    
+    contributions (n_filas, n_features, en el orden de get_feature_names) agrega
+    a cada respuesta el aporte por feature y el valor base del modelo.
+    """
+    probabilities = np.asarray(probabilities)
+    if probabilities.shape[1] > 1:
+        risk_scores = np.round(probabilities[:, 1], 3)
+        confidences = np.round(np.abs(probabilities[:, 1] - probabilities[:, 0]), 3)
+    else:
+        risk_scores = np.full(len(features_df), 0.5)
+        confidences = np.full(len(features_df), 0.5)
+    risk_levels = np.where(np.asarray(predictions) == 1, "alto", "bajo")
+    
+    features = features_df[feature_columns].round(3).to_dict(orient="records")
+    student_ids = features_df['student_id'].astype(int).tolist()
+    course_ids = features_df['course_id'].astype(int).tolist()
+    
+    if contributions is not None:
+        feature_names = feature_engineering.get_feature_names()
+        base_value = round(float(base_value), 4)
+        return [
+            {
+                "student_id": student_id,
+                "course_id": course_id,
+                "risk_level": risk_level,
+                "risk_score": risk_score,
+                "features": row_features,
+                "confidence": confidence,
+                "contributions": dict(zip(feature_names, row_contributions)),
+                "base_value": base_value
+            }
+            for student_id, course_id, risk_level, risk_score, confidence, row_features, row_contributions in zip(
+                student_ids, course_ids, risk_levels.tolist(), risk_scores.tolist(),
+                confidences.tolist(), features, np.round(contributions, 4).tolist()
+            )
+        ]
+    
+    return [
+        {
+            "student_id": student_id,
+            "course_id": course_id,
+            "risk_level": risk_level,
+            "risk_score": risk_score,
+            "features": row_features,
+            "confidence": confidence
+        }
+        for student_id, course_id, risk_level, risk_score, confidence, row_features in zip(
+            student_ids, course_ids, risk_levels.tolist(), risk_scores.tolist(),
+            confidences.tolist(), features
+        )
+    ]
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request, stream: bool) -> bool:
+    """El cliente pide NDJSON con ?stream=true o con Accept: application/x-ndjson"""
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def iter_ndjson(records):
+    """Serializa registros como líneas NDJSON"""
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def score_stream_chunk(
+    chunk: pd.DataFrame, feature_columns: list, endpoint: str = None, explain: bool = False
+) -> str:
+    """Evalúa un bloque de stream_predictions y lo serializa como NDJSON (corre en scoring_pool)"""
+    metrics.observe_batch(len(chunk), endpoint=endpoint)
+    with metrics.stage("model", endpoint=endpoint):
+        predictions, probabilities, contributions, base_value = predict_model(
+            chunk[feature_engineering.get_feature_names()].values, explain
+        )
+    with metrics.stage("serialize", endpoint=endpoint):
+        records = build_prediction_records(
+            chunk, predictions, probabilities, feature_columns, contributions, base_value
+        )
+        return "".join(iter_ndjson(records))
+
+
+def serialize_ndjson(records: List[dict], endpoint: str = None) -> str:
+    """Registros ya calculados (caché) como NDJSON (corre en scoring_pool)"""
+    with metrics.stage("serialize", endpoint=endpoint):
+        return "".join(iter_ndjson(records))
+
+
+async def stream_predictions(
+    reservation, features_df: pd.DataFrame, feature_columns: list, chunk_size: int,
+    endpoint: str = None, explain: bool = False
+):
+    """
+    Evalúa el modelo por bloques de chunk_size filas y emite cada bloque como
+    NDJSON apenas está listo: el primer byte sale tras el primer bloque y en
+    memoria nunca hay más de un bloque de respuestas.
+    
+    Cada bloque corre en scoring_pool dentro de reservation (un lugar de la cola
+    reservado por el handler para toda la respuesta, que se libera al terminar o
+    si el cliente se desconecta). El generador corre después de que el handler
+    retornó, así que las etapas se atribuyen explícitamente a endpoint.
+    """
+    try:
+        for start in range(0, len(features_df), chunk_size):
+            yield await reservation.run(
+                score_stream_chunk, features_df.iloc[start:start + chunk_size], feature_columns, endpoint, explain
+            )
+    finally:
+        reservation.release()
+
+
+async def stream_cached_predictions(reservation, records: List[dict], chunk_size: int, endpoint: str = None):
+    """Como stream_predictions, para registros que ya estaban en la caché"""
+    try:
+        for start in range(0, len(records), chunk_size):
+            yield await reservation.run(serialize_ndjson, records[start:start + chunk_size], endpoint)
+    finally:
+        reservation.release()
+
+
+async def prediction_cache_key(kind: str, course_id: int, student_id: Optional[int] = None):
+    """
+    Clave de caché: (tipo, estudiante, curso, versión del modelo, marca de agua de datos).
+    Retorna None si la caché está deshabilitada o no se pudo obtener la marca de agua.
+    """
+    if not settings.PREDICTION_CACHE_ENABLED:
+        return None
+    
+    watermark = await async_data.get_data_watermark(course_id, student_id=student_id)
+    if watermark is None:
+        return None
+    
+    return (kind, student_id, course_id, model_service.model_version, watermark)
+
+
+def frame_rows(features_df: pd.DataFrame) -> List[dict]:
+    """Filas de un DataFrame de features como dicts (mismos valores que iloc[i].to_dict())"""
+    columns = list(features_df.columns)
+    return [dict(zip(columns, row)) for row in features_df.to_numpy()]
+
+
+async def load_student_course_features(student_id: int, course_id: int) -> dict:
+    """
+    Obtiene las features de un estudiante en un curso (dict con ids y features):
+    primero desde la tabla materializada (búsqueda por clave primaria) y, si no hay
+    fila, con el camino rápido sin pandas (FAST_SINGLE_STUDENT_FEATURES) o con el
+    join completo. Lanza 404 si el estudiante no tiene datos en el curso.
+    """
+    if settings.USE_FEATURE_TABLE:
+        features_df = await async_data.get_materialized_features(student_id=student_id, course_id=course_id)
+        if not features_df.empty:
+            return frame_rows(features_df)[-1]
+    
+    features = None
+    if settings.FAST_SINGLE_STUDENT_FEATURES:
+        features = await async_data.get_student_course_feature_row(student_id=student_id, course_id=course_id)
+    else:
+        student_data = await async_data.get_student_course_data(student_id=student_id, course_id=course_id)
+        if student_data is not None and not student_data.empty:
+            features = frame_rows(await scoring_pool.run(compute_features, student_data))[-1]
+    
+    if features is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No se encontraron datos para el estudiante {student_id} en el curso {course_id}"
+        )
+    return features
+
+
+async def load_course_features(course_id: int, sql_aggregate: bool) -> pd.DataFrame:
+    """
+    Obtiene las features de todos los estudiantes de un curso: desde la tabla
+    materializada si está habilitada y tiene filas; si no, agregando en Postgres
+    (sql_aggregate) o en pandas.
+    """
+    if settings.USE_FEATURE_TABLE:
+        features_df = await async_data.get_materialized_features(course_id=course_id)
+        if not features_df.empty:
+            return features_df
+    
+    if sql_aggregate:
+        return await async_data.get_course_students_data(course_id=course_id, aggregate=True)
+    
+    students_data = await async_data.get_course_students_data(course_id=course_id)
+    
+    if students_data is None or students_data.empty:
+        return pd.DataFrame()
+    
+    return await scoring_pool.run(compute_features, students_data)
+
+
+async def load_bulk_features(course_ids: List[int], pairs: list, sql_aggregate: bool) -> pd.DataFrame:
+    """
+    Obtiene con una sola consulta las features de varios cursos completos y de
+    pares (estudiante, curso) explícitos, con el mismo orden de fuentes que
+    load_course_features. Los cursos y pares sin filas en la tabla materializada
+    (por ejemplo, cargados sin pasar por el CRUD) se calculan con el join completo.
+    """
+    missing_courses, missing_pairs = course_ids, pairs
+    materialized = pd.DataFrame()
+    if settings.USE_FEATURE_TABLE:
+        materialized = await async_data.get_materialized_features(course_ids=course_ids, pairs=pairs)
+        if not materialized.empty:
+            found_courses = set(materialized['course_id'].astype(int))
+            found_pairs = set(zip(materialized['student_id'].astype(int), materialized['course_id'].astype(int)))
+            missing_courses = [course_id for course_id in course_ids if course_id not in found_courses]
+            missing_pairs = [pair for pair in pairs if pair not in found_pairs]
+            if not missing_courses and not missing_pairs:
+                return materialized
+    
+    computed = await async_data.get_bulk_features(
+        course_ids=missing_courses, pairs=missing_pairs, aggregate=sql_aggregate
+    )
+    if materialized.empty:
+        return computed
+    if computed.empty:
+        return materialized
+    # Un par pedido explícitamente puede venir también en un curso faltante
+    return pd.concat([materialized, computed], ignore_index=True).drop_duplicates(
+        ['student_id', 'course_id'], keep='first'
+    )
+
+
+async def predict_student_course_pairs(pairs: list) -> dict:
+    """
+    Lote del agrupador de /predict: marcas de agua de todos los pares con una consulta
+    (para la caché), features de los pares no cacheados con una consulta a la tabla
+    materializada (y otra con el join completo para los pares sin fila, o el camino
+    rápido sin pandas si falta uno solo) y una sola llamada al modelo.
+    
+    Returns:
+        {(student_id, course_id): PredictionResponse}; los pares sin datos no aparecen
+    """
+    responses = {}
+    cache_keys = {}
+    if settings.PREDICTION_CACHE_ENABLED:
+        watermarks = await async_data.get_pair_watermarks(pairs)
+        for pair, watermark in watermarks.items():
+            cache_key = ("predict", pair[0], pair[1], model_service.model_version, watermark)
+            cached = prediction_cache.get(cache_key)
+            if cached is not None:
+                responses[pair] = cached
+            else:
+                cache_keys[pair] = cache_key
+    
+    rows = []
+    missing = [pair for pair in pairs if pair not in responses]
+    if missing and settings.USE_FEATURE_TABLE:
+        materialized = await async_data.get_materialized_features(pairs=missing)
+        if not materialized.empty:
+            rows += frame_rows(materialized)
+            found = set(zip(materialized['student_id'].astype(int), materialized['course_id'].astype(int)))
+            missing = [pair for pair in missing if pair not in found]
+    if len(missing) == 1 and settings.FAST_SINGLE_STUDENT_FEATURES:
+        student_id, course_id = missing[0]
+        features = await async_data.get_student_course_feature_row(student_id=student_id, course_id=course_id)
+        if features is not None:
+            rows.append(features)
+    elif missing:
+        computed = await async_data.get_bulk_features(pairs=missing)
+        if not computed.empty:
+            rows += frame_rows(computed)
+    if not rows:
+        return responses
+    
+    feature_names = feature_engineering.get_feature_names()
+    X = np.array([[features.get(f, 0) for f in feature_names] for features in rows], dtype=float)
+    predictions, probabilities, _, _ = await scoring_pool.run(evaluate_model, X)
+    
+    for index, features in enumerate(rows):
+        pair = (int(features['student_id']), int(features['course_id']))
+        response = prediction_response(
+            pair[0], pair[1], features, predictions[index:index + 1], probabilities[index:index + 1]
+        )
+        responses[pair] = response
+        if pair in cache_keys:
+            prediction_cache.put(cache_keys[pair], response)
+    return responses
+
+
+def prediction_response(
+    student_id: int, course_id: int, features: dict, prediction, probability
+) -> PredictionResponse:
+    """Respuesta de /predict para una fila (prediction y probability como los de predict_with_proba)"""
+    risk_level = "alto" if prediction[0] == 1 else "bajo"
+    risk_score = probability[0][1] if len(probability[0]) > 1 else 0.5
+    
+    # Calcular confianza (basada en la diferencia entre probabilidades)
+    confidence = abs(probability[0][1] - probability[0][0]) if len(probability[0]) > 1 else 0.5
+    
+    return PredictionResponse(
+        student_id=student_id,
+        course_id=course_id,
+        risk_level=risk_level,
+        risk_score=round(risk_score, 3),
+        features={k: round(v, 3) if isinstance(v, float) else v for k, v in features.items()},
+        confidence=round(confidence, 3)
+    )
+
+
+# Predicciones individuales concurrentes de /predict, resueltas por lotes
+predict_batcher = MicroBatcher(
+    predict_student_course_pairs,
+    window_seconds=settings.PREDICT_BATCH_WINDOW_SECONDS,
+    max_batch_size=settings.PREDICT_BATCH_MAX_SIZE
+) if settings.PREDICT_BATCH_WINDOW_SECONDS > 0 else None
+
+
+async def run_risk_scoring() -> Optional[dict]:
+    """Evalúa toda la plataforma en el pool de hilos de datos; None si no se ejecutó"""
+    if not model_service.is_model_loaded():
+        print("Evaluación de riesgo omitida: el modelo no está entrenado")
+        return None
+    try:
+        summary = await async_data.run(risk_scorer.score_all)
+    except RiskScoringConflict as e:
+        print(f"Evaluación de riesgo omitida: {e}")
+        return None
+    print(
+        f"Evaluación de riesgo {summary['status']}: {summary['rows']} filas de "
+        f"{summary['courses']} cursos en {summary['seconds']}s"
+    )
+    return summary
+
+
+async def risk_scoring_loop(interval: float):
+    """Reescribe risk_scores cada interval segundos"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_risk_scoring()
+        except Exception as e:
+            print(f"Error en la evaluación programada de riesgo: {e}")
+
+
+@app.on_event("startup")
+async def start_risk_scoring():
+    global risk_scoring_task
+    if settings.RISK_SCORING_INTERVAL_SECONDS > 0:
+        risk_scoring_task = asyncio.create_task(risk_scoring_loop(settings.RISK_SCORING_INTERVAL_SECONDS))
+
+
+@app.on_event("shutdown")
+def shutdown_services():
+    if risk_scoring_task is not None:
+        risk_scoring_task.cancel()
+    training_jobs.shutdown()
+    async_data.shutdown()
+    scoring_pool.shutdown()
 
 
 @app.get("/")
@@ -79,71 +515,214 @@ async def health_check():
     model_loaded = model_service.is_model_loaded()
     return {
         "status": "healthy",
-        "model_loaded": model_loaded
+        "model_loaded": model_loaded,
+        "model_version": model_service.model_version
     }
 
 
+def training_response(job: dict) -> TrainingResponse:
+    """Respuesta de entrenamiento a partir de un trabajo terminado con éxito"""
+    result = job["result"]
+    metrics = result["metrics"]
+    incremental = result.get("incremental")
+    if incremental and incremental["mode"] == "unchanged":
+        message = incremental["reason"]
+    elif incremental and incremental["mode"] == "incremental":
+        message = (
+            f"Modelo actualizado con {incremental['trees_added']} árboles nuevos "
+            f"({result['samples_trained']} muestras cambiadas)"
+        )
+    else:
+        message = f"Modelo entrenado exitosamente con {result['samples_trained']} muestras"
+    return TrainingResponse(
+        status="success",
+        accuracy=metrics.get("accuracy"),
+        precision=metrics.get("precision"),
+        recall=metrics.get("recall"),
+        f1_score=metrics.get("f1_score"),
+        samples_trained=result["samples_trained"],
+        message=message,
+        model_version=result["model_version"],
+        tuning=result.get("tuning"),
+        peak_rss_mb=result.get("peak_rss_mb"),
+        dataset_version=(result.get("dataset") or {}).get("version"),
+        incremental=incremental,
+        sampling=result.get("sampling")
+    )
+
+
+def start_training_job(
+    sql_aggregate: bool,
+    tune: bool,
+    snapshot: bool,
+    incremental: bool = False,
+    sample_size: int = 0
+) -> dict:
+    """Lanza un trabajo de entrenamiento; 409 si ya hay uno en curso"""
+    if sample_size < 0:
+        raise HTTPException(status_code=400, detail="sample_size debe ser 0 (sin muestreo) o positivo")
+    try:
+        return training_jobs.start({
+            "sql_aggregate": sql_aggregate,
+            "tune": tune,
+            "snapshot": snapshot,
+            "incremental": incremental,
+            "sample_size": sample_size
+        })
+    except TrainingJobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
 @app.post("/train", response_model=TrainingResponse)
-async def train_model():
+async def train_model(
+    sql_aggregate: bool = settings.SQL_FEATURE_AGGREGATION,
+    tune: bool = False,
+    snapshot: bool = settings.USE_TRAINING_SNAPSHOT,
+    incremental: bool = False,
+    sample_size: int = settings.TRAINING_SAMPLE_SIZE
+):
     """
-    Entrena el modelo de ML con los datos históricos de la base de datos
+    Entrena el modelo de ML con los datos históricos de la base de datos y espera el resultado
+    
+    El entrenamiento corre en un proceso aparte (igual que /train/jobs); esta ruta
+    solo espera a que termine sin bloquear el event loop.
+    Con sql_aggregate=true las features se agregan directamente en Postgres.
+    Con tune=true los hiperparámetros se eligen con validación cruzada en paralelo.
+    Con snapshot=true (por defecto) solo se releen de Postgres los cursos que cambiaron
+    desde el entrenamiento anterior.
+    Con incremental=true se agregan al modelo en servicio árboles ajustados solo con los
+    estudiante-curso que cambiaron desde su entrenamiento; si no es posible (o tocan
+    INCREMENTAL_MAX_ROUNDS incrementales seguidos) se entrena desde cero con las demás opciones.
+    Con sample_size > 0 el entrenamiento completo usa una muestra de ese número de pares
+    estratificada por nivel de riesgo, asignatura y periodo del curso.
     """
-    try:
-        # Obtener datos históricos
-        print("Obteniendo datos históricos...")
-        historical_data = data_service.get_historical_data()
-        
-        if historical_data.empty:
-            raise HTTPException(
-                status_code=400,
-                detail="No hay datos históricos disponibles para entrenar el modelo"
-            )
-        
-        print(f"Datos obtenidos: {len(historical_data)} registros")
-        
-        # Feature engineering
-        print("Calculando features...")
-        features_df = feature_engineering.calculate_features(historical_data)
-        
-        if features_df.empty:
-            raise HTTPException(
-                status_code=400,
-                detail="No se pudieron calcular features. Verifica que haya entregas con calificaciones."
-            )
-        
-        print(f"Features calculadas: {len(features_df)} registros")
-        
-        # Entrenar modelo
-        print("Entrenando modelo...")
-        metrics = model_service.train_model(features_df)
-        
-        # Guardar modelo
-        model_service.save_model()
-        
-        return TrainingResponse(
-            status="success",
-            accuracy=metrics.get("accuracy"),
-            precision=metrics.get("precision"),
-            recall=metrics.get("recall"),
-            f1_score=metrics.get("f1_score"),
-            samples_trained=len(features_df),
-            message=f"Modelo entrenado exitosamente con {len(features_df)} muestras"
-        )
+    job = await run_in_threadpool(start_training_job, sql_aggregate, tune, snapshot, incremental, sample_size)
     
-    except Exception as e:
-        print(f"Error al entrenar modelo: {e}")
-        import traceback
-        traceback.print_exc()
+    while job["status"] not in FINISHED_STATES:
+        await asyncio.sleep(0.5)
+        job = training_jobs.get(job["job_id"])
+    
+    if job["status"] != SUCCEEDED:
         raise HTTPException(
             status_code=500,
-            detail=f"Error al entrenar el modelo: {str(e)}"
+            detail=f"Error al entrenar el modelo: {job['error']}"
         )
+    
+    return training_response(job)
+
+
+@app.post("/train/jobs", status_code=202)
+async def create_training_job(
+    sql_aggregate: bool = settings.SQL_FEATURE_AGGREGATION,
+    tune: bool = False,
+    snapshot: bool = settings.USE_TRAINING_SNAPSHOT,
+    incremental: bool = False,
+    sample_size: int = settings.TRAINING_SAMPLE_SIZE
+):
+    """
+    Lanza el entrenamiento en segundo plano y retorna de inmediato el trabajo
+    (job_id, estado y etapa: loading, features, fitting, evaluating, saving).
+    Solo se permite un entrenamiento a la vez (también entre workers). Mismas opciones que /train.
+    """
+    return await run_in_threadpool(start_training_job, sql_aggregate, tune, snapshot, incremental, sample_size)
+
+
+@app.get("/train/jobs")
+async def list_training_jobs():
+    """
+    Lista los trabajos de entrenamiento recientes
+    """
+    return training_jobs.list()
+
+
+@app.get("/train/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """
+    Estado y progreso de un trabajo de entrenamiento
+    """
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"El trabajo {job_id} no existe")
+    return job
+
+
+@app.get("/train/jobs/{job_id}/result", response_model=TrainingResponse)
+async def get_training_job_result(job_id: str):
+    """
+    Resultado (métricas y versión) de un trabajo de entrenamiento terminado con éxito
+    """
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"El trabajo {job_id} no existe")
+    if job["status"] != SUCCEEDED:
+        detail = f"El trabajo {job_id} está en estado {job['status']}"
+        if job["error"]:
+            detail += f": {job['error']}"
+        raise HTTPException(status_code=409, detail=detail)
+    return training_response(job)
+
+
+@app.delete("/train/jobs/{job_id}")
+async def cancel_training_job(job_id: str):
+    """
+    Cancela un trabajo de entrenamiento en curso
+    """
+    try:
+        # En un hilo: cancel espera a que el proceso termine
+        job = await run_in_threadpool(training_jobs.cancel, job_id)
+    except TrainingJobConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"El trabajo {job_id} no existe")
+    return job
+
+
+@app.get("/models")
+async def list_model_versions():
+    """
+    Lista las versiones registradas del modelo y la versión en servicio
+    """
+    return {
+        "current_version": model_service.registry.current_version(),
+        "serving_version": model_service.model_version,
+        "versions": model_service.list_versions()
+    }
+
+
+@app.post("/models/{version}/promote")
+async def promote_model_version(version: str):
+    """
+    Promueve una versión registrada a producción
+    """
+    try:
+        return model_service.promote(version)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict_risk(request: PredictionRequest):
+@app.post("/models/rollback")
+async def rollback_model_version():
+    """
+    Vuelve a la versión promovida anteriormente
+    """
+    try:
+        return model_service.rollback()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@app.post("/predict", response_model=PredictionResponse, response_model_exclude_none=True)
+@metrics.instrument("predict")
+async def predict_risk(request: PredictionRequest, explain: bool = False):
     """
     Predice el riesgo académico de un estudiante en un curso específico
+    
+    Las peticiones concurrentes se agrupan (PREDICT_BATCH_WINDOW_SECONDS): cada lote
+    lee sus marcas de agua y sus features con una consulta cada una y se evalúa con
+    una sola llamada al modelo.
+    
+    Con explain=true la respuesta incluye la contribución de cada feature a
+    risk_score (descomposición por caminos de los árboles) y el valor base.
     """
     try:
         # Verificar que el modelo esté cargado
@@ -155,57 +734,45 @@ async def predict_risk(request: PredictionRequest):
                     detail="El modelo no está entrenado. Por favor, entrena el modelo primero con /train"
                 )
         
-        # Obtener datos del estudiante en el curso
-        student_data = data_service.get_student_course_data(
-            student_id=request.student_id,
-            course_id=request.course_id
-        )
-        
-        if student_data is None or student_data.empty:
-            raise HTTPException(
-                status_code=404,
-                detail=f"No se encontraron datos para el estudiante {request.student_id} en el curso {request.course_id}"
-            )
+        if predict_batcher is not None and not explain:
+            # Junto con las demás predicciones individuales concurrentes: una consulta de
+            # marcas de agua (caché), una de features y una llamada al modelo para todo el lote
+            response = await predict_batcher.submit((request.student_id, request.course_id))
+            if response is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No se encontraron datos para el estudiante {request.student_id} en el curso {request.course_id}"
+                )
+            return response
         
-        # Calcular features
-        features_df = feature_engineering.calculate_features(student_data)
+        cache_key = await prediction_cache_key(
+            "predict_explain" if explain else "predict", request.course_id, student_id=request.student_id
+        )
+        if cache_key is not None:
+            cached = prediction_cache.get(cache_key)
+            if cached is not None:
+                return cached
         
-        if features_df.empty:
-            # Si no hay suficientes datos, retornar riesgo bajo por defecto
-            return PredictionResponse(
-                student_id=request.student_id,
-                course_id=request.course_id,
-                risk_level="bajo",
-                risk_score=0.3,
-                features={},
-                confidence=0.5
-            )
+        feature_names = feature_engineering.get_feature_names()
         
-        # Obtener features para predicción (última fila)
-        features = features_df.iloc[-1].to_dict()
+        # Obtener las features del estudiante en el curso
+        features = await load_student_course_features(request.student_id, request.course_id)
         
         # Preparar features para el modelo (solo las numéricas)
-        feature_names = feature_engineering.get_feature_names()
         X = [[features.get(f, 0) for f in feature_names]]
         
         # Hacer predicción
-        prediction = model_service.predict(X)
-        probability = model_service.predict_proba(X)
+        prediction, probability, contributions, base_value = await scoring_pool.run(evaluate_model, X, explain)
         
-        risk_level = "alto" if prediction[0] == 1 else "bajo"
-        risk_score = probability[0][1] if len(probability[0]) > 1 else 0.5
+        response = prediction_response(request.student_id, request.course_id, features, prediction, probability)
+        if contributions is not None:
+            response.contributions = dict(zip(feature_names, np.round(contributions[0], 4).tolist()))
+            response.base_value = round(float(base_value), 4)
         
-        # Calcular confianza (basada en la diferencia entre probabilidades)
-        confidence = abs(probability[0][1] - probability[0][0]) if len(probability[0]) > 1 else 0.5
+        if cache_key is not None:
+            prediction_cache.put(cache_key, response)
         
-        return PredictionResponse(
-            student_id=request.student_id,
-            course_id=request.course_id,
-            risk_level=risk_level,
-            risk_score=round(risk_score, 3),
-            features={k: round(v, 3) if isinstance(v, float) else v for k, v in features.items()},
-            confidence=round(confidence, 3)
-        )
+        return response
     
     except HTTPException:
         raise
@@ -223,7 +790,49 @@ class ProfilePredictionRequest(BaseModel):
     student_id: int
 
 
-@app.post("/predict/profile", response_model=PredictionResponse)
+class ProfileBatchPredictionRequest(BaseModel):
+    student_ids: List[int]
+
+
+class ProfileBatchPredictionResponse(BaseModel):
+    predictions: List[PredictionResponse]
+    missing_student_ids: List[int]  # Estudiantes sin cuestionario de perfil
+
+
+async def predict_from_profiles(student_ids: List[int]):
+    """
+    Predice el riesgo de varios estudiantes usando solo su perfil: una consulta
+    (student_id = ANY(:ids)) y una única llamada vectorizada al modelo.
+    
+    Returns:
+        (lista de predicciones, ids de estudiantes sin perfil)
+    """
+    profiles_df = await async_data.get_student_profiles(student_ids)
+    found_ids = set(profiles_df['student_id'].tolist()) if not profiles_df.empty else set()
+    missing_ids = [student_id for student_id in dict.fromkeys(student_ids) if student_id not in found_ids]
+    
+    if profiles_df.empty:
+        return [], missing_ids
+    
+    return await scoring_pool.run(score_profiles, profiles_df), missing_ids
+
+
+def score_profiles(profiles_df: pd.DataFrame) -> List[PredictionResponse]:
+    """Features de perfil, evaluación y respuestas de predict_from_profiles (corre en scoring_pool)"""
+    # Features del perfil + valores neutrales para las transaccionales (sin curso específico)
+    with metrics.stage("features"):
+        features_df = feature_engineering.profile_only_features(profiles_df)
+    feature_names = feature_engineering.get_feature_names()
+    X = features_df[feature_names].values
+    
+    predictions, probabilities, _, _ = evaluate_model(X)
+    with metrics.stage("serialize"):
+        records = build_prediction_records(features_df, predictions, probabilities, feature_names)
+        return [PredictionResponse(**record) for record in records]
+
+
+@app.post("/predict/profile", response_model=PredictionResponse, response_model_exclude_none=True)
+@metrics.instrument("predict_profile")
 async def predict_risk_from_profile(request: ProfilePredictionRequest):
     """
     Predice el riesgo académico de un estudiante basándose SOLO en su perfil del cuestionario.
@@ -238,112 +847,85 @@ async def predict_risk_from_profile(request: ProfilePredictionRequest):
                     detail="El modelo no está entrenado. Por favor, entrena el modelo primero con /train"
                 )
         
-        # Obtener solo el perfil del estudiante (sin necesidad de curso)
-        from sqlalchemy import create_engine, text
-        from core.config import settings
-        
-        engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-        query = text("""
-            SELECT 
-                sp.motivation,
-                sp.available_time,
-                sp.sleep_hours,
-                sp.study_hours,
-                sp.enjoyment_studying,
-                sp.study_place_tranquility,
-                sp.academic_pressure,
-                sp.gender
-            FROM student_profiles sp
-            WHERE sp.student_id = :student_id
-            LIMIT 1
-        """)
-        
-        profile_df = pd.read_sql(query, engine, params={"student_id": request.student_id})
-        engine.dispose()
+        predictions, _ = await predict_from_profiles([request.student_id])
         
-        if profile_df.empty:
+        if not predictions:
             raise HTTPException(
                 status_code=404,
                 detail=f"El estudiante {request.student_id} no ha completado el cuestionario de perfil."
             )
         
-        profile = profile_df.iloc[0]
-        
-        # Normalizar features del perfil (escala 1-10 a 0-1)
-        def normalize_profile(value, default=5.0):
-            if pd.isna(value):
-                return (default - 1.0) / 9.0
-            return (value - 1.0) / 9.0
-        
-        def encode_gender(gender_value):
-            if pd.isna(gender_value) or gender_value == '':
-                return 0.5
-            gender_str = str(gender_value).lower()
-            if 'femenino' in gender_str or 'mujer' in gender_str or 'female' in gender_str:
-                return 1.0
-            elif 'masculino' in gender_str or 'hombre' in gender_str or 'male' in gender_str:
-                return 0.0
-            else:
-                return 0.5
-        
-        # Construir features completas (perfil + valores por defecto para transaccionales)
-        feature_names = feature_engineering.get_feature_names()
-        features = {
-            'student_id': request.student_id,
-            'course_id': 0,  # No hay curso específico
-            # Features del perfil
-            'motivation': normalize_profile(profile.get('motivation')),
-            'available_time': normalize_profile(profile.get('available_time')),
-            'sleep_hours': normalize_profile(profile.get('sleep_hours')),
-            'study_hours': normalize_profile(profile.get('study_hours')),
-            'enjoyment_studying': normalize_profile(profile.get('enjoyment_studying')),
-            'study_place_tranquility': normalize_profile(profile.get('study_place_tranquility')),
-            'academic_pressure': normalize_profile(profile.get('academic_pressure')),
-            'gender_encoded': encode_gender(profile.get('gender')),
-            # Features transaccionales con valores por defecto (neutrales)
-            'submission_delay_rate': 0.5,
-            'non_submission_rate': 0.5,
-            'average_grade': 0.5,
-            'grade_variability': 0.5
-        }
-        
-        # Preparar features para el modelo
-        X = [[features.get(f, 0.5) for f in feature_names]]
+        return predictions[0]
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error al predecir desde perfil: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al hacer la predicción: {str(e)}"
+        )
+
+
+@app.post("/predict/profile/batch", response_model=ProfileBatchPredictionResponse, response_model_exclude_none=True)
+@metrics.instrument("predict_profile_batch")
+async def predict_risk_from_profiles_batch(request: ProfileBatchPredictionRequest):
+    """
+    Predice el riesgo académico de una lista de estudiantes basándose SOLO en su perfil
+    del cuestionario (por ejemplo, una cohorte completa de ingreso) en una sola llamada.
+    """
+    try:
+        if not model_service.is_model_loaded():
+            if not model_service.load_model():
+                raise HTTPException(
+                    status_code=503,
+                    detail="El modelo no está entrenado. Por favor, entrena el modelo primero con /train"
+                )
         
-        # Hacer predicción
-        prediction = model_service.predict(X)
-        probability = model_service.predict_proba(X)
+        if not request.student_ids:
+            return ProfileBatchPredictionResponse(predictions=[], missing_student_ids=[])
         
-        risk_level = "alto" if prediction[0] == 1 else "bajo"
-        risk_score = probability[0][1] if len(probability[0]) > 1 else 0.5
-        confidence = abs(probability[0][1] - probability[0][0]) if len(probability[0]) > 1 else 0.5
+        predictions, missing_ids = await predict_from_profiles(request.student_ids)
         
-        return PredictionResponse(
-            student_id=request.student_id,
-            course_id=0,  # No hay curso específico
-            risk_level=risk_level,
-            risk_score=round(risk_score, 3),
-            features={k: round(v, 3) if isinstance(v, float) else v 
-                     for k, v in features.items() if k not in ['student_id', 'course_id']},
-            confidence=round(confidence, 3)
+        return ProfileBatchPredictionResponse(
+            predictions=predictions,
+            missing_student_ids=missing_ids
         )
     
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error al predecir desde perfil: {e}")
+        print(f"Error en predicción batch desde perfil: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(
             status_code=500,
-            detail=f"Error al hacer la predicción: {str(e)}"
+            detail=f"Error al hacer la predicción batch: {str(e)}"
         )
 
 
 @app.get("/predict/batch")
-async def predict_batch_students(course_id: int):
+@metrics.instrument("predict_batch")
+async def predict_batch_students(
+    course_id: int,
+    request: Request,
+    sql_aggregate: bool = settings.SQL_FEATURE_AGGREGATION,
+    stream: bool = False,
+    explain: bool = False
+):
     """
     Predice el riesgo académico de todos los estudiantes en un curso
+    
+    Las features se leen de la tabla materializada student_course_features; si no
+    está disponible, con sql_aggregate=true se agregan directamente en Postgres.
+    
+    Con stream=true (o Accept: application/x-ndjson) la respuesta es NDJSON, una
+    predicción por línea, enviada por bloques a medida que se evalúan.
+    
+    Con explain=true cada predicción incluye la contribución de cada feature
+    (calculada para todo el lote en la misma pasada por los árboles).
     """
     try:
         # Verificar que el modelo esté cargado
@@ -354,59 +936,303 @@ async def predict_batch_students(course_id: int):
                     detail="El modelo no está entrenado. Por favor, entrena el modelo primero con /train"
                 )
         
-        # Obtener todos los estudiantes del curso
-        students_data = data_service.get_course_students_data(course_id=course_id)
+        ndjson = wants_ndjson(request, stream)
         
-        if students_data is None or students_data.empty:
-            # Retornar lista vacía si no hay estudiantes (más claro que 404)
-            return []
+        cache_key = await prediction_cache_key("batch_explain" if explain else "batch", course_id)
+        if cache_key is not None:
+            cached = prediction_cache.get(cache_key)
+            if cached is not None:
+                if ndjson:
+                    return StreamingResponse(
+                        stream_cached_predictions(
+                            scoring_pool.reserve(), cached, settings.PREDICTION_STREAM_CHUNK_SIZE,
+                            endpoint=metrics.current_endpoint()
+                        ),
+                        media_type=NDJSON_MEDIA_TYPE
+                    )
+                return await scoring_pool.run(json_response, cached)
         
         # Calcular features para todos los estudiantes
-        features_df = feature_engineering.calculate_features(students_data)
+        features_df = await load_course_features(course_id, sql_aggregate)
+        
+        if ndjson:
+            # Sin caché: el objetivo del modo streaming es no materializar la respuesta completa.
+            # El lugar en scoring_pool se reserva aquí para que la cola llena dé 429 antes de enviar nada
+            return StreamingResponse(
+                stream_predictions(
+                    scoring_pool.reserve(), features_df, list(features_df.columns),
+                    settings.PREDICTION_STREAM_CHUNK_SIZE, endpoint=metrics.current_endpoint(), explain=explain
+                ),
+                media_type=NDJSON_MEDIA_TYPE
+            )
         
         if features_df.empty:
+            # Retornar lista vacía si no hay estudiantes (más claro que 404)
             return []
         
-        # Preparar features para predicción
+        # Predicciones y respuesta serializada en el pool de cómputo
+        results, response = await scoring_pool.run(score_course_batch, features_df, explain)
+        
+        if cache_key is not None:
+            prediction_cache.put(cache_key, results, weight=len(results))
+        
+        return response
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error en predicción batch: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al hacer la predicción batch: {str(e)}"
+        )
+
+
+def score_course_batch(features_df: pd.DataFrame, explain: bool = False):
+    """
+    Evalúa las filas de /predict/batch y construye la respuesta (corre en scoring_pool)
+    
+    Returns:
+        (registros de predicción, JSONResponse ya serializada)
+    """
+    feature_names = feature_engineering.get_feature_names()
+    X = features_df[feature_names].values
+    predictions, probabilities, contributions, base_value = evaluate_model(X, explain)
+    
+    # Construir respuesta (features con todas las columnas, incluidos los ids) y
+    # serializarla aquí, para que el tiempo del JSON quede en la etapa serialize
+    with metrics.stage("serialize"):
+        results = build_prediction_records(
+            features_df, predictions, probabilities, list(features_df.columns), contributions, base_value
+        )
+        return results, JSONResponse(results)
+
+
+class BulkPredictionRequest(BaseModel):
+    course_ids: List[int] = []  # Cursos completos
+    pairs: List[PredictionRequest] = []  # Pares estudiante-curso explícitos
+
+
+class CoursePredictions(BaseModel):
+    course_id: int
+    predictions: List[PredictionResponse]
+
+
+class BulkPredictionResponse(BaseModel):
+    courses: List[CoursePredictions]
+    total_predictions: int
+    missing_pairs: List[PredictionRequest]  # Pares sin datos (sin inscripción o sin tareas)
+
+
+def score_bulk(features_df: pd.DataFrame, course_ids: List[int], pairs: list) -> JSONResponse:
+    """Evalúa las filas de /predict/bulk, las agrupa por curso y serializa la respuesta (corre en scoring_pool)"""
+    records = []
+    if not features_df.empty:
+        features_df = features_df.sort_values(['course_id', 'student_id'], kind='stable')
         feature_names = feature_engineering.get_feature_names()
         X = features_df[feature_names].values
         
-        # Hacer predicciones
-        predictions = model_service.predict(X)
-        probabilities = model_service.predict_proba(X)
+        predictions, probabilities, _, _ = evaluate_model(X)
+        with metrics.stage("serialize"):
+            records = build_prediction_records(features_df, predictions, probabilities, feature_names)
+    
+    # Agrupar por curso: primero los cursos pedidos (aunque no tengan estudiantes),
+    # luego los de los pares explícitos
+    grouped = {course_id: [] for course_id in course_ids}
+    for record in records:
+        grouped.setdefault(record["course_id"], []).append(record)
+    
+    scored_pairs = {(record["student_id"], record["course_id"]) for record in records}
+    missing_pairs = [
+        PredictionRequest(student_id=student_id, course_id=course_id)
+        for student_id, course_id in pairs
+        if (student_id, course_id) not in scored_pairs
+    ]
+    
+    with metrics.stage("serialize"):
+        response = BulkPredictionResponse(
+            courses=[
+                CoursePredictions(course_id=course_id, predictions=course_records)
+                for course_id, course_records in grouped.items()
+            ],
+            total_predictions=len(records),
+            missing_pairs=missing_pairs
+        )
+        return JSONResponse(response.model_dump())
+
+
+@app.post("/predict/bulk", response_model=BulkPredictionResponse)
+@metrics.instrument("predict_bulk")
+async def predict_bulk(request: BulkPredictionRequest, sql_aggregate: bool = settings.SQL_FEATURE_AGGREGATION):
+    """
+    Predice el riesgo académico de varios cursos completos y/o pares estudiante-curso
+    en una sola llamada (por ejemplo, el panel de un profesor o administrador).
+    
+    Todas las filas se leen con una consulta y el modelo se evalúa una sola vez;
+    los resultados se agrupan por curso.
+    """
+    try:
+        if not model_service.is_model_loaded():
+            if not model_service.load_model():
+                raise HTTPException(
+                    status_code=503,
+                    detail="El modelo no está entrenado. Por favor, entrena el modelo primero con /train"
+                )
         
-        # Construir respuesta
-        results = []
-        for idx, (_, row) in enumerate(features_df.iterrows()):
-            student_id = int(row.get('student_id', 0))
-            risk_level = "alto" if predictions[idx] == 1 else "bajo"
-            risk_score = probabilities[idx][1] if len(probabilities[idx]) > 1 else 0.5
-            confidence = abs(probabilities[idx][1] - probabilities[idx][0]) if len(probabilities[idx]) > 1 else 0.5
-            
-            results.append({
-                "student_id": student_id,
-                "course_id": course_id,
-                "risk_level": risk_level,
-                "risk_score": round(risk_score, 3),
-                "features": {k: round(v, 3) if isinstance(v, float) else v 
-                            for k, v in row.to_dict().items()},
-                "confidence": round(confidence, 3)
-            })
+        course_ids = list(dict.fromkeys(request.course_ids))
+        pairs = list(dict.fromkeys((pair.student_id, pair.course_id) for pair in request.pairs))
+        
+        if not course_ids and not pairs:
+            return BulkPredictionResponse(courses=[], total_predictions=0, missing_pairs=[])
         
-        return results
+        features_df = await load_bulk_features(course_ids, pairs, sql_aggregate)
+        
+        # Evaluación, agrupación y respuesta en el pool de cómputo
+        return await scoring_pool.run(score_bulk, features_df, course_ids, pairs)
     
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error en predicción batch: {e}")
+        print(f"Error en predicción masiva: {e}")
         import traceback
         traceback.print_exc()
         raise HTTPException(
             status_code=500,
-            detail=f"Error al hacer la predicción batch: {str(e)}"
+            detail=f"Error al hacer la predicción masiva: {str(e)}"
         )
 
 
+@app.post("/scores/refresh")
+async def refresh_risk_scores(course_id: Optional[int] = None):
+    """
+    Recalcula los puntajes persistidos en risk_scores
+    
+    Con course_id se evalúa solo ese curso, se reemplazan sus filas y se retornan
+    (actualización en vivo de un panel). Sin course_id se lanza la evaluación de
+    toda la plataforma en segundo plano (202); el avance se consulta en /scores/status.
+    """
+    if not model_service.is_model_loaded():
+        raise HTTPException(
+            status_code=503,
+            detail="El modelo no está entrenado. Por favor, entrena el modelo primero con /train"
+        )
+    
+    if course_id is None:
+        if risk_scorer.running:
+            raise HTTPException(status_code=409, detail="Ya hay una evaluación de riesgo en curso")
+        task = asyncio.create_task(run_risk_scoring())
+        risk_scoring_runs.add(task)
+        task.add_done_callback(risk_scoring_runs.discard)
+        return JSONResponse(status_code=202, content=risk_scorer.status())
+    
+    # Lectura y escritura en el pool de consultas; la evaluación en el pool de cómputo
+    # (con su cola acotada: 429 si está llena, antes de leer nada)
+    reservation = scoring_pool.reserve()
+    try:
+        computed_at = datetime.now(timezone.utc)
+        features_df = await async_data.run(data_service.get_scoring_features, [course_id])
+        rows = await reservation.run(risk_scorer.score_features, features_df, computed_at)
+        await async_data.run(risk_scorer.write_rows, [course_id], rows)
+    except Exception as e:
+        print(f"Error al recalcular los puntajes del curso {course_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al recalcular los puntajes de riesgo: {str(e)}"
+        )
+    finally:
+        reservation.release()
+    return records_for_response(rows)
+
+
+@app.get("/scores/status")
+async def risk_scores_status():
+    """
+    Estado de la evaluación de riesgo de la plataforma (en curso y última ejecución)
+    """
+    return risk_scorer.status()
+
+
+@app.get("/drift")
+async def feature_drift(min_samples: int = settings.DRIFT_MIN_SAMPLES):
+    """
+    Drift de las features de entrada: histogramas de las filas evaluadas por este
+    proceso en las dos últimas ventanas de DRIFT_WINDOW_SECONDS contra los del
+    entrenamiento de la versión en servicio, con PSI y KS por feature
+    """
+    return model_service.drift.report(min_samples=min_samples)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """
+    Métricas en formato de texto de Prometheus: duración por endpoint y por etapa
+    (sql, features, model, serialize, watermark), filas leídas, tamaño de los lotes,
+    versión del modelo en servicio, contadores de la caché de predicciones, ocupación
+    del pool de cómputo y PSI/KS por feature del monitor de drift
+    """
+    cache = prediction_cache.stats()
+    extra = []
+    extra += metrics.render_samples(
+        "pai_ml_model_info", "gauge", "Versión del modelo en servicio (valor 1)",
+        [({"version": model_service.model_version or ""}, 1)]
+    )
+    for name, key, help_text in [
+        ("pai_ml_prediction_cache_hits_total", "hits", "Aciertos de la caché de predicciones"),
+        ("pai_ml_prediction_cache_misses_total", "misses", "Fallos de la caché de predicciones"),
+        ("pai_ml_prediction_cache_evictions_total", "evictions", "Entradas desalojadas por LRU o tope de filas"),
+        ("pai_ml_prediction_cache_expirations_total", "expirations", "Entradas vencidas por TTL"),
+    ]:
+        extra += metrics.render_samples(name, "counter", help_text, [({}, cache[key])])
+    for name, key, help_text in [
+        ("pai_ml_prediction_cache_hit_ratio", "hit_ratio", "Aciertos / consultas de la caché"),
+        ("pai_ml_prediction_cache_entries", "entries", "Entradas en la caché"),
+        ("pai_ml_prediction_cache_rows", "rows", "Filas de predicción en la caché"),
+    ]:
+        extra += metrics.render_samples(name, "gauge", help_text, [({}, cache[key])])
+    pool = scoring_pool.stats()
+    extra += metrics.render_samples(
+        "pai_ml_scoring_pool_pending", "gauge", "Tareas en el pool de cómputo (en ejecución o en cola)",
+        [({}, pool["pending"])]
+    )
+    extra += metrics.render_samples(
+        "pai_ml_scoring_pool_rejected_total", "counter", "Tareas rechazadas con 429 por cola llena",
+        [({}, pool["rejected"])]
+    )
+    drift = model_service.drift.report(min_samples=0)
+    extra += metrics.render_samples(
+        "pai_ml_drift_samples", "gauge", "Filas evaluadas en las ventanas del monitor de drift",
+        [({}, drift["samples"])]
+    )
+    for name, key, help_text in [
+        ("pai_ml_feature_drift_psi", "psi", "PSI de cada feature de entrada vs. el entrenamiento"),
+        ("pai_ml_feature_drift_ks", "ks", "KS de cada feature de entrada vs. el entrenamiento"),
+    ]:
+        extra += metrics.render_samples(
+            name, "gauge", help_text,
+            [({"feature": feature}, values[key]) for feature, values in drift["features"].items()]
+        )
+    return PlainTextResponse(metrics.render(extra), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+async def prediction_cache_stats():
+    """
+    Estadísticas de la caché de predicciones (aciertos, fallos, ocupación)
+    """
+    return prediction_cache.stats()
+
+
+@app.delete("/cache")
+async def clear_prediction_cache():
+    """
+    Vacía la caché de predicciones
+    """
+    prediction_cache.clear()
+    return prediction_cache.stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,86 @@
+"""
+Acceso asíncrono a datos para los endpoints del servicio ML
+
+pd.read_sql necesita una conexión DB-API síncrona, así que en vez de cambiar de
+driver las consultas de DataService se ejecutan en un pool de hilos acotado (del
+mismo tamaño que el pool de conexiones de SQLAlchemy). El event loop queda libre
+mientras la consulta espera a Postgres y las predicciones concurrentes solapan su
+I/O; los DataFrames retornados son exactamente los mismos.
+
+Las funciones corren en una copia del contexto de la petición, así las etapas que
+miden (services/metrics.py) se atribuyen al endpoint que las pidió.
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+import pandas as pd
+
+from core.config import settings
+from services.data_service import DataService
+
+
+class AsyncDataService:
+    """Envoltorio asíncrono de DataService"""
+
+    def __init__(self, data_service: DataService, max_workers: int = None):
+        self.data_service = data_service
+        self.max_workers = max_workers or (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="db"
+        )
+
+    async def run(self, fn, *args, **kwargs):
+        """Ejecuta una función síncrona de acceso a datos en el pool de hilos"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, partial(context.run, fn, *args, **kwargs))
+
+    async def get_historical_data(self, aggregate: bool = False) -> pd.DataFrame:
+        return await self.run(self.data_service.get_historical_data, aggregate=aggregate)
+
+    async def get_student_course_data(self, student_id: int, course_id: int) -> pd.DataFrame:
+        return await self.run(
+            self.data_service.get_student_course_data, student_id=student_id, course_id=course_id
+        )
+
+    async def get_student_course_feature_row(self, student_id: int, course_id: int) -> Optional[dict]:
+        return await self.run(
+            self.data_service.get_student_course_feature_row, student_id=student_id, course_id=course_id
+        )
+
+    async def get_course_students_data(self, course_id: int, aggregate: bool = False) -> pd.DataFrame:
+        return await self.run(
+            self.data_service.get_course_students_data, course_id=course_id, aggregate=aggregate
+        )
+
+    async def get_materialized_features(
+        self, student_id: int = None, course_id: int = None, course_ids: list = None, pairs: list = None
+    ) -> pd.DataFrame:
+        return await self.run(
+            self.data_service.get_materialized_features,
+            student_id=student_id, course_id=course_id, course_ids=course_ids, pairs=pairs
+        )
+
+    async def get_bulk_features(self, course_ids: list = None, pairs: list = None, aggregate: bool = False) -> pd.DataFrame:
+        return await self.run(
+            self.data_service.get_bulk_features, course_ids=course_ids, pairs=pairs, aggregate=aggregate
+        )
+
+    async def get_student_profiles(self, student_ids: list) -> pd.DataFrame:
+        return await self.run(self.data_service.get_student_profiles, student_ids)
+
+    async def get_data_watermark(self, course_id: int, student_id: int = None):
+        return await self.run(
+            self.data_service.get_data_watermark, course_id, student_id=student_id
+        )
+
+    async def get_pair_watermarks(self, pairs: list) -> dict:
+        return await self.run(self.data_service.get_pair_watermarks, pairs)
+
+    def shutdown(self):
+        """Libera el pool de hilos"""
+        self._executor.shutdown(wait=False)
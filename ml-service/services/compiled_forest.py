@@ -0,0 +1,275 @@
+"""
+Evaluador compilado del RandomForest para predicciones de pocas filas
+
+Los árboles del bosque se aplanan en tablas de nodos NumPy contiguas (feature,
+umbral, hijos y probabilidades de clase por nodo, con los índices de todos los
+árboles en un solo espacio). La evaluación recorre todos los árboles a la vez
+para todas las filas, un nivel por iteración, y obtiene clase y probabilidad en
+una sola pasada, sin la validación por llamada de sklearn ni el segundo
+recorrido de predict + predict_proba.
+
+Los resultados son idénticos a RandomForestClassifier.predict / predict_proba:
+mismas comparaciones en float32 contra umbrales float64, mismos valores de hoja
+y misma suma árbol por árbol.
+
+Las tablas se guardan como archivos .npy sin comprimir y se abren con mmap: la
+carga tarda milisegundos sin importar el tamaño del bosque y los procesos
+(workers de uvicorn) que sirven la misma versión comparten las páginas.
+
+predict_with_contributions descompone además cada probabilidad por camino del
+árbol (valor de la raíz + suma de los cambios de valor en cada división,
+atribuidos a la feature de la división) en el mismo recorrido por niveles. Los
+cambios de valor por nodo se calculan una vez por bosque (por versión del modelo).
+"""
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+
+class CompiledForest:
+    """Bosque aplanado en tablas de nodos"""
+
+    ARRAYS = ["feature", "threshold", "left", "right", "value", "roots", "classes"]
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth: int = None):
+        self.feature = feature        # (n_nodes,) feature de cada nodo (0 en las hojas)
+        self.threshold = threshold    # (n_nodes,) umbral de cada nodo
+        self.left = left              # (n_nodes,) hijo izquierdo global (el propio nodo en las hojas)
+        self.right = right            # (n_nodes,) hijo derecho global (el propio nodo en las hojas)
+        self.value = value            # (n_nodes, n_classes) probabilidades normalizadas por nodo
+        self.roots = roots            # (n_trees,) nodo raíz de cada árbol
+        self.classes = classes        # (n_classes,) etiquetas de clase
+        self.max_depth = int(max_depth) if max_depth is not None else self._depth()
+        # Cambio de valor de cada nodo respecto de su padre, por clase (se calcula al primer uso)
+        self._node_deltas = {}
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model) -> "CompiledForest":
+        """Construye las tablas a partir de un RandomForestClassifier entrenado"""
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Solo se soportan bosques de una salida")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            local = np.arange(n_nodes)
+
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            # En las hojas el hijo es el propio nodo: la evaluación se queda fija ahí
+            lefts.append(np.where(is_leaf, local, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, local, tree.children_right) + offset)
+
+            # Igual que DecisionTreeClassifier.predict_proba: sklearn >= 1.4 guarda las
+            # fracciones por clase y las usa tal cual; las versiones anteriores guardan
+            # conteos y los dividen por su suma (0 -> 1)
+            value = tree.value[:, 0, :model.n_classes_]
+            if np.any(value.sum(axis=1) > 1.0 + 1e-9):
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+            values.append(value)
+
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            left=np.concatenate(lefts).astype(np.intp),
+            right=np.concatenate(rights).astype(np.intp),
+            value=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            classes=np.asarray(model.classes_),
+            max_depth=max_depth,
+        )
+
+    def _depth(self) -> int:
+        """Profundidad máxima (para tablas cargadas sin ese dato)"""
+        nodes = self.roots.copy()
+        depth = 0
+        while True:
+            children = np.concatenate([self.left[nodes], self.right[nodes]])
+            children = np.unique(children[children != np.concatenate([nodes, nodes])])
+            if len(children) == 0:
+                return depth
+            nodes = children
+            depth += 1
+
+    # ----------------- Evaluación -----------------
+
+    def apply(self, X) -> np.ndarray:
+        """Hoja alcanzada en cada árbol: (n_filas, n_árboles) índices globales"""
+        # sklearn evalúa en float32 contra umbrales float64
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def predict_proba(self, X) -> np.ndarray:
+        leaves = self.apply(X)
+        # Suma árbol por árbol (mismo orden que sklearn) y promedio
+        proba = np.zeros((leaves.shape[0], self.value.shape[1]), dtype=np.float64)
+        for tree_idx in range(self.n_trees):
+            proba += self.value[leaves[:, tree_idx]]
+        proba /= self.n_trees
+        return proba
+
+    def predict_with_proba(self, X):
+        """
+        Clase y probabilidades en una sola pasada
+
+        Returns:
+            (predicciones, probabilidades)
+        """
+        proba = self.predict_proba(X)
+        return self.classes.take(np.argmax(proba, axis=1), axis=0), proba
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_with_proba(X)[0]
+
+    # ----------------- Contribuciones por feature -----------------
+
+    def risk_class_index(self) -> int:
+        """Columna de probabilidades de la clase 1 (riesgo alto), o la última si no existe"""
+        matches = np.flatnonzero(self.classes == 1)
+        return int(matches[0]) if len(matches) else self.value.shape[1] - 1
+
+    def node_deltas(self, class_index: int) -> np.ndarray:
+        """
+        value[nodo] - value[padre] para la clase class_index (0 en las raíces).
+        Se calcula una vez y queda asociado al bosque, es decir, a la versión del modelo.
+        """
+        deltas = self._node_deltas.get(class_index)
+        if deltas is None:
+            nodes = np.arange(len(self.feature))
+            parent = nodes.copy()
+            internal = np.flatnonzero(self.left != nodes)
+            parent[self.left[internal]] = internal
+            parent[self.right[internal]] = internal
+            values = self.value[:, class_index]
+            deltas = values - values[parent]
+            self._node_deltas[class_index] = deltas
+        return deltas
+
+    def predict_with_contributions(self, X, class_index: int = None):
+        """
+        Clase, probabilidades y contribución de cada feature a la probabilidad de
+        class_index (por defecto la de riesgo alto), en un solo recorrido del bosque.
+
+        Por árbol, la probabilidad de la hoja es el valor de la raíz más los cambios
+        de valor de cada paso del camino; cada cambio se suma a la feature que decidió
+        el paso. Promediando sobre los árboles:
+            proba[:, class_index] == base_value + contributions.sum(axis=1)
+        (salvo redondeo de punto flotante).
+
+        Returns:
+            (predicciones, probabilidades, contribuciones (n_filas, n_features), base_value)
+        """
+        if class_index is None:
+            class_index = self.risk_class_index()
+        deltas = self.node_deltas(class_index)
+
+        X = np.asarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        # Pares (fila, árbol) aplanados; en cada nivel solo se siguen los que aún no
+        # llegaron a una hoja (en bosques profundos la mayoría termina mucho antes)
+        leaves = np.tile(self.roots, n_rows)
+        active = np.arange(n_rows * self.n_trees)
+        rows = active // self.n_trees
+        nodes = leaves
+        # Cada paso suma su cambio de valor en (fila, feature) con bincount sobre fila * n_features + feature
+        totals = np.zeros(n_rows * n_features, dtype=np.float64)
+        for _ in range(self.max_depth):
+            features = self.feature[nodes]
+            go_left = X[rows, features] <= self.threshold[nodes]
+            children = np.where(go_left, self.left[nodes], self.right[nodes])
+            # En las hojas el hijo es el propio nodo: esos pares terminaron
+            moved = children != nodes
+            if not moved.all():
+                active, rows, features, children = active[moved], rows[moved], features[moved], children[moved]
+                if len(active) == 0:
+                    break
+            totals += np.bincount(rows * n_features + features, weights=deltas[children], minlength=len(totals))
+            leaves[active] = children
+            nodes = children
+        leaves = leaves.reshape(n_rows, self.n_trees)
+
+        proba = np.zeros((n_rows, self.value.shape[1]), dtype=np.float64)
+        for tree_idx in range(self.n_trees):
+            proba += self.value[leaves[:, tree_idx]]
+        proba /= self.n_trees
+
+        contributions = totals.reshape(n_rows, n_features) / self.n_trees
+        base_value = float(self.value[self.roots, class_index].mean())
+        predictions = self.classes.take(np.argmax(proba, axis=1), axis=0)
+        return predictions, proba, contributions, base_value
+
+    # ----------------- Persistencia -----------------
+
+    def save(self, directory) -> dict:
+        """
+        Guarda cada tabla como .npy sin comprimir en directory (un archivo por arreglo)
+
+        Returns:
+            Descripción de los archivos para la metadata: max_depth y, por arreglo,
+            tamaño y SHA-256
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for name in self.ARRAYS:
+            path = directory / f"{name}.npy"
+            np.save(path, np.ascontiguousarray(getattr(self, name)), allow_pickle=False)
+            payload = path.read_bytes()
+            files[name] = {"size": len(payload), "sha256": hashlib.sha256(payload).hexdigest()}
+        return {"max_depth": self.max_depth, "files": files}
+
+    @classmethod
+    def load(cls, directory, manifest: dict, mmap: bool = True) -> "CompiledForest":
+        """
+        Abre las tablas guardadas con save(). Con mmap=True los arreglos se mapean
+        en memoria (solo lectura): la carga no lee los datos y todos los procesos
+        que abren la misma versión comparten las páginas físicas.
+
+        Raises:
+            ValueError si falta un archivo o su tamaño no coincide con el manifiesto
+        """
+        directory = Path(directory)
+        arrays = {}
+        for name in cls.ARRAYS:
+            path = directory / f"{name}.npy"
+            expected = manifest["files"][name]["size"]
+            if not path.exists() or path.stat().st_size != expected:
+                raise ValueError(f"El archivo {path} falta o está incompleto")
+            array = np.load(path, mmap_mode="r" if mmap else None, allow_pickle=False)
+            # Vista ndarray sobre el mismo mapeo (evita la sobrecarga de la subclase memmap)
+            arrays[name] = array.view(np.ndarray) if mmap else array
+        return cls(max_depth=manifest["max_depth"], **arrays)
+
+    @classmethod
+    def verify(cls, directory, manifest: dict):
+        """
+        Verifica el SHA-256 de cada archivo
+
+        Raises:
+            ValueError si algún archivo no coincide
+        """
+        for name in cls.ARRAYS:
+            path = Path(directory) / f"{name}.npy"
+            if hashlib.sha256(path.read_bytes()).hexdigest() != manifest["files"][name]["sha256"]:
+                raise ValueError(f"El hash de {path} no coincide (archivo corrupto)")
@@ -6,40 +6,520 @@ import pandas as pd
 from sqlalchemy import create_engine, text
 from datetime import datetime
 import sys
+from functools import partial
 from pathlib import Path
+from typing import Optional
 
 # Agregar el directorio raíz al path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from core.config import settings
+from services.feature_engineering import FeatureEngineering, FeatureAccumulator
+from services.training_sampler import StratifiedReservoir, training_strata
+from services import metrics
+
+
+# Agregación por estudiante-curso calculada en Postgres. Devuelve los mismos
+# agregados que FeatureEngineering.aggregate(), con el perfil unido después del
+# GROUP BY para no repetirlo en cada fila tarea×inscripción.
+AGGREGATED_FEATURES_QUERY = """
+    WITH pair_stats AS (
+        SELECT 
+            e.student_id,
+            t.course_id,
+            COUNT(DISTINCT t.id) AS n_tasks,
+            COUNT(DISTINCT t.id) FILTER (WHERE s.id IS NOT NULL) AS n_submitted_tasks,
+            COUNT(*) FILTER (
+                WHERE s.submitted_at IS NOT NULL AND t.due_date IS NOT NULL
+            ) AS n_timed_submissions,
+            COUNT(*) FILTER (WHERE s.submitted_at > t.due_date) AS n_late_submissions,
+            COUNT(s.grade) AS n_grades,
+            AVG(s.grade) AS grade_mean,
+            STDDEV_SAMP(s.grade) AS grade_std
+        FROM tasks t
+        INNER JOIN enrollments e ON t.course_id = e.course_id
+        LEFT JOIN submissions s ON s.task_id = t.id AND s.student_id = e.student_id
+        {where}
+        GROUP BY e.student_id, t.course_id
+    )
+    SELECT 
+        ps.*,
+        sp.motivation,
+        sp.available_time,
+        sp.sleep_hours,
+        sp.study_hours,
+        sp.enjoyment_studying,
+        sp.study_place_tranquility,
+        sp.academic_pressure,
+        sp.gender
+    FROM pair_stats ps
+    LEFT JOIN student_profiles sp ON sp.student_id = ps.student_id
+    ORDER BY ps.student_id, ps.course_id
+"""
+
+
+# Lectura de la tabla materializada student_course_features (mantenida por el backend).
+# Retorna el mismo esquema de agregados; las filas sin tareas se excluyen igual que
+# en el join original.
+MATERIALIZED_FEATURES_QUERY = """
+    SELECT 
+        f.student_id,
+        f.course_id,
+        f.n_tasks,
+        f.n_submitted_tasks,
+        f.n_timed_submissions,
+        f.n_late_submissions,
+        f.n_grades,
+        f.grade_mean,
+        CASE WHEN f.n_grades >= 2
+            THEN SQRT(GREATEST(f.grade_m2, 0) / (f.n_grades - 1))
+        END AS grade_std,
+        sp.motivation,
+        sp.available_time,
+        sp.sleep_hours,
+        sp.study_hours,
+        sp.enjoyment_studying,
+        sp.study_place_tranquility,
+        sp.academic_pressure,
+        sp.gender
+    FROM student_course_features f
+    LEFT JOIN student_profiles sp ON sp.student_id = f.student_id
+    WHERE f.n_tasks > 0 {filters}
+    ORDER BY f.student_id, f.course_id
+"""
+
+
+# Marca de agua de los datos de un curso (opcionalmente de un solo estudiante):
+# conteos, máximos y sumas de control sobre tareas, inscripciones, entregas y perfiles.
+# Cambia con cualquier inserción, eliminación, cambio de fecha límite, calificación o
+# actualización del cuestionario, así que sirve como versión de los datos para la caché.
+DATA_WATERMARK_QUERY = """
+    WITH course_tasks AS (
+        SELECT id, created_at, due_date FROM tasks WHERE course_id = :course_id
+    ),
+    course_enrollments AS (
+        SELECT id, student_id FROM enrollments
+        WHERE course_id = :course_id {student_filter}
+    ),
+    course_submissions AS (
+        SELECT s.id, s.submitted_at, s.grade
+        FROM submissions s
+        INNER JOIN course_tasks t ON t.id = s.task_id
+        INNER JOIN course_enrollments e ON e.student_id = s.student_id
+    ),
+    course_profiles AS (
+        SELECT sp.id, sp.updated_at
+        FROM student_profiles sp
+        INNER JOIN course_enrollments e ON e.student_id = sp.student_id
+    )
+    SELECT 
+        (SELECT COUNT(*) FROM course_tasks) AS n_tasks,
+        (SELECT MAX(created_at) FROM course_tasks) AS tasks_created_max,
+        (SELECT SUM(EXTRACT(EPOCH FROM due_date)) FROM course_tasks) AS due_dates_checksum,
+        (SELECT COUNT(*) FROM course_enrollments) AS n_enrollments,
+        (SELECT SUM(id) FROM course_enrollments) AS enrollments_checksum,
+        (SELECT COUNT(*) FROM course_submissions) AS n_submissions,
+        (SELECT MAX(submitted_at) FROM course_submissions) AS submitted_max,
+        (SELECT SUM(id * COALESCE(grade, -1.0)) FROM course_submissions) AS grades_checksum,
+        (SELECT COUNT(*) FROM course_profiles) AS n_profiles,
+        (SELECT MAX(updated_at) FROM course_profiles) AS profiles_updated_max
+"""
+
+
+# Marca de agua de varios pares (estudiante, curso) en una consulta (lotes del agrupador
+# de /predict): por cada par, las mismas columnas y valores que DATA_WATERMARK_QUERY
+# con el filtro de estudiante
+PAIR_WATERMARKS_QUERY = """
+    WITH pairs AS (
+        SELECT DISTINCT p.student_id, p.course_id
+        FROM UNNEST(CAST(:student_ids AS INTEGER[]), CAST(:course_ids AS INTEGER[])) AS p(student_id, course_id)
+    ),
+    pair_tasks AS (
+        SELECT 
+            t.course_id,
+            COUNT(*) AS n_tasks,
+            MAX(t.created_at) AS tasks_created_max,
+            SUM(EXTRACT(EPOCH FROM t.due_date)) AS due_dates_checksum
+        FROM tasks t
+        WHERE t.course_id IN (SELECT course_id FROM pairs)
+        GROUP BY t.course_id
+    ),
+    pair_enrollments AS (
+        SELECT p.student_id, p.course_id, e.id
+        FROM pairs p
+        INNER JOIN enrollments e ON e.course_id = p.course_id AND e.student_id = p.student_id
+    ),
+    pair_submissions AS (
+        SELECT 
+            e.student_id,
+            e.course_id,
+            COUNT(*) AS n_submissions,
+            MAX(s.submitted_at) AS submitted_max,
+            SUM(s.id * COALESCE(s.grade, -1.0)) AS grades_checksum
+        FROM pair_enrollments e
+        INNER JOIN tasks t ON t.course_id = e.course_id
+        INNER JOIN submissions s ON s.task_id = t.id AND s.student_id = e.student_id
+        GROUP BY e.student_id, e.course_id
+    ),
+    pair_profiles AS (
+        SELECT e.student_id, e.course_id, COUNT(*) AS n_profiles, MAX(sp.updated_at) AS profiles_updated_max
+        FROM pair_enrollments e
+        INNER JOIN student_profiles sp ON sp.student_id = e.student_id
+        GROUP BY e.student_id, e.course_id
+    )
+    SELECT 
+        p.student_id,
+        p.course_id,
+        COALESCE(pt.n_tasks, 0) AS n_tasks,
+        pt.tasks_created_max,
+        pt.due_dates_checksum,
+        (SELECT COUNT(*) FROM pair_enrollments e
+         WHERE e.student_id = p.student_id AND e.course_id = p.course_id) AS n_enrollments,
+        (SELECT SUM(e.id) FROM pair_enrollments e
+         WHERE e.student_id = p.student_id AND e.course_id = p.course_id) AS enrollments_checksum,
+        COALESCE(ps.n_submissions, 0) AS n_submissions,
+        ps.submitted_max,
+        ps.grades_checksum,
+        COALESCE(pp.n_profiles, 0) AS n_profiles,
+        pp.profiles_updated_max
+    FROM pairs p
+    LEFT JOIN pair_tasks pt ON pt.course_id = p.course_id
+    LEFT JOIN pair_submissions ps ON ps.student_id = p.student_id AND ps.course_id = p.course_id
+    LEFT JOIN pair_profiles pp ON pp.student_id = p.student_id AND pp.course_id = p.course_id
+"""
+
+# Filas de un estudiante en un curso para el camino rápido de /predict, leídas como
+# tuplas con el cursor DB-API (columnas en el orden de FeatureEngineering.ROW_COLUMNS;
+# parámetros en el formato pyformat de psycopg2)
+STUDENT_COURSE_ROWS_QUERY = """
+    SELECT 
+        t.id,
+        t.due_date,
+        s.id,
+        s.submitted_at,
+        s.grade,
+        sp.motivation,
+        sp.available_time,
+        sp.sleep_hours,
+        sp.study_hours,
+        sp.enjoyment_studying,
+        sp.study_place_tranquility,
+        sp.academic_pressure,
+        sp.gender
+    FROM tasks t
+    INNER JOIN enrollments e ON t.course_id = e.course_id
+    LEFT JOIN submissions s ON s.task_id = t.id AND s.student_id = e.student_id
+    LEFT JOIN student_profiles sp ON sp.student_id = e.student_id
+    WHERE e.student_id = %(student_id)s
+        AND t.course_id = %(course_id)s
+    ORDER BY t.due_date
+"""
+
+
+# Filas tarea×inscripción (con la entrega y el perfil del estudiante) usadas para
+# entrenar y para las predicciones masivas (get_bulk_features), así ambos caminos
+# calculan las features con las mismas columnas. El orden por estudiante y curso deja
+# las filas de cada par contiguas, como lo requiere la lectura por partes de
+# get_historical_features().
+HISTORICAL_DATA_QUERY = """
+    SELECT 
+        t.id as task_id,
+        t.course_id,
+        t.due_date,
+        t.created_at as task_created_at,
+        e.student_id,
+        e.enrollment_date,
+        s.id as submission_id,
+        s.submitted_at,
+        s.grade,
+        sp.motivation,
+        sp.available_time,
+        sp.sleep_hours,
+        sp.study_hours,
+        sp.enjoyment_studying,
+        sp.study_place_tranquility,
+        sp.academic_pressure,
+        sp.gender
+    FROM tasks t
+    INNER JOIN enrollments e ON t.course_id = e.course_id
+    LEFT JOIN submissions s ON s.task_id = t.id AND s.student_id = e.student_id
+    LEFT JOIN student_profiles sp ON sp.student_id = e.student_id
+    {where}
+    ORDER BY e.student_id, t.course_id, t.due_date
+"""
+
+
+# Huella por curso de las filas de HISTORICAL_DATA_QUERY: conteos y sumas enteras de
+# ids, fechas límite, fechas de entrega y notas (solo entregas de estudiantes
+# inscritos). Cambia con cualquier tarea, inscripción o entrega nueva, eliminada o
+# modificada (incluido un cambio de nota); la usa TrainingSnapshot para releer solo
+# los cursos que cambiaron. Solo incluye cursos con tareas e inscripciones, igual
+# que el join de entrenamiento.
+COURSE_FINGERPRINT_QUERY = """
+    WITH task_stats AS (
+        SELECT 
+            course_id,
+            COUNT(*) AS n_tasks,
+            SUM(id) AS task_ids,
+            SUM(FLOOR(EXTRACT(EPOCH FROM due_date))) AS due_dates
+        FROM tasks
+        GROUP BY course_id
+    ),
+    enrollment_stats AS (
+        SELECT 
+            course_id,
+            COUNT(DISTINCT student_id) AS n_students,
+            SUM(DISTINCT student_id) AS student_ids
+        FROM enrollments
+        GROUP BY course_id
+    ),
+    submission_stats AS (
+        SELECT 
+            t.course_id,
+            COUNT(*) AS n_submissions,
+            SUM(s.id) AS submission_ids,
+            SUM(s.id * FLOOR(COALESCE(s.grade, -1) * 100 + 0.5)) AS grades,
+            SUM(FLOOR(EXTRACT(EPOCH FROM s.submitted_at))) AS submitted
+        FROM submissions s
+        INNER JOIN tasks t ON t.id = s.task_id
+        WHERE EXISTS (
+            SELECT 1 FROM enrollments e
+            WHERE e.course_id = t.course_id AND e.student_id = s.student_id
+        )
+        GROUP BY t.course_id
+    )
+    SELECT 
+        ts.course_id,
+        ts.n_tasks,
+        ts.task_ids,
+        ts.due_dates,
+        es.n_students,
+        es.student_ids,
+        COALESCE(ss.n_submissions, 0) AS n_submissions,
+        COALESCE(ss.submission_ids, 0) AS submission_ids,
+        COALESCE(ss.grades, 0) AS grades,
+        COALESCE(ss.submitted, 0) AS submitted
+    FROM task_stats ts
+    INNER JOIN enrollment_stats es ON es.course_id = ts.course_id
+    LEFT JOIN submission_stats ss ON ss.course_id = ts.course_id
+    ORDER BY ts.course_id
+"""
+
+
+# Asignatura y periodo de cada curso (estratos del muestreo de entrenamiento). No hay
+# una columna de periodo: se usa el semestre del año académico (marzo-julio y
+# agosto-febrero) en que se creó el curso; los cursos de enero y febrero pertenecen
+# al segundo semestre del año anterior.
+COURSE_STRATA_QUERY = """
+    SELECT 
+        c.id AS course_id,
+        COALESCE(c.subject, '') AS subject,
+        CASE
+            WHEN EXTRACT(MONTH FROM c.created_at) BETWEEN 3 AND 7
+                THEN EXTRACT(YEAR FROM c.created_at)::int || '-1'
+            WHEN EXTRACT(MONTH FROM c.created_at) >= 8
+                THEN EXTRACT(YEAR FROM c.created_at)::int || '-2'
+            ELSE (EXTRACT(YEAR FROM c.created_at)::int - 1) || '-2'
+        END AS term
+    FROM courses c
+"""
 
 
 class DataService:
     """Servicio para acceder a los datos de la base de datos"""
     
     def __init__(self):
-        self.engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+        self.engine = create_engine(
+            settings.DATABASE_URL,
+            pool_pre_ping=True,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW
+        )
+        self.feature_engineering = FeatureEngineering()
+    
+    def read_sql(self, query, params: dict = None) -> pd.DataFrame:
+        """pd.read_sql medido como etapa "sql" de la petición en curso (ver services/metrics.py)"""
+        with metrics.stage("sql"):
+            df = pd.read_sql(query, self.engine, params=params)
+        metrics.observe_rows(len(df))
+        return df
     
-    def get_historical_data(self) -> pd.DataFrame:
+    def fetch_rows(self, query: str, params: dict = None) -> list:
         """
-        Obtiene todos los datos históricos necesarios para entrenar el modelo.
-        Incluye todas las tareas (entregadas y no entregadas) para calcular correctamente
-        la tasa de no entrega.
-        También incluye datos del perfil del estudiante (cuestionario).
-        Retorna un DataFrame con: student_id, course_id, task_id, due_date, 
-        submitted_at, grade, y datos del perfil del estudiante.
+        Tuplas crudas del cursor DB-API, sin construir un DataFrame (para consultas de
+        pocas filas), medido como etapa "sql" igual que read_sql
+        """
+        with metrics.stage("sql"):
+            connection = self.engine.raw_connection()
+            try:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(query, params or {})
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
+            finally:
+                connection.close()
+        metrics.observe_rows(len(rows))
+        return rows
+    
+    @staticmethod
+    def scope_filter(
+        student_column: str,
+        course_column: str,
+        course_ids: list = None,
+        pairs: list = None,
+        student_ids: list = None
+    ):
+        """
+        Condición SQL para un conjunto de cursos completos, pares (estudiante, curso)
+        explícitos y/o estudiantes (todas sus inscripciones), con los ids pasados como
+        arrays (un solo parámetro por lista, sin importar cuántos ids haya).
+        
+        Returns:
+            (condición SQL, parámetros)
+        """
+        conditions = []
+        params = {}
+        if course_ids:
+            conditions.append(f"{course_column} = ANY(:scope_course_ids)")
+            params["scope_course_ids"] = [int(course_id) for course_id in course_ids]
+        if student_ids:
+            conditions.append(f"{student_column} = ANY(:scope_student_ids)")
+            params["scope_student_ids"] = [int(student_id) for student_id in student_ids]
+        if pairs:
+            conditions.append(
+                f"({student_column}, {course_column}) IN "
+                "(SELECT * FROM UNNEST(:scope_pair_student_ids, :scope_pair_course_ids))"
+            )
+            params["scope_pair_student_ids"] = [int(student_id) for student_id, _ in pairs]
+            params["scope_pair_course_ids"] = [int(course_id) for _, course_id in pairs]
+        return f"({' OR '.join(conditions)})", params
+    
+    def get_aggregated_features(self, where: str = "", params: dict = None) -> pd.DataFrame:
+        """
+        Calcula las features por estudiante-curso agregando en la base de datos.
+        Solo se transfiere una fila por estudiante-curso; la normalización final
+        es la misma de FeatureEngineering.features_from_aggregates().
+        
+        Args:
+            where: Cláusula WHERE opcional sobre tasks (t) / enrollments (e)
+            params: Parámetros de la cláusula WHERE
+        
+        Returns:
+            DataFrame listo para el modelo (mismas columnas que calculate_features)
+        """
+        query = text(AGGREGATED_FEATURES_QUERY.format(where=where))
+        
+        try:
+            aggregates = self.read_sql(query, params=params or {})
+        except Exception as e:
+            print(f"Error al obtener features agregadas: {e}")
+            return pd.DataFrame()
+        
+        if aggregates.empty:
+            return pd.DataFrame()
+        
+        with metrics.stage("features"):
+            return self.feature_engineering.features_from_aggregates(aggregates)
+    
+    def get_materialized_features(
+        self,
+        student_id: int = None,
+        course_id: int = None,
+        course_ids: list = None,
+        pairs: list = None
+    ) -> pd.DataFrame:
+        """
+        Obtiene las features desde la tabla materializada student_course_features.
+        Para un estudiante-curso es una búsqueda por clave primaria.
+        
+        Args:
+            course_ids / pairs: Alcance de una predicción masiva (ver scope_filter)
+        
+        Returns:
+            DataFrame listo para el modelo, o vacío si no hay filas (o la tabla no existe)
+        """
+        filters = ""
+        params = {}
+        if student_id is not None:
+            filters += " AND f.student_id = :student_id"
+            params["student_id"] = student_id
+        if course_id is not None:
+            filters += " AND f.course_id = :course_id"
+            params["course_id"] = course_id
+        if course_ids or pairs:
+            condition, scope_params = self.scope_filter("f.student_id", "f.course_id", course_ids, pairs)
+            filters += f" AND {condition}"
+            params.update(scope_params)
+        
+        query = text(MATERIALIZED_FEATURES_QUERY.format(filters=filters))
+        
+        try:
+            aggregates = self.read_sql(query, params=params)
+        except Exception as e:
+            print(f"Error al leer la tabla de features: {e}")
+            return pd.DataFrame()
+        
+        if aggregates.empty:
+            return pd.DataFrame()
+        
+        with metrics.stage("features"):
+            return self.feature_engineering.features_from_aggregates(aggregates)
+    
+    def get_data_watermark(self, course_id: int, student_id: int = None):
+        """
+        Obtiene la marca de agua de los datos de un curso (o de un estudiante en el curso)
+        
+        Returns:
+            Tupla comparable que cambia cuando cambian los datos, o None si hay error
+        """
+        student_filter = "AND student_id = :student_id" if student_id is not None else ""
+        params = {"course_id": course_id}
+        if student_id is not None:
+            params["student_id"] = student_id
+        
+        try:
+            with metrics.stage("watermark"), self.engine.connect() as conn:
+                row = conn.execute(
+                    text(DATA_WATERMARK_QUERY.format(student_filter=student_filter)), params
+                ).one()
+            return tuple(str(value) for value in row)
+        except Exception as e:
+            print(f"Error al obtener la marca de agua de datos: {e}")
+            return None
+    
+    def get_pair_watermarks(self, pairs: list) -> dict:
+        """
+        Marcas de agua de varios pares (estudiante, curso) con una sola consulta
+        
+        Returns:
+            {(student_id, course_id): tupla igual a get_data_watermark(course_id, student_id)},
+            o {} si hay error
+        """
+        params = {
+            "student_ids": [int(student_id) for student_id, _ in pairs],
+            "course_ids": [int(course_id) for _, course_id in pairs],
+        }
+        
+        try:
+            with metrics.stage("watermark"), self.engine.connect() as conn:
+                rows = conn.execute(text(PAIR_WATERMARKS_QUERY), params).all()
+        except Exception as e:
+            print(f"Error al obtener las marcas de agua de datos: {e}")
+            return {}
+        return {(int(row[0]), int(row[1])): tuple(str(value) for value in row[2:]) for row in rows}
+    
+    def get_student_profiles(self, student_ids: list) -> pd.DataFrame:
+        """
+        Obtiene el cuestionario de perfil de varios estudiantes en una sola consulta
+        
+        Returns:
+            DataFrame con student_id y las columnas del perfil (solo estudiantes con perfil)
         """
         query = text("""
             SELECT 
-                t.id as task_id,
-                t.course_id,
-                t.due_date,
-                t.created_at as task_created_at,
-                e.student_id,
-                e.enrollment_date,
-                s.id as submission_id,
-                s.submitted_at,
-                s.grade,
+                sp.student_id,
                 sp.motivation,
                 sp.available_time,
                 sp.sleep_hours,
@@ -48,13 +528,34 @@ class DataService:
                 sp.study_place_tranquility,
                 sp.academic_pressure,
                 sp.gender
-            FROM tasks t
-            INNER JOIN enrollments e ON t.course_id = e.course_id
-            LEFT JOIN submissions s ON s.task_id = t.id AND s.student_id = e.student_id
-            LEFT JOIN student_profiles sp ON sp.student_id = e.student_id
-            ORDER BY e.student_id, t.course_id, t.due_date
+            FROM student_profiles sp
+            WHERE sp.student_id = ANY(:student_ids)
+            ORDER BY sp.student_id
         """)
         
+        try:
+            return self.read_sql(query, params={"student_ids": list(student_ids)})
+        except Exception as e:
+            print(f"Error al obtener perfiles: {e}")
+            return pd.DataFrame()
+    
+    def get_historical_data(self, aggregate: bool = False) -> pd.DataFrame:
+        """
+        Obtiene todos los datos históricos necesarios para entrenar el modelo.
+        Incluye todas las tareas (entregadas y no entregadas) para calcular correctamente
+        la tasa de no entrega.
+        También incluye datos del perfil del estudiante (cuestionario).
+        Retorna un DataFrame con: student_id, course_id, task_id, due_date, 
+        submitted_at, grade, y datos del perfil del estudiante.
+        
+        Con aggregate=True la agregación se hace en Postgres y se retorna
+        directamente el DataFrame de features (una fila por estudiante-curso).
+        """
+        if aggregate:
+            return self.get_aggregated_features()
+        
+        query = text(HISTORICAL_DATA_QUERY.format(where=""))
+        
         try:
             df = pd.read_sql(query, self.engine)
             return df
@@ -62,6 +563,169 @@ class DataService:
             print(f"Error al obtener datos históricos: {e}")
             return pd.DataFrame()
     
+    def get_historical_features(self, chunksize: int = None, sampler: StratifiedReservoir = None) -> pd.DataFrame:
+        """
+        Features de entrenamiento (una fila por estudiante-curso) calculadas leyendo
+        los datos históricos por partes de chunksize filas con un cursor del lado
+        del servidor (stream_results): nunca están todas las filas en memoria, solo
+        una parte y los agregados por estudiante-curso (ver FeatureAccumulator).
+        
+        Retorna el mismo DataFrame que calculate_features(get_historical_data()).
+        Con sampler, las features de cada parte pasan por el muestreador y se retorna
+        su muestra (la memoria queda acotada por el tamaño de la muestra).
+        """
+        accumulator = FeatureAccumulator(self.feature_engineering, sink=sampler.add if sampler else None)
+        try:
+            for chunk in self.iter_historical_rows(chunksize=chunksize):
+                accumulator.add(chunk)
+            print(f"Datos obtenidos: {accumulator.n_rows} registros en {accumulator.n_chunks} partes")
+            features = accumulator.finalize()
+            return sampler.sample() if sampler is not None else features
+        except Exception as e:
+            print(f"Error al obtener datos históricos: {e}")
+            return pd.DataFrame()
+    
+    def iter_historical_rows(self, course_ids: list = None, chunksize: int = None):
+        """
+        Recorre las filas de los datos históricos (todas, o solo las de course_ids)
+        en partes de chunksize filas, con un cursor del lado del servidor.
+        Las filas de cada par estudiante-curso llegan contiguas.
+        
+        A diferencia de get_historical_data(), los errores se propagan: quien lee
+        por partes necesita distinguir "sin datos" de "falló la consulta".
+        """
+        where = ""
+        params = {}
+        if course_ids is not None:
+            condition, params = self.scope_filter("e.student_id", "t.course_id", course_ids=course_ids)
+            where = f"WHERE {condition}"
+        
+        with self.engine.connect().execution_options(stream_results=True) as connection:
+            yield from pd.read_sql(
+                text(HISTORICAL_DATA_QUERY.format(where=where)), connection, params=params,
+                chunksize=chunksize or settings.TRAINING_CHUNK_SIZE
+            )
+    
+    def get_course_strata(self) -> pd.DataFrame:
+        """
+        Asignatura y periodo de cada curso (ver COURSE_STRATA_QUERY)
+        
+        Returns:
+            DataFrame indexado por course_id con subject y term
+        
+        Raises:
+            Los errores de la consulta
+        """
+        return pd.read_sql(text(COURSE_STRATA_QUERY), self.engine).set_index("course_id")
+    
+    def training_sampler(self, sample_size: int) -> StratifiedReservoir:
+        """
+        Muestreador de sample_size pares estratificado por nivel de riesgo, asignatura
+        y periodo del curso (ver services/training_sampler.py)
+        """
+        strata = partial(training_strata, courses=self.get_course_strata(), feature_engineering=self.feature_engineering)
+        return StratifiedReservoir(sample_size, strata)
+    
+    def get_course_fingerprints(self) -> pd.DataFrame:
+        """
+        Huella de las filas de entrenamiento de cada curso (ver COURSE_FINGERPRINT_QUERY)
+        
+        Returns:
+            DataFrame indexado por course_id con columnas enteras
+        
+        Raises:
+            Los errores de la consulta (no se confunden con "no hay cursos")
+        """
+        fingerprints = pd.read_sql(text(COURSE_FINGERPRINT_QUERY), self.engine)
+        return fingerprints.set_index("course_id").astype("int64")
+    
+    def get_profile_changes(self, since=None) -> pd.DataFrame:
+        """
+        Cuestionarios creados o actualizados después de since (todos si since es None)
+        
+        Returns:
+            DataFrame con student_id, las columnas del perfil y updated_at
+        
+        Raises:
+            Los errores de la consulta
+        """
+        query = """
+            SELECT 
+                sp.student_id,
+                sp.motivation,
+                sp.available_time,
+                sp.sleep_hours,
+                sp.study_hours,
+                sp.enjoyment_studying,
+                sp.study_place_tranquility,
+                sp.academic_pressure,
+                sp.gender,
+                sp.updated_at
+            FROM student_profiles sp
+        """
+        params = {}
+        if since is not None:
+            query += " WHERE sp.updated_at > :since"
+            params["since"] = since
+        return pd.read_sql(text(query + " ORDER BY sp.student_id"), self.engine, params=params)
+    
+    def get_profiles_updated_max(self) -> Optional[str]:
+        """
+        Última actualización de un cuestionario (ISO 8601), o None si no hay cuestionarios
+        
+        Raises:
+            Los errores de la consulta
+        """
+        with self.engine.connect() as conn:
+            updated_max = conn.execute(text("SELECT MAX(updated_at) FROM student_profiles")).scalar()
+        return pd.to_datetime(updated_max, utc=True).isoformat() if updated_max is not None else None
+    
+    def get_scoring_features(self, course_ids: list) -> pd.DataFrame:
+        """
+        Features de todos los estudiantes de los cursos para el trabajo de puntajes
+        de riesgo: desde la tabla materializada si está habilitada, y agregando en
+        Postgres los estudiante-curso que no tienen fila en ella (cursos cargados sin
+        pasar por el CRUD, como populate_historical_data.py) o todos si está deshabilitada.
+    
+        A diferencia de get_materialized_features / get_aggregated_features, un error
+        de la consulta se propaga: un resultado vacío significa "sin estudiantes" y
+        el trabajo borra los puntajes de esos cursos.
+    
+        Raises:
+            Los errores de la consulta
+        """
+        frames = []
+        condition, params = self.scope_filter("e.student_id", "t.course_id", course_ids)
+        if settings.USE_FEATURE_TABLE:
+            table_condition, table_params = self.scope_filter("f.student_id", "f.course_id", course_ids)
+            query = MATERIALIZED_FEATURES_QUERY.format(filters=f"AND {table_condition}")
+            frames.append(pd.read_sql(text(query), self.engine, params=table_params))
+            # Join completo solo para los pares sin fila (con tareas) en la tabla
+            condition += """ AND NOT EXISTS (
+                SELECT 1 FROM student_course_features f
+                WHERE f.student_id = e.student_id AND f.course_id = t.course_id AND f.n_tasks > 0
+            )"""
+        query = AGGREGATED_FEATURES_QUERY.format(where=f"WHERE {condition}")
+        frames.append(pd.read_sql(text(query), self.engine, params=params))
+        
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+        aggregates = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        aggregates = aggregates.sort_values(["student_id", "course_id"], kind="stable", ignore_index=True)
+        return self.feature_engineering.features_from_aggregates(aggregates)
+    
+    def get_active_course_ids(self) -> list:
+        """
+        Cursos con al menos una inscripción, en orden
+    
+        Raises:
+            Los errores de la consulta
+        """
+        with self.engine.connect() as conn:
+            rows = conn.execute(text("SELECT DISTINCT course_id FROM enrollments ORDER BY course_id"))
+            return [int(course_id) for (course_id,) in rows]
+    
     def get_student_course_data(self, student_id: int, course_id: int) -> pd.DataFrame:
         """
         Obtiene los datos de un estudiante específico en un curso específico
@@ -96,9 +760,8 @@ class DataService:
         """)
         
         try:
-            df = pd.read_sql(
-                query, 
-                self.engine,
+            df = self.read_sql(
+                query,
                 params={"student_id": student_id, "course_id": course_id}
             )
             return df
@@ -106,11 +769,40 @@ class DataService:
             print(f"Error al obtener datos del estudiante: {e}")
             return pd.DataFrame()
     
-    def get_course_students_data(self, course_id: int) -> pd.DataFrame:
+    def get_student_course_feature_row(self, student_id: int, course_id: int) -> Optional[dict]:
+        """
+        Camino rápido para un estudiante-curso: las filas se leen como tuplas y las
+        features se calculan con FeatureEngineering.features_from_rows (mismos valores
+        que get_student_course_data + calculate_features, sin pandas)
+        
+        Returns:
+            dict con student_id, course_id y las features, o None si no hay datos
+        """
+        try:
+            rows = self.fetch_rows(
+                STUDENT_COURSE_ROWS_QUERY,
+                params={"student_id": student_id, "course_id": course_id}
+            )
+        except Exception as e:
+            print(f"Error al obtener datos del estudiante: {e}")
+            return None
+        
+        with metrics.stage("features"):
+            return self.feature_engineering.features_from_rows(student_id, course_id, rows)
+    
+    def get_course_students_data(self, course_id: int, aggregate: bool = False) -> pd.DataFrame:
         """
         Obtiene los datos de todos los estudiantes en un curso
         Incluye todas las tareas (entregadas y no entregadas) y datos del perfil
+        
+        Con aggregate=True retorna directamente las features agregadas en Postgres.
         """
+        if aggregate:
+            return self.get_aggregated_features(
+                where="WHERE t.course_id = :course_id",
+                params={"course_id": course_id}
+            )
+        
         query = text("""
             SELECT 
                 t.id as task_id,
@@ -139,9 +831,8 @@ class DataService:
         """)
         
         try:
-            df = pd.read_sql(
+            df = self.read_sql(
                 query,
-                self.engine,
                 params={"course_id": course_id}
             )
             return df
@@ -149,6 +840,48 @@ class DataService:
             print(f"Error al obtener datos del curso: {e}")
             return pd.DataFrame()
     
+    def get_bulk_features(
+        self,
+        course_ids: list = None,
+        pairs: list = None,
+        aggregate: bool = False,
+        student_ids: list = None
+    ) -> pd.DataFrame:
+        """
+        Calcula las features de varios cursos completos, pares (estudiante, curso)
+        explícitos y/o estudiantes (en todos sus cursos) con una sola consulta.
+        
+        Args:
+            course_ids: Cursos de los que se quieren todos los estudiantes
+            pairs: Lista de tuplas (student_id, course_id)
+            aggregate: Agregar en Postgres en lugar de traer las filas tarea×inscripción
+            student_ids: Estudiantes de los que se quieren todos los cursos
+        
+        Returns:
+            DataFrame listo para el modelo (mismas columnas que calculate_features)
+        """
+        if not course_ids and not pairs and not student_ids:
+            return pd.DataFrame()
+        
+        condition, params = self.scope_filter("e.student_id", "t.course_id", course_ids, pairs, student_ids)
+        
+        if aggregate:
+            return self.get_aggregated_features(where=f"WHERE {condition}", params=params)
+        
+        query = text(HISTORICAL_DATA_QUERY.format(where=f"WHERE {condition}"))
+        
+        try:
+            df = self.read_sql(query, params=params)
+        except Exception as e:
+            print(f"Error al obtener datos para predicción masiva: {e}")
+            return pd.DataFrame()
+        
+        if df.empty:
+            return pd.DataFrame()
+        
+        with metrics.stage("features"):
+            return self.feature_engineering.calculate_features(df)
+    
     def get_all_tasks_for_student_course(self, student_id: int, course_id: int) -> pd.DataFrame:
         """
         Obtiene todas las tareas (entregadas y no entregadas) de un estudiante en un curso
@@ -0,0 +1,208 @@
+"""
+Monitor de drift de las features de entrada del modelo
+
+Al entrenar se guarda con la versión del modelo un histograma de referencia por
+feature (cortes en los cuantiles de los datos de entrenamiento, ver
+build_reference). En servicio, cada lote evaluado por ModelService suma sus filas
+a histogramas con esos mismos cortes: memoria fija (features x bins contadores) y
+costo constante por fila, un solo bincount por lote para todas las features.
+
+Los conteos en vivo se llevan en dos ventanas que rotan cada DRIFT_WINDOW_SECONDS
+(la actual y la anterior), así el reporte refleja los datos recientes y no todo
+lo visto desde que arrancó el proceso. Cada proceso (worker) lleva sus propios
+conteos.
+
+report() compara las proporciones en vivo con las de referencia por feature:
+PSI (population stability index) y KS (máxima diferencia entre las distribuciones
+acumuladas, evaluada en los cortes de los bins).
+"""
+
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+# Proporción mínima por bin en el PSI (evita log(0) en bins vacíos)
+PSI_EPSILON = 1e-4
+# Umbrales usuales del PSI: < 0.1 sin cambio, 0.1-0.25 moderado, > 0.25 significativo
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+
+def build_reference(X, feature_names: List[str], n_bins: int = 20) -> dict:
+    """
+    Histogramas de referencia de los datos de entrenamiento (serializable en JSON,
+    se guarda en la metadata de la versión)
+
+    Los cortes son los cuantiles interiores de cada feature (sin repetidos, así las
+    features discretas quedan con un bin por valor). El bin i cuenta los valores en
+    (cortes[i-1], cortes[i]]; el primero y el último son abiertos.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+    features = {}
+    for j, name in enumerate(feature_names):
+        column = X[:, j]
+        column = column[~np.isnan(column)]
+        edges = np.unique(np.quantile(column, quantiles)) if len(column) else np.array([])
+        counts = np.bincount(np.searchsorted(edges, column, side="left"), minlength=len(edges) + 1)
+        features[name] = {"edges": edges.tolist(), "counts": counts.tolist()}
+    return {"n_bins": n_bins, "samples": int(len(X)), "features": features}
+
+
+class _Window:
+    """Conteos de una versión: cortes aplanados y dos ventanas de conteos"""
+
+    def __init__(self, version: str, reference: dict):
+        self.version = version
+        self.feature_names = list(reference["features"])
+        edges = [np.asarray(reference["features"][name]["edges"], dtype=np.float64) for name in self.feature_names]
+        self.edges = edges
+        self.n_edges = np.array([len(e) for e in edges])
+        # Cortes en una matriz (features, max_cortes) completada con +inf: un valor cae
+        # en el bin igual al número de cortes menores que él
+        width = max(1, int(self.n_edges.max())) if edges else 1
+        self.edge_matrix = np.full((len(edges), width), np.inf)
+        for j, e in enumerate(edges):
+            self.edge_matrix[j, :len(e)] = e
+        # Desplazamiento de cada feature en el vector plano de conteos
+        sizes = self.n_edges + 1
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        self.n_counts = int(sizes.sum())
+        self.reference = [np.asarray(reference["features"][name]["counts"], dtype=np.float64) for name in self.feature_names]
+
+        self.current = np.zeros(self.n_counts, dtype=np.int64)
+        self.previous = np.zeros(self.n_counts, dtype=np.int64)
+        self.current_rows = 0
+        self.previous_rows = 0
+        self.window_started = time.time()
+        self.lock = threading.Lock()
+
+
+class DriftMonitor:
+    """Histogramas en vivo de las features de entrada contra la referencia de la versión activa"""
+
+    def __init__(self, window_seconds: float = 86400.0, enabled: bool = True):
+        self.window_seconds = window_seconds
+        self.enabled = enabled
+        self._window: Optional[_Window] = None
+
+    def set_reference(self, version: str, reference: Optional[dict]):
+        """
+        Cambia a los histogramas de referencia de version (la versión activa). Los
+        conteos en vivo se reinician porque dependen de los cortes de la referencia;
+        sin referencia (versiones anteriores a este monitor) no se cuenta nada.
+        """
+        window = self._window
+        if window is not None and window.version == version:
+            return
+        self._window = _Window(version, reference) if reference else None
+
+    def observe(self, X):
+        """Suma las filas de X (columnas en el orden de la referencia) a la ventana actual"""
+        window = self._window
+        if window is None or not self.enabled:
+            return
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(window.feature_names) or not len(X):
+            return
+
+        if len(X) <= 32:
+            # Pocas filas (el caso de /predict): una sola comparación contra la matriz de cortes
+            bins = (X[:, :, None] > window.edge_matrix[None, :, :]).sum(axis=2)
+            bins = np.where(np.isnan(X), window.n_edges, bins)
+        else:
+            bins = np.empty(X.shape, dtype=np.int64)
+            for j, edges in enumerate(window.edges):
+                bins[:, j] = np.searchsorted(edges, X[:, j], side="left")
+        # NaN cae en el último bin (como con searchsorted)
+        counts = np.bincount((bins + window.offsets).ravel(), minlength=window.n_counts)
+
+        with window.lock:
+            self._rotate(window)
+            window.current += counts
+            window.current_rows += len(X)
+
+    def _rotate(self, window: _Window):
+        elapsed = time.time() - window.window_started
+        if elapsed < self.window_seconds:
+            return
+        if elapsed >= 2 * self.window_seconds:
+            # Sin predicciones durante más de una ventana: la anterior también quedó vieja
+            window.previous[:] = 0
+            window.previous_rows = 0
+        else:
+            window.previous, window.current = window.current, window.previous
+            window.previous_rows = window.current_rows
+        window.current[:] = 0
+        window.current_rows = 0
+        window.window_started = time.time()
+
+    def report(self, min_samples: int = 200) -> dict:
+        """
+        PSI y KS por feature de las filas de las dos últimas ventanas contra la referencia
+
+        Returns:
+            dict con la versión, las filas observadas, el detalle por feature y la lista
+            de features con drift significativo (vacía con menos de min_samples filas)
+        """
+        window = self._window
+        if window is None:
+            return {"enabled": self.enabled, "model_version": None, "samples": 0, "features": {}, "drifted": []}
+
+        with window.lock:
+            self._rotate(window)
+            live = window.current + window.previous
+            samples = window.current_rows + window.previous_rows
+            window_started = window.window_started
+
+        features = {}
+        drifted = []
+        for j, name in enumerate(window.feature_names):
+            start = window.offsets[j]
+            live_counts = live[start:start + window.n_edges[j] + 1].astype(np.float64)
+            reference_counts = window.reference[j]
+            psi, ks = self._compare(live_counts, reference_counts)
+            if samples < min_samples:
+                status = "sin_datos_suficientes"
+            elif psi > PSI_SIGNIFICANT:
+                status = "significativo"
+                drifted.append(name)
+            elif psi > PSI_MODERATE:
+                status = "moderado"
+            else:
+                status = "sin_cambio"
+            features[name] = {
+                "psi": round(psi, 4),
+                "ks": round(ks, 4),
+                "status": status,
+                "edges": window.edges[j].round(4).tolist(),
+                "reference": np.round(reference_counts / max(reference_counts.sum(), 1), 4).tolist(),
+                "live": np.round(live_counts / max(live_counts.sum(), 1), 4).tolist(),
+            }
+
+        return {
+            "enabled": self.enabled,
+            "model_version": window.version,
+            "samples": int(samples),
+            "min_samples": min_samples,
+            "window_seconds": self.window_seconds,
+            "current_window_started": window_started,
+            "features": features,
+            "drifted": drifted,
+        }
+
+    @staticmethod
+    def _compare(live_counts: np.ndarray, reference_counts: np.ndarray):
+        """(PSI, KS) entre dos histogramas con los mismos bins"""
+        if live_counts.sum() == 0 or reference_counts.sum() == 0:
+            return 0.0, 0.0
+        live = live_counts / live_counts.sum()
+        reference = reference_counts / reference_counts.sum()
+        ks = float(np.abs(np.cumsum(live) - np.cumsum(reference)).max())
+        live = np.maximum(live, PSI_EPSILON)
+        reference = np.maximum(reference, PSI_EPSILON)
+        psi = float(np.sum((live - reference) * np.log(live / reference)))
+        return psi, ks
@@ -3,6 +3,7 @@ Feature Engineering para el modelo de ML
 Calcula las features necesarias para predecir el riesgo académico
 """
 
+import math
 import pandas as pd
 import numpy as np
 from datetime import datetime
@@ -11,6 +12,21 @@ from datetime import datetime
 class FeatureEngineering:
     """Clase para calcular features a partir de datos históricos"""
     
+    # Columnas crudas del cuestionario que vienen en los datos de entrada
+    PROFILE_RAW_COLUMNS = [
+        'motivation',
+        'available_time',
+        'sleep_hours',
+        'study_hours',
+        'enjoyment_studying',
+        'study_place_tranquility',
+        'academic_pressure',
+        'gender'
+    ]
+    
+    # Columnas (en orden) de las tuplas que recibe features_from_rows
+    ROW_COLUMNS = ['task_id', 'due_date', 'submission_id', 'submitted_at', 'grade'] + PROFILE_RAW_COLUMNS
+    
     def __init__(self):
         # Features predictivas (del cuestionario, disponibles al inicio del curso)
         # Estas son las features PRINCIPALES para predicción temprana
@@ -41,13 +57,16 @@ class FeatureEngineering:
         """Retorna la lista de nombres de features"""
         return self.feature_names
     
-    def calculate_features(self, data: pd.DataFrame) -> pd.DataFrame:
+    def calculate_features(self, data: pd.DataFrame, engine: str = "vectorized") -> pd.DataFrame:
         """
         Calcula las features para cada estudiante-curso
         
         Args:
             data: DataFrame con columnas: student_id, course_id, task_id, 
                   due_date, submitted_at, grade, etc.
+            engine: "vectorized" (por defecto) calcula todo con un único
+                    groupby-aggregate; "loop" usa la implementación original
+                    que recorre cada grupo en Python (se mantiene como referencia)
         
         Returns:
             DataFrame con una fila por estudiante-curso y las features calculadas
@@ -55,12 +74,279 @@ class FeatureEngineering:
         if data.empty:
             return pd.DataFrame()
         
-        # Convertir fechas a datetime si son strings
+        self.parse_dates(data)
+        
+        if engine == "loop":
+            return self._calculate_features_loop(data)
+        if engine != "vectorized":
+            raise ValueError(f"Motor de features desconocido: {engine}")
+        
+        aggregates = self.aggregate(data)
+        if aggregates.empty:
+            return pd.DataFrame()
+        
+        return self.features_from_aggregates(aggregates)
+    
+    @staticmethod
+    def parse_dates(data: pd.DataFrame) -> pd.DataFrame:
+        """Convierte (en el mismo DataFrame) las columnas de fechas a datetime si son strings"""
         date_columns = ['due_date', 'submitted_at', 'task_created_at', 'enrollment_date']
         for col in date_columns:
-            if col in data.columns:
+            if col in data.columns and not pd.api.types.is_datetime64_any_dtype(data[col]):
                 data[col] = pd.to_datetime(data[col])
+        return data
+    
+    def aggregate(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Reduce las filas tarea×inscripción a una fila por estudiante-curso con
+        los agregados necesarios para las features (conteos, media y desviación
+        de notas y los valores crudos del perfil de la primera fila del grupo).
+        
+        Returns:
+            DataFrame con columnas: student_id, course_id, n_tasks, n_submitted_tasks,
+            n_timed_submissions, n_late_submissions, n_grades, grade_mean, grade_std
+            y las columnas crudas del perfil
+        """
+        keys = ['student_id', 'course_id']
+        grouped = data.groupby(keys, sort=True)
+        index = grouped.size().index
+        
+        aggregates = pd.DataFrame(index=index)
+        
+        # Tareas distintas del grupo (equivale a len(group['task_id'].unique()))
+        if 'task_id' in data.columns:
+            tasks = data[keys + ['task_id']].drop_duplicates()
+            aggregates['n_tasks'] = tasks.groupby(keys).size()
+        else:
+            aggregates['n_tasks'] = 0
+        
+        # Tareas distintas con entrega
+        if 'task_id' in data.columns and 'submission_id' in data.columns:
+            submitted = data.loc[
+                data['submission_id'].notna() & data['task_id'].notna(),
+                keys + ['task_id']
+            ].drop_duplicates()
+            aggregates['n_submitted_tasks'] = submitted.groupby(keys).size()
+        else:
+            aggregates['n_submitted_tasks'] = 0
+        
+        # Entregas con fecha de entrega y fecha límite, y cuántas fueron tardías
+        if 'submitted_at' in data.columns and 'due_date' in data.columns:
+            timed = data['submitted_at'].notna() & data['due_date'].notna()
+            late = timed & (data['submitted_at'] > data['due_date'])
+            flags = pd.DataFrame({
+                'student_id': data['student_id'],
+                'course_id': data['course_id'],
+                'n_timed_submissions': timed.astype(np.int64),
+                'n_late_submissions': late.astype(np.int64)
+            })
+            counts = flags.groupby(keys).sum()
+            aggregates['n_timed_submissions'] = counts['n_timed_submissions']
+            aggregates['n_late_submissions'] = counts['n_late_submissions']
+        else:
+            aggregates['n_timed_submissions'] = 0
+            aggregates['n_late_submissions'] = 0
+        
+        # Conteo, media y desviación estándar (muestral) de las notas
+        if 'grade' in data.columns:
+            grades = pd.to_numeric(data['grade'], errors='coerce')
+            stats = grades.groupby([data['student_id'], data['course_id']]).agg(['count', 'mean', 'std'])
+            aggregates['n_grades'] = stats['count']
+            aggregates['grade_mean'] = stats['mean']
+            aggregates['grade_std'] = stats['std']
+        else:
+            aggregates['n_grades'] = 0
+            aggregates['grade_mean'] = np.nan
+            aggregates['grade_std'] = np.nan
+        
+        count_columns = ['n_tasks', 'n_submitted_tasks', 'n_timed_submissions', 'n_late_submissions', 'n_grades']
+        aggregates[count_columns] = aggregates[count_columns].fillna(0).astype(np.int64)
+        
+        # Datos del perfil: constantes por estudiante, se toman de la primera fila del grupo
+        profile_columns = [c for c in self.PROFILE_RAW_COLUMNS if c in data.columns]
+        if profile_columns:
+            first_rows = data.drop_duplicates(keys, keep='first').set_index(keys)
+            for col in profile_columns:
+                aggregates[col] = first_rows[col].reindex(index)
+        
+        return aggregates.reset_index()
+    
+    def features_from_aggregates(self, aggregates: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convierte los agregados por estudiante-curso (ver aggregate()) en las features
+        finales del modelo, aplicando la normalización y los valores por defecto.
+        
+        Returns:
+            DataFrame con student_id, course_id y las features en el orden de get_feature_names()
+        """
+        features = pd.DataFrame({
+            'student_id': aggregates['student_id'].values,
+            'course_id': aggregates['course_id'].values
+        })
+        
+        # Features del perfil (normalizadas a 0-1, escala original 1-10)
+        for col in self.profile_features[:-1]:
+            if col in aggregates.columns:
+                values = pd.to_numeric(aggregates[col], errors='coerce').to_numpy(dtype=float)
+                features[col] = np.where(np.isnan(values), 0.5, (values - 1.0) / 9.0)
+            else:
+                features[col] = 0.5
+        
+        if 'gender' in aggregates.columns:
+            # Se codifica cada valor distinto una sola vez
+            genders = aggregates['gender']
+            mapping = {g: self.encode_gender(g) for g in genders.dropna().unique()}
+            features['gender_encoded'] = genders.map(mapping).fillna(0.5).to_numpy(dtype=float)
+        else:
+            features['gender_encoded'] = 0.5
+        
+        n_tasks = aggregates['n_tasks'].to_numpy(dtype=float)
+        n_submitted = aggregates['n_submitted_tasks'].to_numpy(dtype=float)
+        n_timed = aggregates['n_timed_submissions'].to_numpy(dtype=float)
+        n_late = aggregates['n_late_submissions'].to_numpy(dtype=float)
+        n_grades = aggregates['n_grades'].to_numpy(dtype=float)
+        grade_mean = pd.to_numeric(aggregates['grade_mean'], errors='coerce').to_numpy(dtype=float)
+        grade_std = pd.to_numeric(aggregates['grade_std'], errors='coerce').to_numpy(dtype=float)
+        
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # 1. Tasa de retraso en entregas (neutral si no hay entregas)
+            features['submission_delay_rate'] = np.where(n_timed > 0, n_late / n_timed, 0.5)
+            
+            # 2. Tasa de no entrega
+            features['non_submission_rate'] = np.where(
+                n_tasks > 0, np.clip(1.0 - n_submitted / n_tasks, 0.0, 1.0), 0.5
+            )
+            
+            # 3. Promedio de notas normalizado (escala 1-7 a 0-1)
+            features['average_grade'] = np.where(
+                n_grades > 0, np.clip((grade_mean - 1.0) / 6.0, 0.0, 1.0), 0.5
+            )
+            
+            # 4. Variabilidad de notas (requiere al menos 2 notas)
+            features['grade_variability'] = np.where(
+                n_grades >= 2, np.minimum(grade_std / 3.0, 1.0), 0.5
+            )
+        
+        return features[['student_id', 'course_id'] + self.feature_names]
+    
+    def features_from_rows(self, student_id: int, course_id: int, rows: list) -> dict:
+        """
+        Features de un solo estudiante-curso a partir de tuplas crudas del cursor
+        (columnas ROW_COLUMNS), con aritmética de Python: sin DataFrame, conversión
+        de fechas ni groupby. Es el camino rápido de /predict para un estudiante.
+        
+        Da exactamente los mismos valores que calculate_features(): la media de las
+        notas usa la suma compensada (Kahan) y la desviación el algoritmo de Welford,
+        igual que el groupby de pandas.
+        
+        Returns:
+            dict con student_id, course_id y las features, con los mismos tipos que
+            calculate_features(...).iloc[-1].to_dict() (todo float); None sin filas
+        """
+        if not rows:
+            return None
+        
+        tasks = set()
+        submitted_tasks = set()
+        n_timed = 0
+        n_late = 0
+        n_grades = 0
+        grade_sum = 0.0
+        compensation = 0.0
+        mean = 0.0
+        squared_deviations = 0.0
         
+        for task_id, due_date, submission_id, submitted_at, grade, *_ in rows:
+            if task_id is not None:
+                tasks.add(task_id)
+                if submission_id is not None:
+                    submitted_tasks.add(task_id)
+            if submitted_at is not None and due_date is not None:
+                n_timed += 1
+                if submitted_at > due_date:
+                    n_late += 1
+            grade = self._to_float(grade)
+            if not math.isnan(grade):
+                n_grades += 1
+                # Suma compensada (group_mean de pandas)
+                y = grade - compensation
+                t = grade_sum + y
+                compensation = t - grade_sum - y
+                grade_sum = t
+                # Welford (group_var de pandas)
+                previous_mean = mean
+                mean += (grade - previous_mean) / n_grades
+                squared_deviations += (grade - mean) * (grade - previous_mean)
+        
+        features = {'student_id': float(student_id), 'course_id': float(course_id)}
+        
+        # Features del perfil (constantes por estudiante, de la primera fila)
+        profile = rows[0][len(self.ROW_COLUMNS) - len(self.PROFILE_RAW_COLUMNS):]
+        for col, value in zip(self.profile_features[:-1], profile):
+            value = self._to_float(value)
+            features[col] = 0.5 if math.isnan(value) else (value - 1.0) / 9.0
+        features['gender_encoded'] = self.encode_gender(profile[-1])
+        
+        # Transaccionales (mismas reglas y valores neutrales que features_from_aggregates)
+        features['submission_delay_rate'] = n_late / n_timed if n_timed > 0 else 0.5
+        features['non_submission_rate'] = (
+            min(max(1.0 - len(submitted_tasks) / len(tasks), 0.0), 1.0) if tasks else 0.5
+        )
+        features['average_grade'] = (
+            min(max((grade_sum / n_grades - 1.0) / 6.0, 0.0), 1.0) if n_grades > 0 else 0.5
+        )
+        features['grade_variability'] = (
+            min(math.sqrt(squared_deviations / (n_grades - 1)) / 3.0, 1.0) if n_grades >= 2 else 0.5
+        )
+        return features
+    
+    @staticmethod
+    def _to_float(value) -> float:
+        """Equivalente a pd.to_numeric(errors='coerce') para un valor (NaN si no es numérico)"""
+        if value is None:
+            return math.nan
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return math.nan
+    
+    def profile_only_features(self, profiles: pd.DataFrame) -> pd.DataFrame:
+        """
+        Features para predecir solo con el cuestionario (sin curso específico):
+        perfil normalizado y valores neutrales (0.5) en las features transaccionales.
+        
+        Args:
+            profiles: DataFrame con student_id y las columnas crudas del perfil
+        
+        Returns:
+            DataFrame con el mismo formato que calculate_features (course_id = 0)
+        """
+        aggregates = profiles.copy()
+        aggregates['course_id'] = 0
+        for col in ['n_tasks', 'n_submitted_tasks', 'n_timed_submissions', 'n_late_submissions', 'n_grades']:
+            aggregates[col] = 0
+        aggregates['grade_mean'] = np.nan
+        aggregates['grade_std'] = np.nan
+        return self.features_from_aggregates(aggregates)
+    
+    @staticmethod
+    def encode_gender(gender_val) -> float:
+        """Codifica el género: masculino=0, femenino=1, otro/no especificado=0.5"""
+        if gender_val is None or pd.isna(gender_val) or gender_val == '':
+            return 0.5
+        gender_str = str(gender_val).lower()
+        if 'femenino' in gender_str or 'mujer' in gender_str or 'female' in gender_str:
+            return 1.0
+        elif 'masculino' in gender_str or 'hombre' in gender_str or 'male' in gender_str:
+            return 0.0
+        else:
+            return 0.5  # Otro/no binario
+    
+    def _calculate_features_loop(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Implementación original: recorre cada grupo estudiante-curso en Python.
+        Se conserva como referencia para verificar la paridad del motor vectorizado.
+        """
         # Agrupar por estudiante y curso
         grouped = data.groupby(['student_id', 'course_id'])
         
@@ -216,3 +502,71 @@ class FeatureEngineering:
         
         return risk_high.astype(int)
 
+
+
+class FeatureAccumulator:
+    """
+    Calcula las features de un recorrido por partes (chunks) de las filas
+    tarea×inscripción, sin tener todas las filas en memoria a la vez.
+    
+    Cada parte se reduce con FeatureEngineering.aggregate() y solo se guardan los
+    agregados por estudiante-curso, así la memoria depende del número de pares y
+    no del número de filas. Las filas deben venir ordenadas por estudiante y curso:
+    el último par de cada parte puede seguir en la siguiente, por lo que sus filas
+    se retienen y se agregan junto con la parte siguiente (cada par se agrega una
+    sola vez y el resultado es idéntico al de calculate_features()).
+    
+    Con sink, las features de los pares completos de cada parte se entregan a
+    sink(features) en lugar de guardarse (por ejemplo a un StratifiedReservoir) y
+    finalize() retorna un DataFrame vacío.
+    """
+    
+    KEYS = ['student_id', 'course_id']
+    
+    def __init__(self, feature_engineering: FeatureEngineering = None, sink=None):
+        self.feature_engineering = feature_engineering or FeatureEngineering()
+        self.sink = sink
+        self.n_rows = 0
+        self.n_chunks = 0
+        self._aggregates = []
+        self._pending = None
+    
+    def add(self, chunk: pd.DataFrame):
+        """Agrega una parte de las filas (en el orden de la consulta)"""
+        if chunk.empty:
+            return
+        self.n_rows += len(chunk)
+        self.n_chunks += 1
+        
+        if self._pending is not None:
+            chunk = pd.concat([self._pending, chunk], ignore_index=True)
+        
+        # Retener el último par: puede tener más filas en la parte siguiente
+        last = chunk.iloc[-1]
+        is_last_pair = (
+            (chunk['student_id'] == last['student_id']) & (chunk['course_id'] == last['course_id'])
+        ).to_numpy()
+        self._pending = chunk.loc[is_last_pair].reset_index(drop=True)
+        self._aggregate(chunk.loc[~is_last_pair])
+    
+    def finalize(self) -> pd.DataFrame:
+        """Features de todos los pares agregados (mismo formato que calculate_features())"""
+        if self._pending is not None:
+            self._aggregate(self._pending)
+            self._pending = None
+        if not self._aggregates:
+            return pd.DataFrame()
+        
+        aggregates = pd.concat(self._aggregates, ignore_index=True)
+        self._aggregates = []
+        return self.feature_engineering.features_from_aggregates(aggregates)
+    
+    def _aggregate(self, rows: pd.DataFrame):
+        if rows.empty:
+            return
+        rows = self.feature_engineering.parse_dates(rows.copy())
+        aggregates = self.feature_engineering.aggregate(rows)
+        if self.sink is not None:
+            self.sink(self.feature_engineering.features_from_aggregates(aggregates))
+        else:
+            self._aggregates.append(aggregates)
@@ -0,0 +1,153 @@
+"""
+Reentrenamiento incremental del RandomForest
+
+Cada versión del modelo guarda en su metadata la marca de los datos con que se
+entrenó (training_watermark): la huella de cada curso (COURSE_FINGERPRINT_QUERY)
+y la última actualización de los cuestionarios. La marca se toma antes de leer
+los datos, así un cambio que llega durante la lectura se vuelve a leer la
+próxima vez en lugar de perderse.
+
+Un entrenamiento incremental compara esa marca con la actual y lee (agregando en
+Postgres) solo los estudiante-curso cuyos datos pueden haber cambiado: todos los
+de los cursos nuevos o con huella distinta y los de los estudiantes que
+actualizaron el cuestionario. La huella es por curso, así que un curso con una
+sola nota nueva se relee completo (igual que en TrainingSnapshot); los cursos
+eliminados no se releen, sus árboles salen del bosque al envejecer.
+
+Con esos pares se ajustan árboles nuevos que se suman al bosque de la versión
+activa (warm_start). La metadata lleva las generaciones de árboles
+(tree_generations, de la más antigua a la más nueva, en el mismo orden que
+estimators_); cuando el bosque supera el máximo se descartan los árboles más
+antiguos. Cada ronda ajusta sus árboles con su propia semilla (round_seed, a
+partir de la marca y la ronda): con la semilla fija del modelo, warm_start
+repetiría los mismos bootstraps en cada ronda una vez que el bosque vuelve al
+máximo. La semilla queda en la generación. Cada versión cuenta los incrementales seguidos desde el último
+entrenamiento completo (incremental_round) y el tiempo de ese entrenamiento
+completo, para informar el tiempo ahorrado.
+"""
+
+import json
+import warnings
+import zlib
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+
+from services.training_snapshot import FINGERPRINT_COLUMNS
+
+
+class IncrementalNotPossible(Exception):
+    """La versión activa no se puede extender: corresponde un entrenamiento completo"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def capture_watermark(data_service) -> dict:
+    """
+    Marca de los datos actuales (serializable en JSON, se guarda con la versión)
+
+    Raises:
+        Los errores de las consultas
+    """
+    fingerprints = data_service.get_course_fingerprints()[FINGERPRINT_COLUMNS]
+    return {
+        "captured_at": _now(),
+        "profiles_updated_max": data_service.get_profiles_updated_max(),
+        "course_fingerprints": {
+            str(course_id): [int(value) for value in values]
+            for course_id, values in zip(fingerprints.index, fingerprints.to_numpy())
+        },
+    }
+
+
+def changed_courses(previous: dict, current: dict) -> List[int]:
+    """Cursos nuevos o cuya huella cambió entre dos marcas"""
+    known = previous.get("course_fingerprints", {})
+    return sorted(
+        int(course_id) for course_id, values in current["course_fingerprints"].items()
+        if known.get(course_id) != values
+    )
+
+
+def check_base(metadata: Optional[dict], max_rounds: int):
+    """
+    Verifica que la versión activa se pueda extender con árboles nuevos
+
+    Raises:
+        IncrementalNotPossible con el motivo del entrenamiento completo
+    """
+    if metadata is None:
+        raise IncrementalNotPossible("No hay un modelo en servicio")
+    if metadata.get("model_class") != "RandomForestClassifier":
+        raise IncrementalNotPossible(f"El modelo en servicio es {metadata.get('model_class')}, no un RandomForest")
+    if not metadata.get("training_watermark"):
+        raise IncrementalNotPossible("La versión en servicio no tiene marca de datos (entrenada antes del modo incremental)")
+    rounds = metadata.get("incremental_round", 0)
+    if rounds >= max_rounds:
+        raise IncrementalNotPossible(f"Ya hubo {rounds} entrenamientos incrementales seguidos; toca uno completo")
+
+
+def round_seed(watermark: dict, round_number: int) -> int:
+    """Semilla de los árboles nuevos de una ronda: cambia con la marca de los datos y con la ronda"""
+    payload = json.dumps(watermark, sort_keys=True, default=str) + f"#{round_number}"
+    return zlib.crc32(payload.encode())
+
+
+def new_generation(mode: str, trees: int, random_state: Optional[int] = None) -> dict:
+    """Generación de árboles de un entrenamiento ("full" o "incremental")"""
+    return {"trained_at": _now(), "mode": mode, "trees": int(trees), "random_state": random_state}
+
+
+def base_generations(metadata: dict, n_trees: int) -> List[dict]:
+    """Generaciones de la versión (una sola si es anterior al modo incremental)"""
+    generations = metadata.get("tree_generations")
+    if generations and sum(g["trees"] for g in generations) == n_trees:
+        return [dict(g) for g in generations]
+    return [{"trained_at": metadata.get("created_at"), "mode": "full", "trees": int(n_trees)}]
+
+
+def grow_forest(model, X, y, n_new_trees: int, max_trees: int, generations: List[dict], random_state: int):
+    """
+    Ajusta n_new_trees árboles con (X, y) y semilla random_state, los agrega al final
+    de model.estimators_ y descarta los más antiguos si el bosque supera max_trees.
+    Modifica model (conserva su random_state).
+
+    Returns:
+        (árboles descartados, generaciones resultantes)
+
+    Raises:
+        IncrementalNotPossible si y no tiene las mismas clases que el modelo
+    """
+    classes = np.unique(y)
+    if not np.array_equal(classes, model.classes_):
+        # Con otras clases los árboles nuevos no se podrían promediar con los anteriores
+        raise IncrementalNotPossible(f"Los datos nuevos tienen las clases {classes.tolist()} y el modelo {model.classes_.tolist()}")
+
+    base_random_state = model.random_state
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_new_trees, random_state=random_state)
+    with warnings.catch_warnings():
+        # class_weight="balanced" se calcula sobre los datos nuevos: es lo buscado para
+        # los árboles nuevos (los anteriores conservan sus pesos)
+        warnings.filterwarnings("ignore", message="class_weight presets")
+        model.fit(X, y)
+    model.set_params(warm_start=False, random_state=base_random_state)
+    generations = generations + [new_generation("incremental", n_new_trees, random_state)]
+
+    # Envejecimiento: fuera los árboles más antiguos (nunca los recién ajustados)
+    removed = max(0, len(model.estimators_) - max(max_trees, n_new_trees))
+    if removed:
+        model.estimators_ = model.estimators_[removed:]
+        model.set_params(n_estimators=len(model.estimators_))
+        pending = removed
+        while pending:
+            oldest = generations[0]
+            if oldest["trees"] <= pending:
+                pending -= oldest["trees"]
+                generations = generations[1:]
+            else:
+                generations = [{**oldest, "trees": oldest["trees"] - pending}] + generations[1:]
+                pending = 0
+    return removed, generations
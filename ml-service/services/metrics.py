@@ -0,0 +1,234 @@
+"""
+Métricas del servicio en formato de texto de Prometheus (GET /metrics)
+
+Cada endpoint de predicción mide su duración total y la de cada etapa: consultas
+SQL, cálculo de features en pandas, evaluación del modelo y serialización. Las
+etapas se registran en histogramas por (endpoint, etapa), junto con las filas
+leídas de la base de datos y el tamaño de los lotes evaluados.
+
+El endpoint en curso se guarda en una variable de contexto: las etapas que se
+ejecutan en el pool de hilos de datos (AsyncDataService copia el contexto) se
+atribuyen a la petición que las originó. Fuera de una petición instrumentada
+(entrenamiento, evaluación programada) stage() no registra nada.
+
+Registrar una observación cuesta dos lecturas de perf_counter, un bisect y un
+lock sin contención (~1-2 µs), despreciable frente a una consulta o una
+evaluación del modelo. Con METRICS_ENABLED=false todo queda en no-ops.
+"""
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from core.config import settings
+
+
+# Límites de los buckets (segundos y filas)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 10, 50, 100, 500, 1_000, 5_000, 10_000, 50_000, 100_000, 1_000_000)
+
+# Endpoint de la petición en curso (None fuera de una petición instrumentada)
+_current_endpoint = contextvars.ContextVar("metrics_endpoint", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Histograma con etiquetas (buckets acumulados al exponer, como Prometheus)"""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], buckets: Iterable[float]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.bounds = tuple(buckets)
+        # etiquetas -> [conteos por bucket (no acumulados, +Inf al final), suma, total]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.bounds) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._series.items()]
+        for label_values, counts, total, count in sorted(snapshot):
+            cumulative = 0
+            for bound, bucket_count in zip(self.bounds + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labels, label_values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render_samples(name: str, metric_type: str, help_text: str, samples: List[Tuple[dict, float]]) -> List[str]:
+    """Contador o gauge cuyo valor se lee al exponer (p. ej. de PredictionCache.stats())"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "pai_ml_request_duration_seconds", "Duración de las peticiones de predicción",
+    ("endpoint", "status"), LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "pai_ml_stage_duration_seconds", "Duración de cada etapa de una petición (sql, features, model, serialize, ...)",
+    ("endpoint", "stage"), LATENCY_BUCKETS
+)
+ROWS_FETCHED = Histogram(
+    "pai_ml_rows_fetched", "Filas leídas de la base de datos por consulta",
+    ("endpoint",), SIZE_BUCKETS
+)
+BATCH_SIZE = Histogram(
+    "pai_ml_batch_size", "Filas evaluadas por llamada al modelo",
+    ("endpoint",), SIZE_BUCKETS
+)
+MICROBATCH_SIZE = Histogram(
+    "pai_ml_microbatch_size", "Peticiones resueltas por cada lote del agrupador (una consulta y una llamada al modelo)",
+    ("batcher",), SIZE_BUCKETS
+)
+MICROBATCH_WAIT_SECONDS = Histogram(
+    "pai_ml_microbatch_wait_seconds", "Espera agregada a cada petición hasta que se cierra su lote",
+    ("batcher",), LATENCY_BUCKETS
+)
+HISTOGRAMS = [REQUEST_SECONDS, STAGE_SECONDS, ROWS_FETCHED, BATCH_SIZE, MICROBATCH_SIZE, MICROBATCH_WAIT_SECONDS]
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+class _StageTimer:
+    __slots__ = ("endpoint", "stage", "start")
+
+    def __init__(self, endpoint: str, stage: str):
+        self.endpoint = endpoint
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        STAGE_SECONDS.observe(time.perf_counter() - self.start, self.endpoint, self.stage)
+        return False
+
+
+def stage(name: str, endpoint: Optional[str] = None):
+    """
+    Mide un bloque como etapa de la petición en curso (o de endpoint, para código
+    que corre después de que el handler retornó, como una respuesta en streaming)
+    """
+    endpoint = endpoint or _current_endpoint.get()
+    if endpoint is None or not settings.METRICS_ENABLED:
+        return _NOOP
+    return _StageTimer(endpoint, name)
+
+
+def observe_rows(n_rows: int):
+    """Filas leídas por una consulta de la petición en curso"""
+    endpoint = _current_endpoint.get()
+    if endpoint is not None and settings.METRICS_ENABLED:
+        ROWS_FETCHED.observe(n_rows, endpoint)
+
+
+def observe_batch(n_rows: int, endpoint: Optional[str] = None):
+    """Filas evaluadas en una llamada al modelo"""
+    endpoint = endpoint or _current_endpoint.get()
+    if endpoint is not None and settings.METRICS_ENABLED:
+        BATCH_SIZE.observe(n_rows, endpoint)
+
+
+def observe_microbatch(batcher: str, size: int, waits: Iterable[float]):
+    """Tamaño de un lote del agrupador (services/micro_batcher.py) y la espera de cada petición"""
+    if not settings.METRICS_ENABLED:
+        return
+    MICROBATCH_SIZE.observe(size, batcher)
+    for wait in waits:
+        MICROBATCH_WAIT_SECONDS.observe(wait, batcher)
+
+
+def current_endpoint() -> Optional[str]:
+    return _current_endpoint.get()
+
+
+@contextmanager
+def track_request(endpoint: str):
+    """Marca el contexto como parte de una petición a endpoint y mide su duración"""
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    token = _current_endpoint.set(endpoint)
+    start = time.perf_counter()
+    status = "200"
+    try:
+        yield
+    except HTTPException as e:
+        status = str(e.status_code)
+        raise
+    except Exception:
+        status = "500"
+        raise
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint, status)
+        _current_endpoint.reset(token)
+
+
+def instrument(endpoint: str):
+    """Decorador de endpoints async: toda la petición corre dentro de track_request(endpoint)"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with track_request(endpoint):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render(extra: Iterable[str] = ()) -> str:
+    """Todas las métricas en formato de texto de Prometheus"""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
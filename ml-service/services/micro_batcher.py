@@ -0,0 +1,110 @@
+"""
+Agrupador de predicciones individuales concurrentes (micro-batching)
+
+Cuando muchas peticiones de un solo estudiante-curso llegan a la vez (por ejemplo
+al inicio de una clase, con varios profesores abriendo fichas de estudiantes),
+cada una hacía su propia consulta y su propia llamada al modelo con una fila.
+MicroBatcher junta las claves que llegan dentro de una ventana corta (o hasta
+max_batch_size claves) y las resuelve con una sola llamada a process_batch: una
+consulta y una evaluación vectorizada para todo el lote. Cada petición recibe
+su resultado por un future; claves repetidas dentro del lote comparten el suyo.
+
+La primera clave de un lote espera como máximo window_seconds; el lote se cierra
+antes si se llena. Las métricas (services/metrics.py) registran el tamaño de cada
+lote (ganancia: peticiones por consulta y por llamada al modelo) y la espera
+agregada a cada petición.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Hashable
+
+from services import metrics
+
+
+class MicroBatcher:
+    """Junta claves concurrentes y las resuelve en lotes con process_batch"""
+
+    def __init__(
+        self,
+        process_batch: Callable[[list], Awaitable[Dict[Hashable, object]]],
+        window_seconds: float = 0.005,
+        max_batch_size: int = 64,
+        name: str = "predict"
+    ):
+        """
+        Args:
+            process_batch: Corrutina que recibe la lista de claves y retorna {clave: resultado};
+                           las claves ausentes del dict resuelven con None
+            window_seconds: Espera máxima desde la primera clave del lote
+            max_batch_size: Claves por lote (un lote lleno se procesa de inmediato)
+            name: Etiqueta del lote en las métricas
+        """
+        self.process_batch = process_batch
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self.name = name
+
+        # Lote abierto: clave -> (future, instante en que llegó)
+        self._pending: Dict[Hashable, tuple] = {}
+        self._timer = None
+        # Lotes en proceso (referencias para que no se recolecten)
+        self._running = set()
+
+        self.requests = 0
+        self.batches = 0
+
+    async def submit(self, key: Hashable):
+        """Resultado de key, calculado junto con las demás claves del lote"""
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = (loop.create_future(), time.perf_counter())
+            self._pending[key] = entry
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window_seconds, self._flush)
+        # shield: si la petición se cancela, el lote sigue para las demás
+        return await asyncio.shield(entry[0])
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        self.batches += 1
+        now = time.perf_counter()
+        metrics.observe_microbatch(self.name, len(batch), (now - arrived for _, arrived in batch.values()))
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: dict):
+        try:
+            results = await self.process_batch(list(batch))
+        except Exception as e:
+            for future, _ in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except BaseException:
+            for future, _ in batch.values():
+                future.cancel()
+            raise
+        for key, (future, _) in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
+
+    def stats(self) -> dict:
+        """Peticiones recibidas, lotes procesados y peticiones por lote"""
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "requests_per_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "window_seconds": self.window_seconds,
+            "max_batch_size": self.max_batch_size,
+        }
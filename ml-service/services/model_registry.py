@@ -0,0 +1,214 @@
+"""
+Registro versionado de modelos en disco
+
+Cada versión vive en su propio directorio (versions/<version>/) con el modelo
+serializado, las tablas del bosque compilado (forest/*.npy, que se abren con
+mmap) y un metadata.json (hashes del contenido, métricas, features, fecha).
+La versión en producción se indica en CURRENT.json, que se reemplaza de forma
+atómica (os.replace); así la promoción y el rollback son instantáneos y los
+procesos que sirven predicciones detectan el cambio con un simple os.stat.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from services.compiled_forest import CompiledForest
+
+
+class ModelRegistry:
+    """Registro de versiones del modelo en un directorio local"""
+
+    MODEL_FILE = "model.pkl"
+    COMPILED_DIR = "forest"
+    METADATA_FILE = "metadata.json"
+    POINTER_FILE = "CURRENT.json"
+
+    def __init__(self, registry_dir):
+        self.registry_dir = Path(registry_dir)
+        self.versions_dir = self.registry_dir / "versions"
+        self.pointer_path = self.registry_dir / self.POINTER_FILE
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+
+    # ----------------- Versiones -----------------
+
+    def register(self, model, metrics: dict, feature_names: list, extra: dict = None) -> dict:
+        """
+        Guarda un modelo como nueva versión (sin promoverla)
+
+        Returns:
+            Metadata de la versión registrada
+        """
+        payload = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        sha256 = hashlib.sha256(payload).hexdigest()
+        created_at = datetime.now(timezone.utc)
+        version = f"{created_at:%Y%m%d%H%M%S}-{sha256[:8]}"
+
+        metadata = {
+            "version": version,
+            "sha256": sha256,
+            "created_at": created_at.isoformat(),
+            "metrics": metrics or {},
+            "feature_names": list(feature_names),
+            "model_class": type(model).__name__,
+            "size_bytes": len(payload),
+        }
+        if extra:
+            metadata.update(extra)
+
+        # Se escribe en un directorio temporal y se renombra: una versión nunca queda a medias
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.versions_dir))
+        try:
+            (tmp_dir / self.MODEL_FILE).write_bytes(payload)
+            # Tablas de nodos del bosque (.npy que los procesos abren con mmap)
+            if hasattr(model, "estimators_"):
+                metadata["compiled"] = CompiledForest.from_sklearn(model).save(tmp_dir / self.COMPILED_DIR)
+            self._write_json(tmp_dir / self.METADATA_FILE, metadata)
+            os.replace(tmp_dir, self.versions_dir / version)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        return metadata
+
+    def version_dir(self, version: str) -> Path:
+        """Directorio de una versión"""
+        return self.versions_dir / version
+
+    def get_metadata(self, version: str) -> Optional[dict]:
+        """Metadata de una versión, o None si no existe"""
+        path = self.versions_dir / version / self.METADATA_FILE
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def list_versions(self) -> List[dict]:
+        """Metadata de todas las versiones, de la más antigua a la más reciente"""
+        versions = []
+        for path in self.versions_dir.iterdir():
+            if path.is_dir() and not path.name.startswith("."):
+                metadata = self.get_metadata(path.name)
+                if metadata:
+                    versions.append(metadata)
+        return sorted(versions, key=lambda m: m["created_at"])
+
+    def load(self, version: str):
+        """
+        Carga el modelo de una versión verificando su hash
+
+        Raises:
+            ValueError si la versión no existe o el contenido no coincide con el hash
+        """
+        metadata = self.get_metadata(version)
+        if metadata is None:
+            raise ValueError(f"La versión {version} no existe")
+
+        payload = (self.versions_dir / version / self.MODEL_FILE).read_bytes()
+        if hashlib.sha256(payload).hexdigest() != metadata["sha256"]:
+            raise ValueError(f"El hash de la versión {version} no coincide (archivo corrupto)")
+
+        return pickle.loads(payload)
+
+    def load_compiled(self, version: str, mmap: bool = True) -> Optional[CompiledForest]:
+        """
+        Abre el bosque compilado de una versión (None si la versión no lo tiene).
+        Con mmap no se leen los datos: tarda milisegundos sin importar el tamaño.
+        Los hashes se verifican al promover la versión (verify).
+        """
+        metadata = self.get_metadata(version) or {}
+        manifest = metadata.get("compiled")
+        if manifest is None:
+            return None
+        return CompiledForest.load(self.versions_dir / version / self.COMPILED_DIR, manifest, mmap=mmap)
+
+    def verify(self, version: str):
+        """
+        Verifica el hash del modelo y de las tablas del bosque compilado
+
+        Raises:
+            ValueError si la versión no existe o algún archivo está corrupto
+        """
+        metadata = self.get_metadata(version)
+        if metadata is None:
+            raise ValueError(f"La versión {version} no existe")
+
+        payload = (self.versions_dir / version / self.MODEL_FILE).read_bytes()
+        if hashlib.sha256(payload).hexdigest() != metadata["sha256"]:
+            raise ValueError(f"El hash de la versión {version} no coincide (archivo corrupto)")
+
+        if "compiled" in metadata:
+            CompiledForest.verify(self.versions_dir / version / self.COMPILED_DIR, metadata["compiled"])
+
+    # ----------------- Promoción y rollback -----------------
+
+    def read_pointer(self) -> dict:
+        """Contenido de CURRENT.json ({} si no hay versión promovida)"""
+        try:
+            return json.loads(self.pointer_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def current_version(self) -> Optional[str]:
+        """Versión actualmente promovida"""
+        return self.read_pointer().get("version")
+
+    def pointer_stamp(self):
+        """
+        Marca barata para detectar cambios de versión sin leer el archivo
+        (os.replace siempre crea un inode nuevo)
+        """
+        try:
+            stat = os.stat(self.pointer_path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def promote(self, version: str) -> dict:
+        """Promueve una versión a producción (verificando sus archivos); la anterior queda en el historial"""
+        self.verify(version)
+
+        pointer = self.read_pointer()
+        history = pointer.get("history", [])
+        current = pointer.get("version")
+        if current and current != version:
+            history = history + [current]
+
+        return self._write_pointer(version, history)
+
+    def rollback(self) -> dict:
+        """Vuelve a la versión promovida anteriormente"""
+        pointer = self.read_pointer()
+        history = list(pointer.get("history", []))
+        if not history:
+            raise ValueError("No hay una versión anterior a la cual volver")
+
+        previous = history.pop()
+        return self._write_pointer(previous, history)
+
+    def _write_pointer(self, version: str, history: list) -> dict:
+        pointer = {
+            "version": version,
+            "history": history,
+            "promoted_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self._write_json(self.pointer_path, pointer)
+        return pointer
+
+    @staticmethod
+    def _write_json(path: Path, data: dict):
+        """Escritura atómica: archivo temporal en el mismo directorio + os.replace"""
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=path.parent)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
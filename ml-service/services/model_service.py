@@ -5,24 +5,33 @@ Servicio del modelo de Machine Learning
 import pickle
 import os
 import sys
+import threading
+import time
 from pathlib import Path
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, classification_report
+from sklearn.metrics import classification_report
 
 # Agregar el directorio raíz al path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from core.config import settings
 from services.feature_engineering import FeatureEngineering
+from services.model_registry import ModelRegistry
+from services import model_tuning
+from services.compiled_forest import CompiledForest
+from services.drift_monitor import DriftMonitor, build_reference
+from services import incremental_training
 
 
 class ModelService:
     """Servicio para manejar el modelo de ML"""
     
-    def __init__(self):
-        self.model = None
+    def __init__(self, load_current: bool = True):
+        """
+        Args:
+            load_current: Cargar la versión en producción (False en procesos que solo entrenan)
+        """
         self.feature_engineering = FeatureEngineering()
         self.model_path = Path(settings.MODEL_PATH)
         self.model_dir = Path(settings.MODEL_DIR)
@@ -30,19 +39,65 @@ class ModelService:
         # Crear directorio de modelos si no existe
         self.model_dir.mkdir(parents=True, exist_ok=True)
         
-        # Intentar cargar modelo existente
-        self.load_model()
+        self.registry = ModelRegistry(settings.MODEL_REGISTRY_DIR)
+        
+        # Versión en servicio: {"version", "model", "metadata"}. Se reemplaza con una
+        # sola asignación, así cada predicción usa una versión consistente.
+        self._active = None
+        # Modelos ya cargados por versión (permite rollback instantáneo)
+        self._loaded = {}
+        # Evaluadores compilados por versión (predicciones de pocas filas)
+        self._compiled = {}
+        # Último modelo entrenado en este proceso, pendiente de guardar
+        self._trained = None
+        # Resultado de la última búsqueda de hiperparámetros (train_model con tune=True)
+        self.last_tuning_report = None
+        # Árboles agregados y descartados por el último train_incremental
+        self.last_incremental_report = None
+        # Muestreo y curva precisión/tiempo del último train_model con sampling
+        self.last_sampling_report = None
+        # Distribución en vivo de las features de entrada vs. la del entrenamiento
+        self.drift = DriftMonitor(settings.DRIFT_WINDOW_SECONDS, enabled=settings.DRIFT_MONITOR_ENABLED)
+        
+        self._pointer_stamp = None
+        self._last_check = 0.0
+        self._swap_lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._loading_version = None
+        
+        # Importar el modelo previo al registro (si existe) e intentar cargarlo
+        self._import_legacy_model()
+        if load_current:
+            self.load_model()
+    
+    @property
+    def model(self):
+        """Modelo sklearn actualmente en servicio (o None); lo carga si aún no se leyó el pickle"""
+        active = self._active
+        return self._sklearn_model(active) if active else None
+    
+    @property
+    def model_version(self):
+        """Versión actualmente en servicio (o None)"""
+        active = self._active
+        return active["version"] if active else None
     
     def is_model_loaded(self) -> bool:
         """Verifica si el modelo está cargado"""
-        return self.model is not None
+        return self._active is not None
     
-    def train_model(self, features_df):
+    def train_model(self, features_df, progress=None, tune: bool = False, sampling: dict = None):
         """
         Entrena el modelo con los datos de features
         
         Args:
             features_df: DataFrame con las features calculadas
+            progress: Función opcional que recibe la etapa actual ("fitting", "evaluating")
+            tune: Elegir los hiperparámetros con validación cruzada en paralelo
+                  (TUNING_PARAM_GRID) sobre la partición de entrenamiento antes del ajuste final
+            sampling: Informe del muestreo si features_df es una muestra de la historia
+                      (StratifiedReservoir.report); se completa con la curva precisión/tiempo
+                      (TRAINING_TRADEOFF_FRACTIONS) y se guarda con la versión
         
         Returns:
             dict con métricas del modelo
@@ -85,25 +140,63 @@ class ModelService:
             X, y, test_size=0.2, random_state=42, stratify=y if len(np.unique(y)) > 1 else None
         )
         
-        # Crear y entrenar el modelo
-        self.model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
-            random_state=42,
-            class_weight='balanced'  # Balancear clases si hay desbalance
-        )
+        if progress:
+            progress("fitting")
+        
+        params = {}
+        self.last_tuning_report = None
+        if tune:
+            print("Buscando hiperparámetros con validación cruzada...")
+            report = model_tuning.search(
+                X_train, y_train,
+                param_grid=settings.TUNING_PARAM_GRID,
+                n_iter=settings.TUNING_N_ITER,
+                cv=settings.TUNING_CV_FOLDS,
+                scoring=settings.TUNING_SCORING,
+                n_workers=settings.TUNING_N_WORKERS or None
+            )
+            params = report["best_params"]
+            self.last_tuning_report = report
+            print(
+                f"Mejor candidato ({report['n_candidates']} candidatos x {report['cv_folds']} folds, "
+                f"{report['n_workers']} procesos, {report['wall_time']:.1f}s): {params} "
+                f"{report['scoring']}={report['best_score']:.3f}"
+            )
         
-        self.model.fit(X_train, y_train)
+        # Crear y entrenar el modelo (no reemplaza al que está en servicio hasta save_model)
+        model = model_tuning.build_model(params)
+        fit_start = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - fit_start
         
         # Evaluar el modelo
-        y_pred = self.model.predict(X_test)
+        if progress:
+            progress("evaluating")
+        y_pred = model.predict(X_test)
         
-        metrics = {
-            'accuracy': accuracy_score(y_test, y_pred),
-            'precision': precision_score(y_test, y_pred, average='weighted', zero_division=0),
-            'recall': recall_score(y_test, y_pred, average='weighted', zero_division=0),
-            'f1_score': f1_score(y_test, y_pred, average='weighted', zero_division=0)
-        }
+        metrics = model_tuning.evaluate_predictions(y_test, y_pred)
+        
+        self.last_sampling_report = None
+        if sampling is not None:
+            # Curva precisión/tiempo: el mismo ajuste con fracciones de la muestra, más el
+            # punto de la muestra completa (fracciones relativas a toda la historia)
+            tradeoff = model_tuning.tradeoff_curve(
+                X_train, y_train, X_test, y_test, params,
+                fractions=settings.TRAINING_TRADEOFF_FRACTIONS, scale=sampling["fraction"]
+            )
+            tradeoff.append({
+                "fraction": sampling["fraction"],
+                "samples": int(len(X_train)),
+                "fit_seconds": round(fit_seconds, 3),
+                **metrics
+            })
+            self.last_sampling_report = {**sampling, "tradeoff": tradeoff}
+            print("\n=== Muestreo: precisión vs. tiempo de ajuste ===")
+            for point in tradeoff:
+                print(
+                    f"{point['fraction']:>9.4%} de la historia ({point['samples']} muestras): "
+                    f"{point['fit_seconds']:.2f}s, accuracy {point['accuracy']:.3f}"
+                )
         
         print("\n=== Métricas del Modelo ===")
         print(f"Accuracy: {metrics['accuracy']:.3f}")
@@ -113,6 +206,93 @@ class ModelService:
         print("\n=== Reporte de Clasificación ===")
         print(classification_report(y_test, y_pred, target_names=['Riesgo Bajo', 'Riesgo Alto']))
         
+        self._trained = {
+            "model": model,
+            "metrics": metrics,
+            "feature_names": list(feature_names),
+            "samples": int(len(features_df)),
+            "params": {**model_tuning.BASE_PARAMS, **params},
+            "tuning": self.last_tuning_report,
+            "reference_histograms": build_reference(X_train, feature_names, settings.DRIFT_HISTOGRAM_BINS),
+            "tree_generations": [incremental_training.new_generation("full", len(model.estimators_), model.random_state)],
+            "sampling": self.last_sampling_report
+        }
+        
+        return metrics
+    
+    def train_incremental(self, features_df, base_version: str, random_state: int, progress=None) -> dict:
+        """
+        Agrega al bosque de base_version árboles ajustados con features_df (los
+        estudiante-curso que cambiaron) y semilla random_state, y descarta los más
+        antiguos sobre INCREMENTAL_MAX_TREES (ver services/incremental_training.py)
+        
+        Las métricas se calculan con el bosque completo sobre un 20% de features_df
+        que no se usa para ajustar los árboles nuevos.
+        
+        Returns:
+            dict con métricas del modelo
+        
+        Raises:
+            IncrementalNotPossible si los datos no sirven para extender el bosque
+        """
+        feature_names = self.feature_engineering.get_feature_names()
+        metadata = self.registry.get_metadata(base_version)
+        if list(metadata["feature_names"]) != list(feature_names):
+            raise incremental_training.IncrementalNotPossible("Las features del modelo en servicio cambiaron")
+        model = self.registry.load(base_version)
+        
+        X = features_df[feature_names].values
+        y = self.feature_engineering.calculate_target_variable(features_df).values
+        if len(np.unique(y)) < 2:
+            raise incremental_training.IncrementalNotPossible("Los datos nuevos tienen una sola clase")
+        _, class_counts = np.unique(y, return_counts=True)
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y if class_counts.min() >= 2 else None
+        )
+        
+        if progress:
+            progress("fitting")
+        n_trees = len(model.estimators_)
+        removed, generations = incremental_training.grow_forest(
+            model, X_train, y_train,
+            n_new_trees=settings.INCREMENTAL_NEW_TREES,
+            max_trees=settings.INCREMENTAL_MAX_TREES,
+            generations=incremental_training.base_generations(metadata, n_trees),
+            random_state=random_state
+        )
+        
+        if progress:
+            progress("evaluating")
+        y_pred = model.predict(X_test)
+        metrics = model_tuning.evaluate_predictions(y_test, y_pred)
+        print(
+            f"Bosque de {base_version}: {n_trees} árboles + {settings.INCREMENTAL_NEW_TREES} nuevos "
+            f"- {removed} descartados = {len(model.estimators_)} "
+            f"(accuracy {metrics['accuracy']:.3f} en {len(y_test)} pares cambiados)"
+        )
+        
+        self._trained = {
+            "model": model,
+            "metrics": metrics,
+            "feature_names": list(feature_names),
+            "samples": int(len(features_df)),
+            "params": {**metadata.get("params", model_tuning.BASE_PARAMS), "n_estimators": len(model.estimators_)},
+            "tuning": None,
+            # La referencia del drift sigue siendo la del entrenamiento completo: la mayoría
+            # de los árboles (y el próximo entrenamiento completo) la representan mejor
+            # que los pares cambiados
+            "reference_histograms": metadata.get("reference_histograms"),
+            "tree_generations": generations
+        }
+        self.last_tuning_report = None
+        self.last_incremental_report = {
+            "trees_added": settings.INCREMENTAL_NEW_TREES,
+            "trees_removed": removed,
+            "random_state": random_state,
+            "n_estimators": len(model.estimators_),
+            "tree_generations": generations
+        }
+        
         return metrics
     
     def predict(self, X):
@@ -125,10 +305,7 @@ class ModelService:
         Returns:
             Array de predicciones (0 = riesgo bajo, 1 = riesgo alto)
         """
-        if self.model is None:
-            raise ValueError("El modelo no está entrenado. Llama a train_model() primero.")
-        
-        return self.model.predict(X)
+        return self._require_model().predict(X)
     
     def predict_proba(self, X):
         """
@@ -140,38 +317,262 @@ class ModelService:
         Returns:
             Array de probabilidades [prob_riesgo_bajo, prob_riesgo_alto]
         """
-        if self.model is None:
-            raise ValueError("El modelo no está entrenado. Llama a train_model() primero.")
+        return self._require_model().predict_proba(X)
+    
+    def predict_with_proba(self, X):
+        """
+        Retorna predicciones y probabilidades calculadas con la misma versión del modelo
+        (aunque se promueva otra versión entre ambas llamadas)
         
-        return self.model.predict_proba(X)
+        Lotes de hasta COMPILED_FOREST_MAX_ROWS filas se evalúan con el bosque
+        compilado (una sola pasada, mismos resultados que sklearn).
+        
+        Returns:
+            (predicciones, probabilidades)
+        """
+        predictions, probabilities, _ = self.predict_with_version(X)
+        return predictions, probabilities
+    
+    def predict_with_version(self, X):
+        """
+        Igual que predict_with_proba, y además la versión del modelo que evaluó X
+        (para guardar resultados junto con la versión que los produjo)
+    
+        Returns:
+            (predicciones, probabilidades, versión)
+        """
+        self.check_for_updates()
+        active = self._active
+        if active is None:
+            raise ValueError("El modelo no está entrenado. Llama a train_model() primero.")
     
-    def save_model(self):
-        """Guarda el modelo en disco"""
-        if self.model is None:
+        self.drift.observe(X)
+        compiled = active["compiled"]
+        if compiled is not None and len(X) <= settings.COMPILED_FOREST_MAX_ROWS:
+            return (*compiled.predict_with_proba(X), active["version"])
+    
+        model = self._sklearn_model(active)
+        return model.predict(X), model.predict_proba(X), active["version"]
+    
+    def predict_with_contributions(self, X):
+        """
+        Predicciones, probabilidades y contribución de cada feature a la probabilidad
+        de riesgo alto (descomposición por caminos del bosque, ver
+        CompiledForest.predict_with_contributions), en una sola pasada para todo el lote.
+        Los cambios de valor por nodo quedan calculados en el bosque compilado de la versión.
+    
+        Returns:
+            (predicciones, probabilidades, contribuciones (n_filas, n_features), valor base)
+        """
+        self.check_for_updates()
+        active = self._active
+        if active is None:
+            raise ValueError("El modelo no está entrenado. Llama a train_model() primero.")
+    
+        compiled = active["compiled"]
+        if compiled is None:
+            raise ValueError(f"La versión {active['version']} no es un bosque: no hay contribuciones por feature")
+        self.drift.observe(X)
+        return compiled.predict_with_contributions(X)
+    
+    def _require_model(self):
+        self.check_for_updates()
+        active = self._active
+        if active is None:
+            raise ValueError("El modelo no está entrenado. Llama a train_model() primero.")
+        return self._sklearn_model(active)
+    
+    def _sklearn_model(self, active: dict):
+        """
+        Modelo sklearn de la versión activa. Con MODEL_LAZY_LOAD el pickle no se lee al
+        activar la versión (basta el bosque compilado mapeado en memoria) sino la primera
+        vez que se necesita, por ejemplo para un lote grande.
+        """
+        model = active["model"]
+        if model is None:
+            with self._model_lock:
+                model = active["model"]
+                if model is None:
+                    model = self._load_version(active["version"])
+                    self._loaded[active["version"]] = model
+                    active["model"] = model
+        return model
+    
+    # ----------------- Registro de versiones -----------------
+    
+    def save_model(self, extra_metadata: dict = None) -> str:
+        """
+        Registra el último modelo entrenado como nueva versión, la promueve y la pone
+        en servicio en este proceso (los demás procesos la detectan vía check_for_updates)
+        
+        Returns:
+            Versión registrada
+        """
+        if self._trained is None:
             raise ValueError("No hay modelo para guardar")
         
-        with open(self.model_path, 'wb') as f:
-            pickle.dump(self.model, f)
+        trained = self._trained
+        extra = {
+            "samples_trained": trained["samples"],
+            "params": trained["params"],
+            "reference_histograms": trained["reference_histograms"],
+            "tree_generations": trained["tree_generations"]
+        }
+        if trained["tuning"]:
+            extra["tuning"] = trained["tuning"]
+        if trained.get("sampling"):
+            extra["sampling"] = trained["sampling"]
+        if extra_metadata:
+            extra.update(extra_metadata)
+        
+        metadata = self.registry.register(
+            trained["model"], trained["metrics"], trained["feature_names"], extra=extra
+        )
+        self.registry.promote(metadata["version"])
+        self._activate(metadata["version"], trained["model"], metadata)
+        self._pointer_stamp = self.registry.pointer_stamp()
+        self._trained = None
         
-        print(f"Modelo guardado en: {self.model_path}")
+        print(f"Modelo guardado como versión {metadata['version']}")
+        return metadata["version"]
     
     def load_model(self) -> bool:
         """
-        Carga el modelo desde disco
+        Carga (de forma síncrona) la versión promovida en el registro
         
         Returns:
             True si se cargó exitosamente, False en caso contrario
         """
-        if not self.model_path.exists():
-            print(f"Modelo no encontrado en: {self.model_path}")
+        version = self.registry.current_version()
+        if version is None:
+            print(f"No hay versiones del modelo en: {self.registry.registry_dir}")
             return False
         
         try:
-            with open(self.model_path, 'rb') as f:
-                self.model = pickle.load(f)
-            print(f"Modelo cargado desde: {self.model_path}")
+            self._pointer_stamp = self.registry.pointer_stamp()
+            self._activate(version, None, self.registry.get_metadata(version))
+            print(f"Modelo cargado: versión {version}")
             return True
         except Exception as e:
             print(f"Error al cargar el modelo: {e}")
             return False
-
+    
+    def list_versions(self) -> list:
+        """Metadata de todas las versiones registradas"""
+        return self.registry.list_versions()
+    
+    def promote(self, version: str) -> dict:
+        """Promueve una versión del registro y la pone en servicio"""
+        # registry.promote verifica los hashes de los archivos antes de promover
+        pointer = self.registry.promote(version)
+        self._activate(version, None, self.registry.get_metadata(version))
+        self._pointer_stamp = self.registry.pointer_stamp()
+        return pointer
+    
+    def rollback(self) -> dict:
+        """Vuelve a la versión anterior (instantáneo si sigue cargada en memoria)"""
+        pointer = self.registry.rollback()
+        version = pointer["version"]
+        self._activate(version, None, self.registry.get_metadata(version))
+        self._pointer_stamp = self.registry.pointer_stamp()
+        return pointer
+    
+    def check_for_updates(self, force: bool = False):
+        """
+        Chequeo barato de versión: como máximo cada MODEL_VERSION_CHECK_INTERVAL segundos
+        (o de inmediato con force=True) hace un os.stat del puntero. Si otro proceso
+        promovió una versión distinta, la carga en un hilo de fondo y la intercambia al
+        terminar; mientras tanto se sigue sirviendo con la versión actual (sin bloquear
+        predicciones).
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < settings.MODEL_VERSION_CHECK_INTERVAL:
+            return
+        self._last_check = now
+        
+        stamp = self.registry.pointer_stamp()
+        if stamp == self._pointer_stamp:
+            return
+        
+        version = self.registry.current_version()
+        if version is None or version == self.model_version:
+            self._pointer_stamp = stamp
+            return
+        
+        with self._swap_lock:
+            if self._loading_version == version:
+                return
+            self._loading_version = version
+        
+        threading.Thread(
+            target=self._background_load, args=(version, stamp), daemon=True
+        ).start()
+    
+    def _background_load(self, version: str, stamp):
+        try:
+            self._activate(version, None, self.registry.get_metadata(version))
+            self._pointer_stamp = stamp
+            print(f"Modelo actualizado a la versión {version}")
+        except Exception as e:
+            print(f"Error al cargar la versión {version}: {e}")
+        finally:
+            with self._swap_lock:
+                self._loading_version = None
+    
+    def _load_version(self, version: str):
+        model = self._loaded.get(version)
+        if model is None:
+            model = self.registry.load(version)
+        return model
+    
+    def _activate(self, version: str, model, metadata: dict):
+        """
+        Intercambio atómico de la versión en servicio. El bosque compilado se abre
+        con mmap desde el registro; el pickle solo se lee si la versión no tiene
+        bosque compilado o MODEL_LAZY_LOAD está desactivado (model puede ser None).
+        """
+        if model is None:
+            model = self._loaded.get(version)
+        
+        compiled = self._compiled.get(version)
+        if compiled is None:
+            try:
+                compiled = self.registry.load_compiled(version)
+            except Exception as e:
+                print(f"No se pudo abrir el bosque compilado de la versión {version}: {e}")
+        
+        if model is None and (compiled is None or not settings.MODEL_LAZY_LOAD):
+            model = self.registry.load(version)
+        
+        # Versiones registradas sin bosque compilado: se compila en memoria
+        if compiled is None and hasattr(model, "estimators_"):
+            compiled = CompiledForest.from_sklearn(model)
+        
+        if model is not None:
+            self._loaded[version] = model
+        self._compiled[version] = compiled
+        # Conservar en memoria solo la versión activa y la anterior
+        previous = self.model_version
+        for loaded_version in set(self._loaded) | set(self._compiled):
+            if loaded_version not in (version, previous):
+                self._loaded.pop(loaded_version, None)
+                self._compiled.pop(loaded_version, None)
+        self._active = {"version": version, "model": model, "compiled": compiled, "metadata": metadata or {}}
+        self.drift.set_reference(version, (metadata or {}).get("reference_histograms"))
+    
+    def _import_legacy_model(self):
+        """Registra el modelo pickle anterior al registro (MODEL_PATH) si el registro está vacío"""
+        if self.registry.current_version() is not None or not self.model_path.exists():
+            return
+        
+        try:
+            with open(self.model_path, 'rb') as f:
+                model = pickle.load(f)
+            metadata = self.registry.register(
+                model, {}, self.feature_engineering.get_feature_names(),
+                extra={"imported_from": str(self.model_path)}
+            )
+            self.registry.promote(metadata["version"])
+            print(f"Modelo {self.model_path} importado al registro como versión {metadata['version']}")
+        except Exception as e:
+            print(f"Error al importar el modelo {self.model_path}: {e}")
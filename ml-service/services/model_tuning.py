@@ -0,0 +1,224 @@
+"""
+Búsqueda de hiperparámetros con validación cruzada en paralelo
+
+Cada par (candidato, fold) se evalúa en un pool de procesos. La matriz de
+features y el target se copian una sola vez a memoria compartida
+(multiprocessing.shared_memory); cada proceso del pool la mapea al iniciar y
+trabaja sobre vistas NumPy de ese bloque, sin recibir copias de los datos en
+cada tarea. Con tantos núcleos como tareas, el tiempo total se acerca al de un
+solo ajuste.
+"""
+
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+from typing import List, Optional
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+from sklearn.model_selection import ParameterGrid, ParameterSampler, StratifiedKFold, train_test_split
+
+
+# Parámetros del modelo usado hasta ahora; los candidatos los sobrescriben
+BASE_PARAMS = {
+    "n_estimators": 100,
+    "max_depth": 10,
+    "random_state": 42,
+    "class_weight": "balanced",
+}
+
+METRIC_NAMES = ["accuracy", "precision", "recall", "f1_score"]
+
+# Arrays compartidos del proceso del pool (se asignan en _init_worker)
+_shared = {}
+
+
+def build_model(params: dict = None) -> RandomForestClassifier:
+    """RandomForest con los parámetros base más los del candidato"""
+    return RandomForestClassifier(**{**BASE_PARAMS, **(params or {})})
+
+
+def evaluate_predictions(y_true, y_pred) -> dict:
+    """Mismas métricas que reporta ModelService.train_model"""
+    return {
+        "accuracy": accuracy_score(y_true, y_pred),
+        "precision": precision_score(y_true, y_pred, average="weighted", zero_division=0),
+        "recall": recall_score(y_true, y_pred, average="weighted", zero_division=0),
+        "f1_score": f1_score(y_true, y_pred, average="weighted", zero_division=0),
+    }
+
+
+def candidate_params(param_grid: dict, n_iter: int = 0, random_state: int = 42) -> List[dict]:
+    """
+    Lista de candidatos: la grilla completa, o n_iter combinaciones al azar
+    (búsqueda aleatoria) si n_iter > 0 y la grilla es más grande
+    """
+    grid = ParameterGrid(param_grid)
+    if n_iter and n_iter < len(grid):
+        return list(ParameterSampler(param_grid, n_iter=n_iter, random_state=random_state))
+    return list(grid)
+
+
+def tradeoff_curve(
+    X_train: np.ndarray,
+    y_train: np.ndarray,
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+    params: dict,
+    fractions: List[float],
+    scale: float = 1.0,
+    random_state: int = 42,
+) -> List[dict]:
+    """
+    Tiempo de ajuste y métricas (sobre X_test) del modelo ajustado con una fracción
+    estratificada de la partición de entrenamiento, para cada fracción < 1
+
+    Args:
+        scale: Fracción de la historia que representa X_train completo (con muestreo,
+               la fracción muestreada); se multiplica por cada fracción en el resultado
+    """
+    points = []
+    stratify = y_train if np.unique(y_train, return_counts=True)[1].min() >= 2 else None
+    for fraction in sorted(f for f in fractions if 0 < f < 1):
+        X_part, _, y_part, _ = train_test_split(
+            X_train, y_train, train_size=fraction, random_state=random_state, stratify=stratify
+        )
+        model = build_model(params)
+        start = time.perf_counter()
+        model.fit(X_part, y_part)
+        fit_seconds = time.perf_counter() - start
+        points.append({
+            "fraction": round(fraction * scale, 6),
+            "samples": int(len(X_part)),
+            "fit_seconds": round(fit_seconds, 3),
+            **evaluate_predictions(y_test, model.predict(X_test)),
+        })
+    return points
+
+
+# ----------------- Procesos del pool -----------------
+
+def _attach(name: str, shape, dtype) -> np.ndarray:
+    # El bloque lo crea y libera (unlink) el proceso padre; este proceso solo lo mapea
+    shm = shared_memory.SharedMemory(name=name)
+    _shared.setdefault("handles", []).append(shm)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(x_spec, y_spec):
+    _shared["X"] = _attach(*x_spec)
+    _shared["y"] = _attach(*y_spec)
+
+
+def _evaluate_task(task):
+    """Entrena y evalúa un candidato en un fold; retorna tiempos y métricas"""
+    candidate_idx, fold_idx, params, train_idx, test_idx = task
+    X, y = _shared["X"], _shared["y"]
+
+    model = build_model({**params, "n_jobs": 1})
+    start = time.perf_counter()
+    model.fit(X[train_idx], y[train_idx])
+    fit_time = time.perf_counter() - start
+
+    X_test = X[test_idx]
+    start = time.perf_counter()
+    y_pred = model.predict(X_test)
+    predict_time = time.perf_counter() - start
+
+    return {
+        "candidate": candidate_idx,
+        "fold": fold_idx,
+        "fit_time": fit_time,
+        "predict_time_per_row": predict_time / max(len(test_idx), 1),
+        **evaluate_predictions(y[test_idx], y_pred),
+    }
+
+
+# ----------------- Búsqueda -----------------
+
+def _to_shared(array: np.ndarray):
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def search(
+    X: np.ndarray,
+    y: np.ndarray,
+    param_grid: dict,
+    n_iter: int = 0,
+    cv: int = 5,
+    scoring: str = "f1_score",
+    n_workers: Optional[int] = None,
+    random_state: int = 42,
+) -> dict:
+    """
+    Validación cruzada estratificada de cada candidato, en paralelo
+
+    Returns:
+        dict con best_params, best_score y candidates (métricas medias por fold,
+        desviación del puntaje, tiempo de ajuste medio y latencia de inferencia por fila)
+    """
+    if scoring not in METRIC_NAMES:
+        raise ValueError(f"Métrica desconocida: {scoring}. Opciones: {METRIC_NAMES}")
+
+    candidates = candidate_params(param_grid, n_iter, random_state)
+    # No más folds que ejemplos de la clase minoritaria
+    n_splits = max(2, min(cv, int(np.bincount(y.astype(int)).min())))
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(X, y))
+
+    tasks = [
+        (candidate_idx, fold_idx, params, train_idx, test_idx)
+        for (candidate_idx, params), (fold_idx, (train_idx, test_idx)) in itertools.product(
+            enumerate(candidates), enumerate(folds)
+        )
+    ]
+    n_workers = min(n_workers or os.cpu_count() or 1, len(tasks))
+
+    x_shm, x_spec = _to_shared(X)
+    y_shm, y_spec = _to_shared(y)
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(x_spec, y_spec),
+        ) as pool:
+            # Primero las tareas más caras (más árboles) para equilibrar la carga
+            tasks.sort(key=lambda task: -task[2].get("n_estimators", BASE_PARAMS["n_estimators"]))
+            results = list(pool.map(_evaluate_task, tasks))
+    finally:
+        for shm in (x_shm, y_shm):
+            shm.close()
+            shm.unlink()
+    wall_time = time.perf_counter() - start
+
+    report = []
+    for candidate_idx, params in enumerate(candidates):
+        fold_results = [r for r in results if r["candidate"] == candidate_idx]
+        entry = {
+            "params": params,
+            "fit_time": float(np.mean([r["fit_time"] for r in fold_results])),
+            "predict_time_per_row": float(np.mean([r["predict_time_per_row"] for r in fold_results])),
+        }
+        for metric in METRIC_NAMES:
+            entry[metric] = float(np.mean([r[metric] for r in fold_results]))
+        entry[f"{scoring}_std"] = float(np.std([r[scoring] for r in fold_results]))
+        report.append(entry)
+
+    report.sort(key=lambda entry: entry[scoring], reverse=True)
+    return {
+        "best_params": report[0]["params"],
+        "best_score": report[0][scoring],
+        "scoring": scoring,
+        "cv_folds": n_splits,
+        "n_candidates": len(candidates),
+        "n_workers": n_workers,
+        "wall_time": wall_time,
+        "candidates": report,
+    }
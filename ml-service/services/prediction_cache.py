@@ -0,0 +1,100 @@
+"""
+Caché en memoria de respuestas de predicción (LRU + TTL)
+
+La clave incluye la versión del modelo y una marca de agua de los datos del
+curso (ver DataService.get_data_watermark), así que cualquier cambio en tareas,
+entregas, inscripciones o perfiles produce una clave nueva: las entradas viejas
+nunca se vuelven a servir y salen por LRU o TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """Caché LRU con expiración y tope de memoria medido en filas de predicción"""
+
+    def __init__(self, max_entries: int = 1024, max_rows: int = 100_000, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl_seconds = ttl_seconds
+
+        # clave -> (expira_en, peso, valor)
+        self._entries = OrderedDict()
+        self._rows = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Retorna el valor cacheado o None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, weight, value = entry
+            if expires_at <= now:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, weight: int = 1):
+        """
+        Guarda un valor. weight es el número de filas de predicción que contiene;
+        entradas más grandes que el tope no se cachean.
+        """
+        weight = max(1, int(weight))
+        if weight > self.max_rows:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, weight, value)
+            self._rows += weight
+
+            # Desalojar las entradas menos usadas hasta respetar los topes
+            while len(self._entries) > self.max_entries or self._rows > self.max_rows:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """Vacía la caché (los contadores se mantienen)"""
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+
+    def stats(self) -> dict:
+        """Contadores de aciertos/fallos y ocupación"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "rows": self._rows,
+                "max_entries": self.max_entries,
+                "max_rows": self.max_rows,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def _remove(self, key):
+        _, weight, _ = self._entries.pop(key)
+        self._rows -= weight
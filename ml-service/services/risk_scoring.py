@@ -0,0 +1,248 @@
+"""
+Puntajes de riesgo persistidos en la tabla risk_scores
+
+Un trabajo programado evalúa todas las inscripciones activas de la plataforma y
+guarda el resultado (puntaje, nivel, confianza, versión del modelo, fecha de
+cálculo y las features usadas) en risk_scores, una fila por estudiante-curso.
+El backend sirve los paneles desde esa tabla: una lectura por índice en vez de
+una predicción completa por carga de página, y siguen disponibles aunque el
+servicio ML esté caído.
+
+Los cursos se procesan por lotes de RISK_SCORING_COURSES_PER_BATCH: una consulta
+de features, una evaluación del modelo y una transacción que reemplaza las filas
+de esos cursos (DELETE + COPY en Postgres, INSERT de varias filas en otros
+motores). Los lectores ven el curso completo antes o después del cambio, nunca a
+medias, y las inscripciones dadas de baja desaparecen en la misma transacción.
+
+La tabla la crea el backend (app/models/risk_score.py).
+"""
+
+import contextlib
+import csv
+import io
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, DateTime, Float, Integer, JSON, MetaData, String, Table, delete, insert, text
+
+from core.config import settings
+
+
+RISK_SCORES = Table(
+    "risk_scores", MetaData(),
+    Column("student_id", Integer, primary_key=True),
+    Column("course_id", Integer, primary_key=True),
+    Column("risk_score", Float, nullable=False),
+    Column("risk_level", String(10), nullable=False),
+    Column("confidence", Float, nullable=False),
+    Column("model_version", String(64)),
+    Column("computed_at", DateTime(timezone=True), nullable=False),
+    Column("features", JSON),
+)
+
+COLUMNS = [column.name for column in RISK_SCORES.columns]
+
+# Filas por sentencia INSERT cuando no hay COPY
+INSERT_BATCH_ROWS = 1000
+
+# Clave del advisory lock de Postgres: con varios workers de uvicorn solo uno
+# ejecuta la evaluación completa a la vez
+ADVISORY_LOCK_KEY = 0x5241_4953  # "RAIS"
+
+
+class RiskScoringConflict(Exception):
+    """Ya hay una evaluación completa en curso"""
+
+
+def build_score_rows(features_df: pd.DataFrame, predictions, probabilities, feature_names: list,
+                     model_version: str, computed_at: datetime) -> List[dict]:
+    """
+    Filas de risk_scores para un bloque de features evaluado (mismos puntaje, nivel
+    y confianza que las respuestas de /predict/batch)
+    """
+    probabilities = np.asarray(probabilities)
+    if probabilities.shape[1] > 1:
+        risk_scores = np.round(probabilities[:, 1], 3)
+        confidences = np.round(np.abs(probabilities[:, 1] - probabilities[:, 0]), 3)
+    else:
+        risk_scores = np.full(len(features_df), 0.5)
+        confidences = np.full(len(features_df), 0.5)
+    risk_levels = np.where(np.asarray(predictions) == 1, "alto", "bajo")
+
+    features = features_df[feature_names].round(3).to_dict(orient="records")
+    return [
+        {
+            "student_id": student_id,
+            "course_id": course_id,
+            "risk_score": risk_score,
+            "risk_level": risk_level,
+            "confidence": confidence,
+            "model_version": model_version,
+            "computed_at": computed_at,
+            "features": row_features,
+        }
+        for student_id, course_id, risk_score, risk_level, confidence, row_features in zip(
+            features_df["student_id"].astype(int).tolist(), features_df["course_id"].astype(int).tolist(),
+            risk_scores.tolist(), risk_levels.tolist(), confidences.tolist(), features
+        )
+    ]
+
+
+class RiskScorer:
+    """Evalúa las inscripciones activas y reemplaza sus filas en risk_scores"""
+
+    def __init__(self, data_service, model_service, feature_engineering):
+        self.data_service = data_service
+        self.model_service = model_service
+        self.feature_engineering = feature_engineering
+        self.last_run = None
+        self._run_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._run_lock.locked()
+
+    def status(self) -> dict:
+        return {"running": self.running, "last_run": self.last_run}
+
+    # ----------------- Evaluación -----------------
+
+    def score_courses(self, course_ids: list, computed_at: datetime) -> List[dict]:
+        """
+        Evalúa los cursos y reemplaza sus filas en risk_scores en una transacción
+
+        Returns:
+            Filas escritas
+        """
+        rows = self.score_features(self.data_service.get_scoring_features(course_ids), computed_at)
+        self.write_rows(course_ids, rows)
+        return rows
+
+    def score_features(self, features_df: pd.DataFrame, computed_at: datetime) -> List[dict]:
+        """
+        Evalúa features ya leídas (get_scoring_features) sin escribir nada; solo CPU,
+        así POST /scores/refresh de un curso lo corre en el pool de cómputo
+        """
+        if features_df.empty:
+            return []
+        feature_names = self.feature_engineering.get_feature_names()
+        predictions, probabilities, version = self.model_service.predict_with_version(
+            features_df[feature_names].values
+        )
+        return build_score_rows(features_df, predictions, probabilities, feature_names, version, computed_at)
+
+    def score_all(self) -> dict:
+        """
+        Evalúa todas las inscripciones activas por lotes de cursos
+
+        Returns:
+            Resumen de la ejecución (también queda en last_run)
+
+        Raises:
+            RiskScoringConflict si ya hay una evaluación completa en este proceso
+            o en otro worker
+        """
+        if not self._run_lock.acquire(blocking=False):
+            raise RiskScoringConflict("Ya hay una evaluación de riesgo en curso")
+        try:
+            with self._platform_lock() as acquired:
+                if not acquired:
+                    raise RiskScoringConflict("Otro worker está evaluando el riesgo")
+                return self._score_all()
+        finally:
+            self._run_lock.release()
+
+    def _score_all(self) -> dict:
+        computed_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        summary = {
+            "started_at": computed_at.isoformat(),
+            "finished_at": None,
+            "status": "running",
+            "courses": 0,
+            "rows": 0,
+            "model_version": self.model_service.model_version,
+            "seconds": None,
+            "error": None,
+        }
+        self.last_run = summary
+        try:
+            course_ids = self.data_service.get_active_course_ids()
+            batch_size = max(1, settings.RISK_SCORING_COURSES_PER_BATCH)
+            for first in range(0, len(course_ids), batch_size):
+                batch = course_ids[first:first + batch_size]
+                summary["rows"] += len(self.score_courses(batch, computed_at))
+                summary["courses"] += len(batch)
+            # Cursos que ya no tienen inscripciones
+            with self.data_service.engine.begin() as conn:
+                conn.execute(delete(RISK_SCORES).where(RISK_SCORES.c.computed_at < computed_at))
+            summary["status"] = "succeeded"
+        except Exception as e:
+            print(f"Error al evaluar el riesgo de la plataforma: {e}")
+            summary["status"] = "failed"
+            summary["error"] = str(e)
+        summary["finished_at"] = datetime.now(timezone.utc).isoformat()
+        summary["seconds"] = round(time.perf_counter() - start, 3)
+        return summary
+
+    @contextlib.contextmanager
+    def _platform_lock(self):
+        """Advisory lock de sesión en Postgres (en otros motores siempre se obtiene)"""
+        engine = self.data_service.engine
+        if engine.dialect.name != "postgresql":
+            yield True
+            return
+        with engine.connect() as conn:
+            acquired = bool(conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+            ).scalar())
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+
+    # ----------------- Escritura -----------------
+
+    def write_rows(self, course_ids: list, rows: List[dict]):
+        """Reemplaza las filas de los cursos por rows en una sola transacción"""
+        engine = self.data_service.engine
+        with engine.begin() as conn:
+            conn.execute(delete(RISK_SCORES).where(RISK_SCORES.c.course_id.in_(course_ids)))
+            if not rows:
+                return
+            if engine.dialect.driver == "psycopg2":
+                self._copy_rows(conn, rows)
+            else:
+                for first in range(0, len(rows), INSERT_BATCH_ROWS):
+                    conn.execute(insert(RISK_SCORES).values(rows[first:first + INSERT_BATCH_ROWS]))
+
+    @staticmethod
+    def _copy_rows(conn, rows: List[dict]):
+        """COPY ... FROM STDIN en formato CSV sobre la conexión de la transacción"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([
+                row["student_id"], row["course_id"], row["risk_score"], row["risk_level"],
+                row["confidence"], row["model_version"] if row["model_version"] is not None else "",
+                row["computed_at"].isoformat(), json.dumps(row["features"]),
+            ])
+        buffer.seek(0)
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY risk_scores ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        finally:
+            cursor.close()
+
+
+def records_for_response(rows: List[dict]) -> List[dict]:
+    """Filas de risk_scores con el formato de las respuestas de predicción (fechas en ISO)"""
+    return [{**row, "computed_at": row["computed_at"].isoformat()} for row in rows]
@@ -0,0 +1,122 @@
+"""
+Pool de cómputo para el trabajo de CPU de las predicciones
+
+El cálculo de features en pandas, la evaluación del bosque y la serialización de
+respuestas grandes corrían en el event loop: un lote de miles de filas bloqueaba
+/health y todas las demás peticiones mientras duraba. Ese trabajo se despacha a
+un pool de hilos propio, separado del pool de consultas (AsyncDataService), así
+el loop solo coordina. Se usan hilos y no procesos porque la evaluación del
+bosque (sklearn y el bosque compilado) y las operaciones de NumPy/pandas sueltan
+el GIL durante el cómputo pesado, y los hilos comparten el modelo ya cargado (y
+su caché de versiones) sin copiarlo ni pasar DataFrames entre procesos.
+
+La cola es acotada: si ya hay max_pending tareas en el pool (en ejecución o
+esperando), run() rechaza la nueva con ScoringPoolSaturated, que los endpoints
+propagan como 429 con Retry-After, en lugar de acumular latencia sin límite.
+
+Las respuestas NDJSON evalúan un bloque tras otro mientras se envían: reserve()
+ocupa un lugar de la cola durante toda la respuesta (el 429 sale antes de enviar
+nada) y cada bloque corre en el pool con ScoringReservation.run sin volver a
+pasar por la admisión, así un flujo no se corta a la mitad por la cola llena.
+
+Las funciones corren en una copia del contexto de la petición, así las etapas
+que miden (services/metrics.py) se atribuyen al endpoint que las pidió.
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from fastapi import HTTPException
+
+
+class ScoringPoolSaturated(HTTPException):
+    """El pool de cómputo tiene su cola llena (429 Too Many Requests)"""
+
+    def __init__(self, max_pending: int, retry_after: int = 1):
+        super().__init__(
+            status_code=429,
+            detail=f"El servicio está procesando {max_pending} lotes de predicción; reintenta en unos segundos",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+class ScoringPool:
+    """Pool de hilos acotado para features, evaluación del modelo y serialización"""
+
+    def __init__(self, max_workers: int = 4, max_pending: int = 64):
+        """
+        Args:
+            max_workers: Hilos de cómputo
+            max_pending: Tareas admitidas a la vez (en ejecución + en cola); las demás reciben 429
+        """
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scoring")
+        # Solo se modifica desde el event loop (run), no necesita lock
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """Ejecuta fn en el pool; ScoringPoolSaturated si la cola está llena"""
+        self._admit()
+        try:
+            return await self._execute(fn, *args, **kwargs)
+        finally:
+            self._release()
+
+    def reserve(self) -> "ScoringReservation":
+        """
+        Reserva un lugar de la cola para varias tareas seguidas (una respuesta NDJSON);
+        ScoringPoolSaturated si la cola está llena. Se libera con release().
+        """
+        self._admit()
+        return ScoringReservation(self)
+
+    def _admit(self):
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise ScoringPoolSaturated(self.max_pending)
+        self._pending += 1
+
+    def _release(self):
+        self._pending -= 1
+        self.completed += 1
+
+    async def _execute(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self._executor, partial(context.run, fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": self._pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        """Libera el pool de hilos"""
+        self._executor.shutdown(wait=False)
+
+
+class ScoringReservation:
+    """Lugar reservado en un ScoringPool (ver ScoringPool.reserve)"""
+
+    def __init__(self, pool: ScoringPool):
+        self._pool = pool
+        self._released = False
+
+    async def run(self, fn, *args, **kwargs):
+        """Ejecuta fn en el pool, dentro del lugar reservado"""
+        return await self._pool._execute(fn, *args, **kwargs)
+
+    def release(self):
+        """Devuelve el lugar a la cola (idempotente)"""
+        if not self._released:
+            self._released = True
+            self._pool._release()
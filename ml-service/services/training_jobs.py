@@ -0,0 +1,557 @@
+"""
+Entrenamiento del modelo como trabajo en segundo plano
+
+Cada trabajo corre en un proceso separado (multiprocessing con "spawn", sin
+heredar conexiones ni hilos del servidor) con prioridad de CPU reducida, así el
+event loop y las predicciones no esperan al ajuste del RandomForest. El proceso
+informa sus etapas por una cola; un hilo del servidor las recoge y mantiene el
+estado de cada trabajo. Solo se permite un entrenamiento a la vez, también entre
+varios workers de uvicorn: el trabajo tiene un advisory lock de Postgres mientras
+dura (con conexión propia, que se libera sola si el worker muere).
+
+El proceso de entrenamiento es líder de su propio grupo de procesos; cancelar un
+trabajo envía SIGTERM a todo el grupo, así también terminan los procesos del pool
+de la búsqueda de hiperparámetros.
+
+Al terminar, el proceso registra y promueve la nueva versión en el registro de
+modelos; el servidor la pone en servicio con ModelService.check_for_updates.
+
+Con la opción incremental el trabajo extiende el bosque de la versión en servicio
+con los datos que cambiaron desde su marca (services/incremental_training.py) y
+vuelve al entrenamiento completo cuando eso no es posible o ya corresponde.
+"""
+
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+from sqlalchemy import text
+
+from core.config import settings
+
+
+# Clave del advisory lock de Postgres: con varios workers de uvicorn solo uno
+# entrena a la vez (y escribe CURRENT.json del registro)
+ADVISORY_LOCK_KEY = 0x5452_4149  # "TRAI"
+
+# Etapas del entrenamiento, en orden
+STAGES = ["loading", "features", "fitting", "evaluating", "saving"]
+
+# Estados de un trabajo
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class TrainingJobConflict(Exception):
+    """Ya hay un entrenamiento en curso o el trabajo no admite la operación"""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Memoria residente máxima (MB) alcanzada por el proceso actual, o None si no se puede medir"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa kB; macOS, bytes
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def _terminate(process):
+    """SIGTERM al grupo del proceso de entrenamiento (él y el pool que haya lanzado)"""
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            return
+        except ProcessLookupError:
+            # Todavía no creó su grupo (o ya terminó): solo el proceso
+            pass
+    process.terminate()
+
+
+def run_training_job(job_id: str, options: dict, events):
+    """
+    Punto de entrada del proceso de entrenamiento: carga los datos, calcula las
+    features, entrena, evalúa y guarda una nueva versión del modelo.
+    Informa cada etapa y el resultado final por la cola events.
+    """
+    # Los imports pesados van aquí: solo los necesita el proceso hijo
+    import pandas as pd
+    from services.data_service import DataService
+    from services.model_service import ModelService
+    from services.training_snapshot import TrainingSnapshot
+    from services import incremental_training
+
+    def progress(stage: str):
+        events.put((job_id, "stage", stage))
+
+    try:
+        # Grupo de procesos propio: cancelar termina también el pool de la búsqueda
+        if hasattr(os, "setpgrp"):
+            os.setpgrp()
+        if settings.TRAINING_JOB_NICE and hasattr(os, "nice"):
+            os.nice(settings.TRAINING_JOB_NICE)
+
+        data_service = DataService()
+        model_service = ModelService(load_current=False)
+
+        progress("loading")
+        # Marca de los datos tomada antes de leerlos; se guarda con la versión
+        watermark = incremental_training.capture_watermark(data_service)
+
+        incremental = None
+        if options.get("incremental"):
+            result, incremental = _train_incremental(job_id, data_service, model_service, watermark, progress)
+            if result is not None:
+                events.put((job_id, SUCCEEDED, result))
+                return
+            print(f"Entrenamiento completo en lugar de incremental: {incremental['reason']}")
+
+        started = time.perf_counter()
+        dataset = None
+        # Muestra estratificada de la historia (las features pasan por el muestreador a
+        # medida que se calculan)
+        sampler = data_service.training_sampler(options["sample_size"]) if options.get("sample_size") else None
+        if options.get("sql_aggregate"):
+            # Lectura y agregación en la misma consulta: la etapa "features" la abarca
+            progress("features")
+            features_df = data_service.get_historical_data(aggregate=True)
+            if sampler is not None:
+                sampler.add(features_df)
+                features_df = sampler.sample()
+        elif options.get("snapshot"):
+            # Solo se releen de Postgres los cursos que cambiaron desde el último snapshot
+            snapshot = TrainingSnapshot()
+            dataset = snapshot.refresh(data_service)
+            print(f"Snapshot de datos: {dataset}")
+            progress("features")
+            features_df = snapshot.features(dataset["version"], sampler=sampler) if dataset["version"] else pd.DataFrame()
+        else:
+            # Lectura por partes: las features se acumulan mientras llegan las filas, así
+            # que la etapa "features" abarca la lectura
+            progress("features")
+            features_df = data_service.get_historical_features(sampler=sampler)
+
+        if features_df.empty:
+            raise ValueError("No se pudieron calcular features. Verifica que haya entregas con calificaciones.")
+        sampling = sampler.report() if sampler is not None else None
+        if sampling is not None:
+            print(f"Muestra de {sampling['sampled']} de {sampling['population']} pares ({sampling['fraction']:.2%})")
+
+        # train_model informa las etapas fitting y evaluating
+        metrics = model_service.train_model(
+            features_df, progress=progress, tune=options.get("tune", False), sampling=sampling
+        )
+        training_seconds = round(time.perf_counter() - started, 2)
+
+        progress("saving")
+        extra_metadata = {
+            "training_job_id": job_id,
+            "training_watermark": watermark,
+            "incremental_round": 0,
+            "training_seconds": training_seconds,
+            "full_training_seconds": training_seconds
+        }
+        if dataset is not None:
+            extra_metadata["dataset_version"] = dataset["version"]
+        version = model_service.save_model(extra_metadata=extra_metadata)
+        if incremental is not None:
+            incremental["seconds"] = training_seconds
+
+        events.put((job_id, SUCCEEDED, {
+            "metrics": metrics,
+            "samples_trained": int(len(features_df)),
+            "model_version": version,
+            "tuning": model_service.last_tuning_report,
+            "dataset": dataset,
+            "peak_rss_mb": peak_rss_mb(),
+            "incremental": incremental,
+            "sampling": model_service.last_sampling_report
+        }))
+    except Exception as e:
+        traceback.print_exc()
+        events.put((job_id, FAILED, str(e)))
+
+
+def _train_incremental(job_id: str, data_service, model_service, watermark: dict, progress):
+    """
+    Extiende el bosque de la versión en servicio con los estudiante-curso que
+    cambiaron desde su marca de datos y registra la nueva versión
+
+    Returns:
+        (resultado del trabajo, informe), o (None, informe con el motivo) si
+        corresponde un entrenamiento completo
+    """
+    import pandas as pd
+    from services import incremental_training
+    from services.incremental_training import IncrementalNotPossible
+
+    started = time.perf_counter()
+    base_version = model_service.registry.current_version()
+    base = model_service.registry.get_metadata(base_version) if base_version else None
+    report = {"mode": "full", "reason": None, "base_version": base_version}
+    try:
+        incremental_training.check_base(base, settings.INCREMENTAL_MAX_ROUNDS)
+    except IncrementalNotPossible as e:
+        report["reason"] = str(e)
+        return None, report
+
+    previous = base["training_watermark"]
+    course_ids = incremental_training.changed_courses(previous, watermark)
+    since = previous.get("profiles_updated_max")
+    profile_changes = data_service.get_profile_changes(since=pd.Timestamp(since) if since else None)
+    student_ids = sorted(int(student_id) for student_id in profile_changes["student_id"].unique())
+    progress("features")
+    features_df = data_service.get_bulk_features(course_ids=course_ids, student_ids=student_ids, aggregate=True)
+
+    full_seconds = base.get("full_training_seconds")
+    report.update({
+        "round": base.get("incremental_round", 0) + 1,
+        "changed_courses": len(course_ids),
+        "changed_students": len(student_ids),
+        "samples": int(len(features_df)),
+        "full_training_seconds": full_seconds,
+    })
+
+    def finish(mode: str, metrics: dict, samples: int, version: str) -> tuple:
+        seconds = round(time.perf_counter() - started, 2)
+        report.update({
+            "mode": mode,
+            "seconds": seconds,
+            "seconds_saved": round(full_seconds - seconds, 2) if full_seconds is not None else None,
+        })
+        return {
+            "metrics": metrics,
+            "samples_trained": samples,
+            "model_version": version,
+            "tuning": None,
+            "dataset": None,
+            "peak_rss_mb": peak_rss_mb(),
+            "incremental": report
+        }, report
+
+    if len(features_df) < settings.INCREMENTAL_MIN_SAMPLES:
+        # Pocos cambios: sigue la versión en servicio con su marca, así los cambios se
+        # acumulan para el próximo entrenamiento
+        report["reason"] = (
+            f"Solo {len(features_df)} estudiante-curso cambiaron desde la marca "
+            f"(mínimo {settings.INCREMENTAL_MIN_SAMPLES}); se mantiene la versión en servicio"
+        )
+        return finish("unchanged", base.get("metrics", {}), 0, base_version)
+
+    try:
+        metrics = model_service.train_incremental(
+            features_df, base_version,
+            random_state=incremental_training.round_seed(watermark, report["round"]),
+            progress=progress
+        )
+    except IncrementalNotPossible as e:
+        report["reason"] = str(e)
+        return None, report
+    report.update(model_service.last_incremental_report)
+
+    progress("saving")
+    version = model_service.save_model(extra_metadata={
+        "training_job_id": job_id,
+        "training_watermark": watermark,
+        "base_version": base_version,
+        "incremental_round": report["round"],
+        "training_seconds": round(time.perf_counter() - started, 2),
+        "full_training_seconds": full_seconds
+    })
+    return finish("incremental", metrics, int(len(features_df)), version)
+
+
+class TrainingJobManager:
+    """Lanza, sigue y cancela los trabajos de entrenamiento"""
+
+    def __init__(
+        self,
+        on_success: Optional[Callable[[dict], None]] = None,
+        max_history: int = 20,
+        engine=None
+    ):
+        """
+        Args:
+            engine: Motor de SQLAlchemy para el advisory lock entre workers (sin motor,
+                    o si no es Postgres, el límite es solo de este proceso)
+        """
+        self.on_success = on_success
+        self.max_history = max_history
+        self.engine = engine
+
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue()
+        self._jobs = OrderedDict()
+        self._processes = {}
+        # job_id -> conexión que tiene el advisory lock del trabajo
+        self._platform_locks = {}
+        self._lock = threading.Lock()
+        self._monitor = None
+
+    # ----------------- Operaciones -----------------
+
+    def start(self, options: dict = None) -> dict:
+        """
+        Lanza un entrenamiento en un proceso nuevo
+
+        Raises:
+            TrainingJobConflict si ya hay un entrenamiento en curso
+        """
+        with self._lock:
+            active = self._active_job()
+            if active is not None:
+                raise TrainingJobConflict(f"Ya hay un entrenamiento en curso: {active['job_id']}")
+            platform_lock = self._acquire_platform_lock()
+
+            job_id = uuid.uuid4().hex
+            job = {
+                "job_id": job_id,
+                "status": QUEUED,
+                "stage": None,
+                "progress": 0.0,
+                "options": options or {},
+                "created_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+                "stages": {},
+                "result": None,
+                "error": None,
+            }
+            self._jobs[job_id] = job
+            self._trim_history()
+
+            process = self._context.Process(
+                target=run_training_job,
+                args=(job_id, job["options"], self._events),
+                # No daemon: el entrenamiento puede lanzar su propio pool de procesos
+                # (búsqueda de hiperparámetros); shutdown() lo termina al apagar el servidor
+                name=f"training-{job_id[:8]}"
+            )
+            try:
+                process.start()
+            except Exception:
+                self._release_platform_lock(platform_lock)
+                raise
+            self._processes[job_id] = process
+            if platform_lock is not None:
+                self._platform_locks[job_id] = platform_lock
+            job["status"] = RUNNING
+            job["started_at"] = _now()
+
+            self._ensure_monitor()
+            return self._snapshot(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Estado de un trabajo, o None si no existe"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def list(self) -> List[dict]:
+        """Trabajos recientes, del más nuevo al más antiguo"""
+        with self._lock:
+            return [self._snapshot(job) for job in reversed(self._jobs.values())]
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """
+        Cancela un trabajo terminando su proceso (y su pool); espera hasta 5 s a que
+        termine fuera del lock, así que los handlers async lo llaman en un hilo
+
+        Raises:
+            TrainingJobConflict si el trabajo ya terminó o está guardando la versión
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] in FINISHED_STATES:
+                raise TrainingJobConflict(f"El trabajo {job_id} ya terminó ({job['status']})")
+            if job["stage"] == "saving":
+                # La versión se está registrando y promoviendo: cortarla a medias no tiene sentido
+                raise TrainingJobConflict(f"El trabajo {job_id} ya está guardando el modelo")
+
+            process = self._processes.pop(job_id, None)
+            if process is not None:
+                _terminate(process)
+            # El advisory lock se libera recién cuando el proceso terminó
+            platform_lock = self._platform_locks.pop(job_id, None)
+            self._finish(job, CANCELLED, error="Cancelado por el usuario")
+            snapshot = self._snapshot(job)
+
+        # Fuera del lock: las consultas de estado no esperan al proceso
+        if process is not None:
+            process.join(timeout=5)
+        self._release_platform_lock(platform_lock)
+        return snapshot
+
+    def shutdown(self):
+        """Termina los entrenamientos en curso (al apagar el servidor)"""
+        with self._lock:
+            for process in self._processes.values():
+                _terminate(process)
+            for job_id, process in list(self._processes.items()):
+                process.join(timeout=5)
+                self._finish(self._jobs[job_id], CANCELLED, error="Servidor detenido")
+            self._processes.clear()
+
+    # ----------------- Lock entre workers -----------------
+
+    def _acquire_platform_lock(self):
+        """
+        Conexión con el advisory lock de entrenamiento, o None sin Postgres
+
+        Raises:
+            TrainingJobConflict si otro worker está entrenando
+        """
+        if self.engine is None or self.engine.dialect.name != "postgresql":
+            return None
+        conn = self.engine.connect()
+        try:
+            acquired = bool(conn.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+            ).scalar())
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        if not acquired:
+            conn.close()
+            raise TrainingJobConflict("Otro worker del servidor está entrenando el modelo")
+        return conn
+
+    @staticmethod
+    def _release_platform_lock(conn):
+        if conn is None:
+            return
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            conn.close()
+        except Exception as e:
+            # Sin poder desbloquear, se descarta la conexión: cerrarla libera el lock
+            print(f"Error al liberar el lock de entrenamiento: {e}")
+            conn.invalidate()
+
+    # ----------------- Seguimiento -----------------
+
+    @staticmethod
+    def _snapshot(job: dict) -> dict:
+        """Copia del estado para leerla fuera del lock"""
+        return {**job, "stages": dict(job["stages"])}
+
+    def _active_job(self) -> Optional[dict]:
+        for job in self._jobs.values():
+            if job["status"] not in FINISHED_STATES:
+                return job
+        return None
+
+    def _ensure_monitor(self):
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._monitor_loop, name="training-monitor", daemon=True)
+            self._monitor.start()
+
+    def _monitor_loop(self):
+        while True:
+            try:
+                event = self._events.get(timeout=0.5)
+            except queue.Empty:
+                event = None
+
+            results = []
+            with self._lock:
+                if event is not None:
+                    results.append(self._apply_event(*event))
+                results.extend(self._check_processes())
+                idle = not self._processes and event is None
+                if idle:
+                    # Bajo el lock: un start() posterior lanzará un monitor nuevo
+                    self._monitor = None
+
+            for result in results:
+                if result is not None and self.on_success is not None:
+                    try:
+                        self.on_success(result)
+                    except Exception as e:
+                        print(f"Error al activar el modelo entrenado: {e}")
+
+            if idle:
+                return
+
+    def _apply_event(self, job_id: str, kind: str, payload) -> Optional[dict]:
+        """Aplica un evento del proceso hijo; retorna el resultado si el trabajo terminó bien"""
+        job = self._jobs.get(job_id)
+        if job is None or job["status"] in FINISHED_STATES:
+            return None
+
+        if kind == "stage":
+            job["stage"] = payload
+            job["stages"][payload] = _now()
+            job["progress"] = round(STAGES.index(payload) / len(STAGES), 2)
+            return None
+
+        self._processes.pop(job_id, None)
+        if kind == SUCCEEDED:
+            job["result"] = payload
+            self._finish(job, SUCCEEDED)
+            return payload
+
+        self._finish(job, FAILED, error=payload)
+        return None
+
+    def _check_processes(self) -> list:
+        """
+        Marca como fallidos los trabajos cuyo proceso murió sin informar el resultado
+        
+        Returns:
+            Resultados de trabajos exitosos encontrados al vaciar la cola
+        """
+        results = []
+        for job_id, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            # Dar una última oportunidad a los eventos que aún estén en la cola
+            try:
+                while True:
+                    results.append(self._apply_event(*self._events.get_nowait()))
+            except queue.Empty:
+                pass
+            if job_id in self._processes:
+                del self._processes[job_id]
+                self._finish(
+                    self._jobs[job_id], FAILED,
+                    error=f"El proceso de entrenamiento terminó inesperadamente (código {process.exitcode})"
+                )
+        return results
+
+    def _finish(self, job: dict, status: str, error: str = None):
+        self._release_platform_lock(self._platform_locks.pop(job["job_id"], None))
+        job["status"] = status
+        job["finished_at"] = _now()
+        if status == SUCCEEDED:
+            job["progress"] = 1.0
+        if error:
+            job["error"] = error
+
+    def _trim_history(self):
+        while len(self._jobs) > self.max_history:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest["status"] not in FINISHED_STATES:
+                break
+            del self._jobs[oldest_id]
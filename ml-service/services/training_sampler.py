@@ -0,0 +1,160 @@
+"""
+Muestreo estratificado de los datos de entrenamiento en una sola pasada
+
+Con millones de pares estudiante-curso, ajustar el RandomForest con todos es lento
+y casi no mejora la precisión. StratifiedReservoir recibe las features por partes
+(a medida que FeatureAccumulator completa cada par) y guarda una muestra acotada:
+la memoria depende del tamaño de la muestra y no del tamaño de la historia.
+
+Es un reservorio con claves aleatorias: cada par recibe una clave uniforme y, en
+cada estrato, la muestra final son los pares con las claves más pequeñas, es decir,
+una muestra aleatoria simple sin reemplazo de ese estrato. El tamaño de cada
+estrato en la muestra es proporcional a su tamaño en la historia (contado durante
+la pasada, con el método del mayor resto para que sumen sample_size).
+
+Como las proporciones finales se conocen recién al terminar, el búfer se compacta
+cada vez que supera 4 x sample_size filas y conserva, en cada estrato, las claves
+por debajo del corte global de 2 x sample_size más las cuotas proporcionales
+estimadas hasta ese momento. Ambas condiciones conservan las claves más pequeñas
+de cada estrato, así que lo conservado siempre contiene la muestra final salvo que
+un estrato crezca muy por encima de lo visto (en ese caso la muestra queda con
+menos filas de ese estrato y el informe lo indica).
+
+Los estratos por defecto (training_strata) son nivel de riesgo (la variable
+objetivo), asignatura y periodo del curso.
+"""
+
+import math
+from typing import Callable, Dict, Hashable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def training_strata(features: pd.DataFrame, courses: pd.DataFrame, feature_engineering) -> np.ndarray:
+    """
+    Estrato de cada par: "<riesgo>|<asignatura>|<periodo>"
+
+    Args:
+        features: Features de una parte de los pares (con course_id)
+        courses: Asignatura y periodo por course_id (DataService.get_course_strata)
+    """
+    labels = feature_engineering.calculate_target_variable(features).to_numpy()
+    course_ids = features["course_id"].to_numpy()
+    subjects = courses["subject"].reindex(course_ids).fillna("").to_numpy()
+    terms = courses["term"].reindex(course_ids).fillna("").to_numpy()
+    return np.array([f"{int(label)}|{subject}|{term}" for label, subject, term in zip(labels, subjects, terms)])
+
+
+class StratifiedReservoir:
+    """Muestra estratificada proporcional de tamaño fijo sobre un flujo de features"""
+
+    def __init__(
+        self,
+        sample_size: int,
+        strata: Callable[[pd.DataFrame], np.ndarray],
+        random_state: Optional[int] = 42
+    ):
+        """
+        Args:
+            sample_size: Pares en la muestra final
+            strata: Función que da el estrato (hashable) de cada fila de una parte
+            random_state: Semilla de las claves (None = distinta en cada entrenamiento)
+        """
+        if sample_size <= 0:
+            raise ValueError("sample_size debe ser positivo")
+        self.sample_size = sample_size
+        self.strata = strata
+        self._rng = np.random.default_rng(random_state)
+
+        self._codes: Dict[Hashable, int] = {}
+        self._seen = np.zeros(0, dtype=np.int64)
+        self._parts = []
+        self._buffered = 0
+        self.population = 0
+        self.compactions = 0
+        self.peak_buffered = 0
+
+    def add(self, features: pd.DataFrame):
+        """Agrega una parte de las features (una fila por estudiante-curso)"""
+        if features.empty:
+            return
+        keys = self.strata(features)
+        codes = np.fromiter((self._code(key) for key in keys), dtype=np.int64, count=len(keys))
+        self._seen += np.bincount(codes, minlength=len(self._seen))
+        self.population += len(features)
+
+        part = features.reset_index(drop=True).assign(
+            _stratum=codes, _key=self._rng.random(len(features))
+        )
+        self._parts.append(part)
+        self._buffered += len(part)
+        self.peak_buffered = max(self.peak_buffered, self._buffered)
+        if self._buffered > 4 * self.sample_size:
+            self._compact(self._quotas(rounding=math.ceil), global_keep=2 * self.sample_size)
+            self.compactions += 1
+
+    def sample(self) -> pd.DataFrame:
+        """Muestra final, en el orden de la historia (student_id, course_id)"""
+        if not self._parts:
+            return pd.DataFrame()
+        buffer = self._compact(self._quotas(), global_keep=0)
+        sample = buffer.drop(columns=["_stratum", "_key"])
+        return sample.sort_values(["student_id", "course_id"]).reset_index(drop=True)
+
+    def report(self) -> dict:
+        """Fracción muestreada y pares vistos/muestreados por estrato (después de sample())"""
+        buffer = pd.concat(self._parts, ignore_index=True) if self._parts else None
+        sampled = (
+            np.bincount(buffer["_stratum"].to_numpy(), minlength=len(self._seen)) if buffer is not None
+            else np.zeros(len(self._seen), dtype=np.int64)
+        )
+        n_sampled = int(sampled.sum())
+        return {
+            "sample_size": self.sample_size,
+            "population": int(self.population),
+            "sampled": n_sampled,
+            "fraction": round(n_sampled / self.population, 6) if self.population else 0.0,
+            "compactions": self.compactions,
+            "peak_buffered": self.peak_buffered,
+            # Pares que faltaron para las cuotas proporcionales (ver el docstring del módulo)
+            "shortfall": int(np.maximum(self._quotas() - sampled, 0).sum()),
+            "strata": {
+                str(key): {"population": int(self._seen[code]), "sampled": int(sampled[code])}
+                for key, code in self._codes.items()
+            },
+        }
+
+    def _code(self, key: Hashable) -> int:
+        code = self._codes.get(key)
+        if code is None:
+            code = self._codes[key] = len(self._codes)
+            self._seen = np.append(self._seen, 0)
+        return code
+
+    def _quotas(self, rounding=None) -> np.ndarray:
+        """
+        Pares por estrato proporcionales a lo visto; sin rounding, enteros que suman
+        sample_size (mayor resto)
+        """
+        share = self.sample_size * self._seen / max(self.population, 1)
+        if rounding is not None:
+            return np.array([rounding(value) for value in share], dtype=np.int64)
+        quotas = np.floor(share).astype(np.int64)
+        missing = min(self.sample_size, self.population) - int(quotas.sum())
+        if missing > 0:
+            quotas[np.argsort(-(share - quotas), kind="stable")[:missing]] += 1
+        return np.minimum(quotas, self._seen)
+
+    def _compact(self, quotas: np.ndarray, global_keep: int) -> pd.DataFrame:
+        """Deja en el búfer las claves más pequeñas de cada estrato (ver el docstring del módulo)"""
+        buffer = pd.concat(self._parts, ignore_index=True)
+        keys = buffer["_key"].to_numpy()
+        rank = buffer.groupby("_stratum")["_key"].rank(method="first").to_numpy()
+        keep = rank <= quotas[buffer["_stratum"].to_numpy()]
+        if 0 < global_keep < len(buffer):
+            keep |= keys <= np.partition(keys, global_keep - 1)[global_keep - 1]
+        buffer = buffer.loc[keep].reset_index(drop=True)
+        self._parts = [buffer]
+        self._buffered = len(buffer)
+        return buffer
@@ -0,0 +1,461 @@
+"""
+Snapshot local y columnar de los datos de entrenamiento
+
+Guarda las filas tarea×inscripción de HISTORICAL_DATA_QUERY en disco (Parquet si
+pyarrow está instalado; si no, un .npy por columna) para no releer de Postgres
+la historia que ya no cambia (cursos de periodos anteriores).
+
+Las filas se guardan en segmentos inmutables (segments/<id>/), uno por cada
+actualización, escritos por partes a medida que llegan del cursor. Cada versión
+del dataset (versions/<versión>.json) indica de qué segmento sale cada curso,
+junto con la huella del curso en la base de datos (COURSE_FINGERPRINT_QUERY) y
+la marca de agua de los cuestionarios (MAX(updated_at)). Al actualizar:
+  - se consulta la huella de todos los cursos (una fila por curso) y solo se
+    releen los cursos nuevos o cuya huella cambió (tareas, inscripciones,
+    entregas o notas nuevas o modificadas); los cursos eliminados se descartan
+  - los cuestionarios se guardan aparte (una fila por estudiante) y solo se
+    leen los actualizados después de la marca de agua
+Si nada cambió se reutiliza la versión actual sin leer filas. Las versiones
+son inmutables: el modelo registra la versión con la que se entrenó y se
+puede volver a leer exactamente el mismo dataset mientras se conserve.
+
+Los cuestionarios eliminados no se detectan (solo los creados o actualizados).
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from core.config import settings
+from services.feature_engineering import FeatureEngineering, FeatureAccumulator
+
+try:
+    import pyarrow  # noqa: F401  (motor de Parquet de pandas)
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+
+# Columnas tarea×inscripción de HISTORICAL_DATA_QUERY (sin el perfil) y su tipo en disco.
+# Las fechas "datetime_utc" se guardan en UTC sin zona y se leen con zona UTC.
+ROW_SCHEMA = {
+    "task_id": "int64",
+    "course_id": "int64",
+    "due_date": "datetime_utc",
+    "task_created_at": "datetime_utc",
+    "student_id": "int64",
+    "enrollment_date": "datetime",
+    "submission_id": "float64",
+    "submitted_at": "datetime_utc",
+    "grade": "float64",
+}
+
+# Cuestionario: una fila por estudiante
+PROFILE_SCHEMA = {
+    "student_id": "int64",
+    **{col: "float64" for col in FeatureEngineering.PROFILE_RAW_COLUMNS if col != "gender"},
+    "gender": "string",
+}
+
+# Columnas de la huella por curso (ver COURSE_FINGERPRINT_QUERY)
+FINGERPRINT_COLUMNS = [
+    "n_tasks", "task_ids", "due_dates", "n_students", "student_ids",
+    "n_submissions", "submission_ids", "grades", "submitted",
+]
+
+
+class TrainingSnapshot:
+    """Versiones del dataset de entrenamiento en un directorio local"""
+
+    SEGMENT_FILE = "segment.json"
+    POINTER_FILE = "CURRENT.json"
+
+    def __init__(self, directory=None, chunksize: int = None):
+        self.directory = Path(directory or settings.TRAINING_SNAPSHOT_DIR)
+        self.versions_dir = self.directory / "versions"
+        self.segments_dir = self.directory / "segments"
+        self.pointer_path = self.directory / self.POINTER_FILE
+        self.chunksize = chunksize or settings.TRAINING_CHUNK_SIZE
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+
+    # ----------------- Versiones -----------------
+
+    def current_version(self) -> Optional[str]:
+        """Versión más reciente del dataset"""
+        try:
+            return json.loads(self.pointer_path.read_text()).get("version")
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def get_manifest(self, version: str = None) -> Optional[dict]:
+        """Manifiesto de una versión (la actual por defecto), o None si no existe"""
+        version = version or self.current_version()
+        if version is None:
+            return None
+        path = self.versions_dir / f"{version}.json"
+        if not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def list_versions(self) -> List[dict]:
+        """Resumen de las versiones conservadas, de la más antigua a la más reciente"""
+        versions = []
+        for path in self.versions_dir.glob("*.json"):
+            manifest = json.loads(path.read_text())
+            versions.append({
+                key: manifest[key] for key in ("version", "created_at", "n_rows", "n_courses", "refresh")
+            })
+        return sorted(versions, key=lambda v: v["created_at"])
+
+    # ----------------- Actualización -----------------
+
+    def refresh(self, data_service) -> dict:
+        """
+        Actualiza el snapshot con lo que cambió en la base de datos desde la versión actual
+        (la primera vez lee todo)
+
+        Returns:
+            dict con version, status ("created", "unchanged" o "empty"), cursos releídos
+            y eliminados, cuestionarios actualizados, filas leídas y tiempo
+
+        Raises:
+            Los errores de las consultas (un snapshot a medias nunca queda como versión)
+        """
+        start = time.perf_counter()
+        manifest = self.get_manifest()
+
+        # La marca de los cuestionarios y las huellas se toman antes de leer filas:
+        # lo que cambie mientras tanto se vuelve a leer en la próxima actualización
+        profiles_since = manifest.get("profiles_updated_max") if manifest else None
+        profile_changes = data_service.get_profile_changes(
+            since=pd.Timestamp(profiles_since) if profiles_since else None
+        )
+        fingerprints = data_service.get_course_fingerprints()[FINGERPRINT_COLUMNS]
+
+        courses = {int(c): segment for c, segment in manifest["courses"].items()} if manifest else {}
+        stale = self._changed_courses(self._fingerprint_frame(manifest), fingerprints)
+        removed = set(courses) - set(fingerprints.index)
+
+        stats = {
+            "courses_refreshed": len(stale),
+            "courses_removed": len(removed),
+            "profiles_refreshed": int(len(profile_changes)),
+            "rows_fetched": 0,
+        }
+        if not stale and not removed and profile_changes.empty:
+            version = manifest["version"] if manifest else None
+            return {
+                "version": version,
+                "status": "unchanged" if version else "empty",
+                **stats,
+                "elapsed": round(time.perf_counter() - start, 3),
+            }
+
+        for course_id in removed:
+            courses.pop(course_id)
+
+        if stale:
+            # Sin versión previa se lee todo de una vez (sin filtro de cursos)
+            course_ids = sorted(stale) if manifest else None
+            segment_id, segment = self._write_segment(
+                "rows", data_service.iter_historical_rows(course_ids=course_ids, chunksize=self.chunksize)
+            )
+            for course_id in stale:
+                courses.pop(course_id, None)
+            for course_id in segment["rows_per_course"]:
+                courses[int(course_id)] = segment_id
+            stats["rows_fetched"] = segment["n_rows"]
+
+        profiles_segment = manifest.get("profiles") if manifest else None
+        profiles_updated_max = profiles_since
+        if not profile_changes.empty:
+            profiles_updated_max = pd.to_datetime(profile_changes["updated_at"], utc=True).max().isoformat()
+            profiles_segment = self._write_profiles(profiles_segment, profile_changes)
+
+        manifest = self._write_version(courses, fingerprints, profiles_segment, profiles_updated_max, stats)
+        self._collect_garbage()
+        return {
+            "version": manifest["version"],
+            "status": "created",
+            **stats,
+            "elapsed": round(time.perf_counter() - start, 3),
+        }
+
+    @staticmethod
+    def _fingerprint_frame(manifest: Optional[dict]) -> pd.DataFrame:
+        if not manifest or not manifest["fingerprints"]:
+            return pd.DataFrame(columns=FINGERPRINT_COLUMNS, dtype="int64")
+        return pd.DataFrame.from_dict(
+            {int(c): values for c, values in manifest["fingerprints"].items()},
+            orient="index", columns=FINGERPRINT_COLUMNS
+        )
+
+    @staticmethod
+    def _changed_courses(known: pd.DataFrame, current: pd.DataFrame) -> set:
+        """Cursos nuevos o cuya huella cambió"""
+        common = current.index.intersection(known.index)
+        same = (current.loc[common] == known.loc[common, FINGERPRINT_COLUMNS]).all(axis=1).to_numpy()
+        return {int(c) for c in current.index.difference(known.index)} | {int(c) for c in common[~same]}
+
+    def _write_profiles(self, segment_id: Optional[str], changes: pd.DataFrame) -> str:
+        """Nuevo segmento de cuestionarios: los anteriores más los cambios"""
+        profiles = changes
+        if segment_id is not None:
+            previous = pd.concat(self._read_parts(segment_id, PROFILE_SCHEMA), ignore_index=True)
+            profiles = pd.concat([previous, changes], ignore_index=True)
+        profiles = profiles.drop_duplicates("student_id", keep="last").sort_values("student_id")
+        new_segment_id, _ = self._write_segment("profiles", [profiles])
+        return new_segment_id
+
+    def _write_version(self, courses: dict, fingerprints: pd.DataFrame, profiles_segment, profiles_updated_max, stats) -> dict:
+        segments = {}
+        for segment_id in set(courses.values()):
+            segments[segment_id] = self._segment_meta(segment_id)["rows_per_course"]
+
+        content = {
+            "courses": {str(c): courses[c] for c in sorted(courses)},
+            "profiles": profiles_segment,
+        }
+        digest = hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+        created_at = datetime.now(timezone.utc)
+        known = fingerprints.loc[fingerprints.index.intersection(list(courses))]
+
+        manifest = {
+            "version": f"{created_at:%Y%m%d%H%M%S}-{digest[:8]}",
+            "created_at": created_at.isoformat(),
+            **content,
+            "fingerprints": {str(c): [int(v) for v in row] for c, row in zip(known.index, known.to_numpy())},
+            "profiles_updated_max": profiles_updated_max,
+            "n_courses": len(courses),
+            "n_rows": int(sum(segments[s][str(c)] for c, s in courses.items())),
+            "refresh": stats,
+        }
+        _write_json(self.versions_dir / f"{manifest['version']}.json", manifest)
+        _write_json(self.pointer_path, {"version": manifest["version"]})
+        return manifest
+
+    def _collect_garbage(self):
+        """Conserva las últimas TRAINING_SNAPSHOT_KEEP versiones y los segmentos que usan"""
+        manifests = sorted(
+            (json.loads(path.read_text()) for path in self.versions_dir.glob("*.json")),
+            key=lambda m: m["created_at"]
+        )
+        keep = manifests[-max(1, settings.TRAINING_SNAPSHOT_KEEP):]
+        for manifest in manifests[:-len(keep)]:
+            (self.versions_dir / f"{manifest['version']}.json").unlink()
+
+        referenced = set()
+        for manifest in keep:
+            referenced.update(manifest["courses"].values())
+            if manifest.get("profiles"):
+                referenced.add(manifest["profiles"])
+        for path in self.segments_dir.iterdir():
+            if path.is_dir() and not path.name.startswith(".") and path.name not in referenced:
+                shutil.rmtree(path, ignore_errors=True)
+
+    # ----------------- Lectura -----------------
+
+    def iter_rows(self, version: str = None) -> Iterator[pd.DataFrame]:
+        """
+        Recorre por partes las filas de una versión (la actual por defecto), con las
+        mismas columnas que get_historical_data(). Las filas de cada par
+        estudiante-curso llegan contiguas.
+
+        Raises:
+            ValueError si la versión no existe
+        """
+        manifest = self.get_manifest(version)
+        if manifest is None:
+            raise ValueError(f"La versión del dataset {version or '(actual)'} no existe")
+
+        profiles = None
+        if manifest.get("profiles"):
+            profiles = pd.concat(
+                self._read_parts(manifest["profiles"], PROFILE_SCHEMA), ignore_index=True
+            ).set_index("student_id")
+
+        by_segment = {}
+        for course_id, segment_id in manifest["courses"].items():
+            by_segment.setdefault(segment_id, []).append(int(course_id))
+
+        for segment_id in sorted(by_segment):
+            # Solo los cursos de este segmento que no fueron releídos después
+            wanted = np.array(sorted(by_segment[segment_id]), dtype=np.int64)
+            for rows in self._read_parts(segment_id, ROW_SCHEMA, course_ids=wanted):
+                if not rows.empty:
+                    yield self._join_profiles(rows, profiles)
+
+    def features(self, version: str = None, sampler=None) -> pd.DataFrame:
+        """
+        Features de entrenamiento de una versión, calculadas por partes
+
+        Returns:
+            El mismo DataFrame que calculate_features(get_historical_data()) con los
+            datos de esa versión, o la muestra de sampler (StratifiedReservoir) si se pasa
+        """
+        accumulator = FeatureAccumulator(sink=sampler.add if sampler else None)
+        for rows in self.iter_rows(version):
+            accumulator.add(rows)
+        if sampler is not None:
+            accumulator.finalize()
+            return sampler.sample()
+        features = accumulator.finalize()
+        if features.empty:
+            return features
+        # Mismo orden que la consulta (los segmentos se leen uno tras otro)
+        return features.sort_values(["student_id", "course_id"]).reset_index(drop=True)
+
+    @staticmethod
+    def _join_profiles(rows: pd.DataFrame, profiles: Optional[pd.DataFrame]) -> pd.DataFrame:
+        for col in FeatureEngineering.PROFILE_RAW_COLUMNS:
+            if profiles is not None:
+                rows[col] = profiles[col].reindex(rows["student_id"]).to_numpy()
+            else:
+                rows[col] = None if PROFILE_SCHEMA[col] == "string" else np.nan
+        return rows
+
+    # ----------------- Almacenamiento -----------------
+
+    def _segment_meta(self, segment_id: str) -> dict:
+        return json.loads((self.segments_dir / segment_id / self.SEGMENT_FILE).read_text())
+
+    def _write_segment(self, kind: str, frames) -> tuple:
+        """
+        Escribe un segmento inmutable con una parte por DataFrame de frames
+
+        Returns:
+            (id del segmento, metadata)
+        """
+        schema = ROW_SCHEMA if kind == "rows" else PROFILE_SCHEMA
+        file_format = "parquet" if PARQUET_AVAILABLE else "npy"
+        segment_id = f"{datetime.now(timezone.utc):%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+        # Se escribe en un directorio temporal y se renombra: un segmento nunca queda a medias
+        tmp_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.segments_dir))
+        try:
+            parts = []
+            rows_per_course = {}
+            for frame in frames:
+                if frame.empty:
+                    continue
+                frame = _normalize(frame, schema)
+                name = f"part-{len(parts):05d}"
+                if file_format == "parquet":
+                    frame.to_parquet(tmp_dir / f"{name}.parquet", index=False)
+                    parts.append({"name": name, "n_rows": len(frame)})
+                else:
+                    parts.append(_save_columns(tmp_dir / name, frame, schema))
+                if kind == "rows":
+                    for course_id, count in frame["course_id"].value_counts().items():
+                        rows_per_course[str(course_id)] = rows_per_course.get(str(course_id), 0) + int(count)
+
+            meta = {
+                "segment": segment_id,
+                "kind": kind,
+                "format": file_format,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "n_rows": sum(part["n_rows"] for part in parts),
+                "parts": parts,
+                "rows_per_course": rows_per_course,
+            }
+            _write_json(tmp_dir / self.SEGMENT_FILE, meta)
+            os.replace(tmp_dir, self.segments_dir / segment_id)
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        return segment_id, meta
+
+    def _read_parts(self, segment_id: str, schema: dict, course_ids: np.ndarray = None) -> Iterator[pd.DataFrame]:
+        """Partes de un segmento (solo las filas de course_ids, si se indica)"""
+        directory = self.segments_dir / segment_id
+        meta = self._segment_meta(segment_id)
+        for part in meta["parts"]:
+            if meta["format"] == "parquet":
+                frame = pd.read_parquet(directory / f"{part['name']}.parquet")
+                if course_ids is not None:
+                    frame = frame.loc[np.isin(frame["course_id"].to_numpy(), course_ids)]
+            else:
+                frame = _load_columns(directory / part["name"], part, schema, course_ids)
+            yield _restore(frame.reset_index(drop=True), schema)
+
+
+# ----------------- Columnas en disco -----------------
+
+def _normalize(frame: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Columnas del esquema con su tipo en disco (las que falten quedan vacías)"""
+    columns = {}
+    for col, kind in schema.items():
+        values = frame[col] if col in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+        if kind in ("datetime", "datetime_utc"):
+            values = pd.to_datetime(values, utc=kind == "datetime_utc")
+            if values.dt.tz is not None:
+                values = values.dt.tz_convert("UTC").dt.tz_localize(None)
+            columns[col] = values.astype("datetime64[ns]")
+        elif kind == "string":
+            columns[col] = values.astype(object).where(values.notna(), None)
+        else:
+            columns[col] = pd.to_numeric(values, errors="coerce").astype(kind)
+    return pd.DataFrame(columns)
+
+
+def _restore(frame: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """Tipos de lectura: fechas UTC con zona"""
+    for col, kind in schema.items():
+        if kind == "datetime_utc":
+            frame[col] = frame[col].dt.tz_localize("UTC")
+    return frame
+
+
+def _save_columns(directory: Path, frame: pd.DataFrame, schema: dict) -> dict:
+    """Un .npy por columna; los textos como códigos enteros más la lista de categorías"""
+    directory.mkdir()
+    part = {"name": directory.name, "n_rows": len(frame), "categories": {}}
+    for col, kind in schema.items():
+        if kind == "string":
+            categorical = pd.Categorical(frame[col])
+            values = categorical.codes.astype(np.int32)
+            part["categories"][col] = [str(c) for c in categorical.categories]
+        else:
+            values = frame[col].to_numpy()
+        np.save(directory / f"{col}.npy", values, allow_pickle=False)
+    return part
+
+
+def _load_columns(directory: Path, part: dict, schema: dict, course_ids: np.ndarray = None) -> pd.DataFrame:
+    """Lee las columnas con mmap y copia solo las filas de course_ids"""
+    rows = slice(None)
+    if course_ids is not None:
+        rows = np.isin(np.load(directory / "course_id.npy", mmap_mode="r"), course_ids)
+    columns = {}
+    for col, kind in schema.items():
+        values = np.asarray(np.load(directory / f"{col}.npy", mmap_mode="r", allow_pickle=False)[rows])
+        if kind == "string":
+            # Código -1 (nulo) -> último elemento (None)
+            categories = np.array(part["categories"][col] + [None], dtype=object)
+            values = categories[values]
+        columns[col] = values
+    return pd.DataFrame(columns)
+
+
+def _write_json(path: Path, data: dict):
+    """Escritura atómica: archivo temporal en el mismo directorio + os.replace"""
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=path.parent)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,9 @@
+"""
+Configuración de pytest: las pruebas importan los módulos del servicio
+(services, core) igual que main.py, desde el directorio ml-service
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
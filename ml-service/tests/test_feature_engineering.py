@@ -0,0 +1,160 @@
+"""
+Pruebas de FeatureEngineering: paridad del motor vectorizado de calculate_features
+con la implementación original por grupo (engine="loop") y del camino sin pandas
+de /predict (features_from_rows) con calculate_features
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.feature_engineering import FeatureEngineering
+from benchmarks.synthetic import generate_task_rows
+
+
+BASE_DATE = pd.Timestamp("2024-03-04", tz="UTC")
+
+PROFILE = {
+    "motivation": 8.0,
+    "available_time": 6.0,
+    "sleep_hours": 7.0,
+    "study_hours": 4.0,
+    "enjoyment_studying": 9.0,
+    "study_place_tranquility": 5.0,
+    "academic_pressure": 3.0,
+    "gender": "Femenino",
+}
+NO_PROFILE = {**{col: np.nan for col in PROFILE}, "gender": None}
+
+
+def day(n: float) -> pd.Timestamp:
+    return BASE_DATE + pd.Timedelta(days=n)
+
+
+def task_row(student_id, course_id, task_id, due_day, submitted_day=None, grade=np.nan, profile=PROFILE):
+    """Fila tarea×inscripción con el esquema de DataService.get_historical_data()"""
+    submitted = submitted_day is not None
+    return {
+        "task_id": task_id,
+        "course_id": course_id,
+        "due_date": day(due_day),
+        "task_created_at": day(due_day - 7),
+        "student_id": student_id,
+        "enrollment_date": day(-10),
+        "submission_id": float(student_id * 1000 + task_id) if submitted else np.nan,
+        "submitted_at": day(submitted_day) if submitted else pd.NaT,
+        "grade": grade,
+        **profile,
+    }
+
+
+@pytest.fixture
+def task_rows() -> pd.DataFrame:
+    """
+    Dataset fijo con los casos borde de cada feature:
+      (1, 10) entregas a tiempo, exactamente al vencimiento y atrasadas; una sin nota
+      (2, 10) ninguna entrega (valores neutrales) y sin cuestionario
+      (3, 10) entregas sin ninguna nota (grade NaN)
+      (1, 20) una sola nota (sin variabilidad) y género masculino
+      (4, 20) notas en los extremos de la escala y género "Otro"
+    """
+    rows = [
+        task_row(1, 10, 101, 7, submitted_day=5, grade=5.0),
+        task_row(1, 10, 102, 14, submitted_day=14, grade=6.5),
+        task_row(1, 10, 103, 21, submitted_day=23.5),
+        task_row(1, 10, 104, 28),
+        task_row(2, 10, 101, 7, profile=NO_PROFILE),
+        task_row(2, 10, 102, 14, profile=NO_PROFILE),
+        task_row(2, 10, 103, 21, profile=NO_PROFILE),
+        task_row(2, 10, 104, 28, profile=NO_PROFILE),
+        task_row(3, 10, 101, 7, submitted_day=9),
+        task_row(3, 10, 102, 14, submitted_day=13),
+        task_row(3, 10, 103, 21),
+        task_row(3, 10, 104, 28),
+        task_row(1, 20, 201, 7, submitted_day=6, grade=7.0),
+        task_row(1, 20, 202, 14),
+        task_row(4, 20, 201, 7, submitted_day=7.5, grade=1.0, profile={**PROFILE, "gender": "Otro"}),
+        task_row(4, 20, 202, 14, submitted_day=10, grade=7.0, profile={**PROFILE, "gender": "Otro"}),
+    ]
+    data = pd.DataFrame(rows)
+    data.loc[(data["student_id"] == 1) & (data["course_id"] == 20), "gender"] = "Masculino"
+    return data
+
+
+def assert_same_features(vectorized: pd.DataFrame, loop: pd.DataFrame, feature_names: list):
+    """Mismas columnas, mismos estudiante-curso en el mismo orden y mismas features"""
+    assert list(vectorized.columns) == list(loop.columns)
+    assert len(vectorized) == len(loop)
+    np.testing.assert_array_equal(vectorized["student_id"].to_numpy(), loop["student_id"].to_numpy())
+    np.testing.assert_array_equal(vectorized["course_id"].to_numpy(), loop["course_id"].to_numpy())
+    for name in feature_names:
+        np.testing.assert_allclose(
+            vectorized[name].to_numpy(dtype=float), loop[name].to_numpy(dtype=float),
+            rtol=0, atol=1e-12, err_msg=f"La feature {name} no coincide"
+        )
+
+
+def test_vectorized_matches_loop(task_rows):
+    feature_engineering = FeatureEngineering()
+    vectorized = feature_engineering.calculate_features(task_rows.copy(), engine="vectorized")
+    loop = feature_engineering.calculate_features(task_rows.copy(), engine="loop")
+
+    assert len(vectorized) == 5
+    assert_same_features(vectorized, loop, feature_engineering.get_feature_names())
+
+
+def test_neutral_values_without_submissions_or_grades(task_rows):
+    features = FeatureEngineering().calculate_features(task_rows.copy()).set_index(["student_id", "course_id"])
+
+    no_submissions = features.loc[(2, 10)]
+    assert no_submissions["submission_delay_rate"] == 0.5
+    assert no_submissions["non_submission_rate"] == 1.0
+    assert no_submissions["average_grade"] == 0.5
+    assert no_submissions["grade_variability"] == 0.5
+    assert no_submissions["motivation"] == 0.5
+    assert no_submissions["gender_encoded"] == 0.5
+
+    no_grades = features.loc[(3, 10)]
+    assert no_grades["non_submission_rate"] == 0.5
+    assert no_grades["average_grade"] == 0.5
+    assert no_grades["grade_variability"] == 0.5
+
+    # Entregar exactamente al vencimiento no cuenta como atraso
+    assert features.loc[(1, 10), "submission_delay_rate"] == pytest.approx(1 / 3)
+    assert features.loc[(1, 20), "grade_variability"] == 0.5
+
+
+def test_vectorized_matches_loop_on_synthetic_rows():
+    feature_engineering = FeatureEngineering()
+    data = generate_task_rows(n_students=300, tasks_per_course=12, n_courses=8, random_seed=7)
+    vectorized = feature_engineering.calculate_features(data.copy(), engine="vectorized")
+    loop = feature_engineering.calculate_features(data.copy(), engine="loop")
+
+    assert_same_features(vectorized, loop, feature_engineering.get_feature_names())
+
+
+
+def cursor_rows(data: pd.DataFrame) -> list:
+    """Tuplas ROW_COLUMNS como las del cursor: None en vez de NaN/NaT, fechas datetime"""
+    data = data.reindex(columns=FeatureEngineering.ROW_COLUMNS).astype(object)
+    data = data.where(data.notna(), None)
+    return [
+        tuple(value.to_pydatetime() if isinstance(value, pd.Timestamp) else value for value in row)
+        for row in data.itertuples(index=False)
+    ]
+
+
+def test_features_from_rows_matches_calculate_features(task_rows):
+    feature_engineering = FeatureEngineering()
+    expected = feature_engineering.calculate_features(task_rows.copy())
+
+    for (student_id, course_id), group in task_rows.groupby(["student_id", "course_id"]):
+        features = feature_engineering.features_from_rows(student_id, course_id, cursor_rows(group))
+        row = expected[(expected["student_id"] == student_id) & (expected["course_id"] == course_id)]
+        assert list(features) == list(expected.columns)
+        for name, value in features.items():
+            assert value == pytest.approx(float(row[name].iloc[0]), rel=0, abs=1e-12), (student_id, course_id, name)
+
+
+def test_features_from_rows_without_rows():
+    assert FeatureEngineering().features_from_rows(1, 10, []) is None
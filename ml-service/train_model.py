@@ -2,19 +2,40 @@
 Script para entrenar el modelo inicialmente
 """
 
+import argparse
 import sys
 from pathlib import Path
 
+import pandas as pd
+
 # Agregar el directorio raíz al path
 sys.path.insert(0, str(Path(__file__).parent))
 
+from core.config import settings
 from services.data_service import DataService
 from services.feature_engineering import FeatureEngineering
 from services.model_service import ModelService
+from services.training_jobs import peak_rss_mb
+from services.training_snapshot import TrainingSnapshot
 
 
 def main():
     """Función principal para entrenar el modelo"""
+    parser = argparse.ArgumentParser(description="Entrena el modelo de riesgo académico")
+    parser.add_argument(
+        "--tune", action="store_true",
+        help="Elegir hiperparámetros con validación cruzada en paralelo (TUNING_PARAM_GRID)"
+    )
+    parser.add_argument(
+        "--no-snapshot", action="store_true",
+        help="Leer todos los datos de Postgres sin usar el snapshot local (TRAINING_SNAPSHOT_DIR)"
+    )
+    parser.add_argument(
+        "--sample-size", type=int, default=settings.TRAINING_SAMPLE_SIZE,
+        help="Entrenar con una muestra estratificada de N pares estudiante-curso (0 = todos)"
+    )
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("ENTRENAMIENTO DEL MODELO DE ML")
     print("=" * 60)
@@ -26,28 +47,33 @@ def main():
     model_service = ModelService()
     
     try:
-        # 1. Obtener datos históricos
+        # 1-2. Obtener datos históricos por partes y calcular features
         print("1. Obteniendo datos históricos de la base de datos...")
-        historical_data = data_service.get_historical_data()
-        
-        if historical_data.empty:
-            print("ERROR: No hay datos históricos disponibles.")
-            print("Por favor, ejecuta primero el script populate_historical_data.py")
-            return
-        
-        print(f"   [OK] Datos obtenidos: {len(historical_data)} registros")
-        print()
-        
-        # 2. Calcular features
-        print("2. Calculando features...")
-        features_df = feature_engineering.calculate_features(historical_data)
+        dataset_version = None
+        sampler = data_service.training_sampler(args.sample_size) if args.sample_size > 0 else None
+        if settings.USE_TRAINING_SNAPSHOT and not args.no_snapshot:
+            snapshot = TrainingSnapshot()
+            dataset = snapshot.refresh(data_service)
+            dataset_version = dataset["version"]
+            print(f"   [OK] Snapshot {dataset['status']}: versión {dataset_version}, "
+                  f"{dataset['courses_refreshed']} cursos releídos, {dataset['rows_fetched']} filas leídas")
+            print("2. Calculando features...")
+            features_df = snapshot.features(dataset_version, sampler=sampler) if dataset_version else pd.DataFrame()
+        else:
+            print("2. Calculando features...")
+            features_df = data_service.get_historical_features(sampler=sampler)
         
         if features_df.empty:
             print("ERROR: No se pudieron calcular features.")
-            print("Verifica que haya entregas con calificaciones en la base de datos.")
+            print("Verifica que haya datos históricos con entregas calificadas en la base de datos")
+            print("(o ejecuta primero el script populate_historical_data.py).")
             return
         
         print(f"   [OK] Features calculadas: {len(features_df)} estudiantes-cursos")
+        sampling = sampler.report() if sampler is not None else None
+        if sampling is not None:
+            print(f"   [OK] Muestra estratificada: {sampling['sampled']} de {sampling['population']} "
+                  f"({sampling['fraction']:.2%}, {len(sampling['strata'])} estratos)")
         print(f"   [OK] Features: {', '.join(feature_engineering.get_feature_names())}")
         print()
         
@@ -58,12 +84,14 @@ def main():
         
         # 4. Entrenar modelo
         print("4. Entrenando modelo...")
-        metrics = model_service.train_model(features_df)
+        metrics = model_service.train_model(features_df, tune=args.tune, sampling=sampling)
         print()
         
         # 5. Guardar modelo
         print("5. Guardando modelo...")
-        model_service.save_model()
+        version = model_service.save_model(
+            extra_metadata={"dataset_version": dataset_version} if dataset_version else None
+        )
         print()
         
         # 6. Resumen
@@ -77,7 +105,8 @@ def main():
         print(f"  - Recall: {metrics['recall']:.3f}")
         print(f"  - F1-Score: {metrics['f1_score']:.3f}")
         print()
-        print(f"Modelo guardado en: {model_service.model_path}")
+        print(f"Modelo guardado en el registro como versión {version}")
+        print(f"Memoria máxima del proceso: {peak_rss_mb()} MB")
         print()
         print("Puedes iniciar el servidor ML con:")
         print("  python main.py")
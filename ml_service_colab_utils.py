@@ -52,9 +52,10 @@ def generate_synthetic_data(
                 'enrollment_date': enrollment_date
             })
     
-    # Generar tareas para cada curso
-    tasks = []
+    # Generar tareas para cada curso (agrupadas por curso)
+    tasks_by_course = {}
     for course_id in range(1, n_courses + 1):
+        tasks = tasks_by_course.setdefault(course_id, [])
         for task_num in range(1, tasks_per_course + 1):
             task_id = (course_id - 1) * tasks_per_course + task_num
             task_created_at = base_date + timedelta(days=(task_num - 1) * 14)
@@ -68,13 +69,14 @@ def generate_synthetic_data(
             })
     
     # Generar datos de entregas
+    n_submissions = 0
     for enrollment in enrollments:
         student_id = enrollment['student_id']
         course_id = enrollment['course_id']
         enrollment_date = enrollment['enrollment_date']
         
         # Obtener tareas del curso
-        course_tasks = [t for t in tasks if t['course_id'] == course_id]
+        course_tasks = tasks_by_course[course_id]
         
         # Determinar perfil del estudiante (30% alto riesgo, 70% bajo riesgo)
         is_high_risk = np.random.random() < 0.3
@@ -114,7 +116,9 @@ def generate_synthetic_data(
                 grade = max(1.0, min(7.0, np.random.normal(avg_grade, grade_variability)))
                 grade = round(grade, 2)
                 
-                submission_id = len([d for d in data if d.get('submission_id')]) + 1
+                # Contador de entregas (ids consecutivos desde 1)
+                n_submissions += 1
+                submission_id = n_submissions
                 
                 data.append({
                     'task_id': task_id,